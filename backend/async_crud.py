@@ -0,0 +1,393 @@
+"""
+Async counterparts of the crud.py functions used by the async routers.
+
+Routers are moved over incrementally: auth, chat threads and the API log
+queries use these with get_async_db; everything else still uses crud.py.
+Password hashing is CPU-bound, so it runs in a worker thread instead of on the event loop.
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import AsyncIterator, List, Optional, Tuple
+
+from sqlalchemy import and_, func, insert, select, true, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from . import schemas
+from .chat_history import thread_history_cache
+from .utils import get_password_hash
+
+logger = logging.getLogger(__name__)
+
+# === User CRUD ===
+
+async def get_user(db: AsyncSession, user_id: int) -> Optional[models.User]:
+    return await db.get(models.User, user_id)
+
+async def get_user_by_email(db: AsyncSession, email: str) -> Optional[models.User]:
+    result = await db.execute(select(models.User).where(models.User.email == email).limit(1))
+    return result.scalars().first()
+
+async def create_user(db: AsyncSession, user: schemas.UserCreate) -> models.User:
+    hashed_password = await asyncio.to_thread(get_password_hash, user.password)
+    # Create user with hashed password
+    db_user = models.User(
+        email=user.email,
+        name=user.name,
+        hashed_password=hashed_password,
+        is_admin=False # Default new users are not admin
+    )
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+# === Chat Thread and Message CRUD ===
+
+async def get_chat_thread(db: AsyncSession, thread_id: int, user_id: int) -> Optional[models.ChatThread]:
+    result = await db.execute(
+        select(models.ChatThread).where(
+            models.ChatThread.id == thread_id,
+            models.ChatThread.user_id == user_id
+        ).limit(1)
+    )
+    return result.scalars().first()
+
+async def get_chat_threads_for_user(db: AsyncSession, user_id: int, skip: int = 0, limit: int = 100) -> List[models.ChatThread]:
+    result = await db.execute(
+        select(models.ChatThread)
+        .where(models.ChatThread.user_id == user_id)
+        .order_by(models.ChatThread.updated_at.desc())
+        .offset(skip)
+        .limit(limit)
+    )
+    return list(result.scalars().all())
+
+async def get_chat_thread_summaries(
+    db: AsyncSession,
+    user_id: int,
+    skip: int = 0,
+    limit: int = 100,
+    snippet_chars: int = 200
+) -> List[dict]:
+    """
+    The user's threads, most recently updated first, each with its message count
+    and a preview of the last message, in one query.
+
+    PostgreSQL uses LATERAL subqueries, so each thread costs one short walk of the
+    (thread_id, created_at, id) index. Other databases number the messages with a
+    window function instead.
+    """
+    thread = models.ChatThread
+    message = models.ChatMessage
+    newest_first = (message.created_at.desc(), message.id.desc())
+    snippet = func.substr(message.content, 1, snippet_chars)
+
+    if db.get_bind().dialect.name == "postgresql":
+        last_message = (
+            select(message.role, snippet.label("snippet"), message.created_at)
+            .where(message.thread_id == thread.id)
+            .order_by(*newest_first)
+            .limit(1)
+            .lateral("last_message")
+        )
+        counts = (
+            select(func.count().label("message_count"))
+            .where(message.thread_id == thread.id)
+            .lateral("counts")
+        )
+        query = (
+            select(thread, counts.c.message_count, last_message.c.role, last_message.c.snippet, last_message.c.created_at)
+            .select_from(thread)
+            .join(counts, true())
+            .outerjoin(last_message, true())
+        )
+    else:
+        ranked = (
+            select(
+                message.thread_id,
+                message.role,
+                snippet.label("snippet"),
+                message.created_at,
+                func.row_number().over(partition_by=message.thread_id, order_by=newest_first).label("position"),
+                func.count().over(partition_by=message.thread_id).label("message_count")
+            )
+            .join(thread, thread.id == message.thread_id)
+            .where(thread.user_id == user_id)
+            .subquery()
+        )
+        query = (
+            select(thread, func.coalesce(ranked.c.message_count, 0), ranked.c.role, ranked.c.snippet, ranked.c.created_at)
+            .outerjoin(ranked, and_(ranked.c.thread_id == thread.id, ranked.c.position == 1))
+        )
+
+    result = await db.execute(
+        query.where(thread.user_id == user_id)
+        .order_by(thread.updated_at.desc(), thread.id.desc())
+        .offset(skip)
+        .limit(limit)
+    )
+    return [
+        {
+            "thread": db_thread,
+            "message_count": message_count,
+            "last_message_role": role,
+            "last_message_snippet": last_snippet,
+            "last_message_at": last_message_at
+        }
+        for db_thread, message_count, role, last_snippet, last_message_at in result.all()
+    ]
+
+async def create_chat_thread(db: AsyncSession, thread: schemas.ChatThreadCreate) -> models.ChatThread:
+    db_thread = models.ChatThread(**thread.model_dump())
+    db.add(db_thread)
+    await db.commit()
+    await db.refresh(db_thread)
+    return db_thread
+
+async def update_chat_thread(db: AsyncSession, thread_id: int, user_id: int, title: str) -> Optional[models.ChatThread]:
+    db_thread = await get_chat_thread(db, thread_id, user_id)
+    if db_thread:
+        db_thread.title = title
+        await db.commit()
+        await db.refresh(db_thread)
+    return db_thread
+
+async def delete_chat_thread(db: AsyncSession, thread_id: int, user_id: int) -> bool:
+    db_thread = await get_chat_thread(db, thread_id, user_id)
+    if db_thread:
+        await db.delete(db_thread)
+        await db.commit()
+        thread_history_cache.forget(thread_id)
+        return True
+    return False
+
+# Chat Message CRUD
+async def get_chat_message(db: AsyncSession, message_id: int) -> Optional[models.ChatMessage]:
+    return await db.get(models.ChatMessage, message_id)
+
+async def get_chat_messages_for_thread(db: AsyncSession, thread_id: int, skip: int = 0, limit: int = 100) -> List[models.ChatMessage]:
+    result = await db.execute(
+        select(models.ChatMessage)
+        .where(models.ChatMessage.thread_id == thread_id)
+        .order_by(models.ChatMessage.created_at.asc(), models.ChatMessage.id.asc())
+        .offset(skip)
+        .limit(limit)
+    )
+    return list(result.scalars().all())
+
+async def _message_page(db: AsyncSession, thread_id: int, limit: int, position=None, older: bool = True, inclusive: bool = False):
+    """
+    Up to limit messages on one side of a (created_at, id) position, oldest first,
+    plus whether more exist beyond them. With no position, older=True reads the tail.
+    """
+    message = models.ChatMessage
+    key = tuple_(message.created_at, message.id)
+    query = select(message).where(message.thread_id == thread_id)
+    if older:
+        if position is not None:
+            query = query.where(key <= position if inclusive else key < position)
+        query = query.order_by(message.created_at.desc(), message.id.desc())
+    else:
+        if position is not None:
+            query = query.where(key >= position if inclusive else key > position)
+        query = query.order_by(message.created_at.asc(), message.id.asc())
+    if limit <= 0:
+        return [], (await db.execute(query.limit(1))).first() is not None
+
+    # One extra row tells us whether there is more in that direction
+    result = await db.execute(query.limit(limit + 1))
+    rows = list(result.scalars().all())
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if older:
+        rows.reverse()
+    return rows, has_more
+
+async def get_chat_message_window(
+    db: AsyncSession,
+    thread_id: int,
+    limit: int = 50,
+    before: Optional[int] = None,
+    after: Optional[int] = None,
+    around: Optional[int] = None
+) -> Optional[dict]:
+    """
+    A window of a thread's messages, oldest first, anchored on a message id.
+
+    before/after return the messages just older/newer than the anchor, around
+    centres the window on it, and with no anchor the newest messages are returned.
+    Each read seeks the (thread_id, created_at, id) index, so cost does not grow
+    with the thread. Returns None if the anchor is not a message of this thread.
+    """
+    anchor_id = before or after or around
+    position = None
+    if anchor_id is not None:
+        anchor = await db.get(models.ChatMessage, anchor_id)
+        if anchor is None or anchor.thread_id != thread_id:
+            return None
+        # Compare against the stored created_at rather than a bound datetime, so
+        # ties compare equal whatever text format the database keeps timestamps in
+        anchor_created_at = (
+            select(models.ChatMessage.created_at)
+            .where(models.ChatMessage.id == anchor.id)
+            .scalar_subquery()
+        )
+        position = tuple_(anchor_created_at, anchor.id)
+
+    if after is not None:
+        messages, has_more_after = await _message_page(db, thread_id, limit, position, older=False)
+        return {"messages": messages, "has_more_before": True, "has_more_after": has_more_after}
+    if around is not None:
+        # Anchor plus the older half, then fill the rest with newer messages
+        older_messages, has_more_before = await _message_page(db, thread_id, (limit + 1) // 2, position, older=True, inclusive=True)
+        newer_messages, has_more_after = await _message_page(db, thread_id, limit - len(older_messages), position, older=False)
+        return {"messages": older_messages + newer_messages, "has_more_before": has_more_before, "has_more_after": has_more_after}
+
+    messages, has_more_before = await _message_page(db, thread_id, limit, position, older=True)
+    return {"messages": messages, "has_more_before": has_more_before, "has_more_after": before is not None}
+
+async def create_chat_message(db: AsyncSession, message: schemas.ChatMessageCreate) -> models.ChatMessage:
+    db_message = models.ChatMessage(**message.model_dump())
+    db.add(db_message)
+    # Update the thread's updated_at timestamp
+    db_thread = await db.get(models.ChatThread, message.thread_id)
+    if db_thread:
+        db_thread.updated_at = func.now()
+    await db.commit()
+    await db.refresh(db_message)
+    thread_history_cache.record(db_message.thread_id, [db_message])
+    return db_message
+
+async def append_chat_messages(
+    db: AsyncSession,
+    thread_id: int,
+    user_id: int,
+    messages: List[schemas.ChatMessageBase]
+) -> Optional[List[models.ChatMessage]]:
+    """
+    Append several messages (typically a user/assistant turn) in one transaction:
+    one UPDATE that both checks ownership and bumps updated_at, and one multi-row
+    INSERT ... RETURNING. Returns None if the thread isn't the user's.
+    """
+    touched = await db.execute(
+        update(models.ChatThread)
+        .where(models.ChatThread.id == thread_id, models.ChatThread.user_id == user_id)
+        .values(updated_at=func.now())
+        .returning(models.ChatThread.id)
+    )
+    if touched.first() is None:
+        await db.rollback()
+        return None
+
+    rows = [{"thread_id": thread_id, **message.model_dump()} for message in messages]
+    result = await db.scalars(
+        insert(models.ChatMessage).values(rows).returning(models.ChatMessage)
+    )
+    created = sorted(result.all(), key=lambda db_message: db_message.id)
+    await db.commit()
+    thread_history_cache.record(thread_id, created)
+    return created
+
+async def delete_chat_message(db: AsyncSession, message_id: int) -> bool:
+    db_message = await get_chat_message(db, message_id)
+    if db_message:
+        await db.delete(db_message)
+        await db.commit()
+        thread_history_cache.forget(db_message.thread_id)
+        return True
+    return False
+
+# === API Log queries ===
+
+async def count_api_logs(db: AsyncSession, filters: list, cap: Optional[int] = None) -> int:
+    """
+    Count logs matching the filters. With a cap, counting stops after cap rows,
+    so the cost stays bounded however large the table grows.
+    """
+    if cap is None:
+        query = select(func.count()).select_from(models.ApiLog).where(*filters)
+    else:
+        capped = select(models.ApiLog.id).where(*filters).limit(cap).subquery()
+        query = select(func.count()).select_from(capped)
+    return await db.scalar(query) or 0
+
+async def get_api_logs(db: AsyncSession, filters: list, offset: int, limit: int) -> List[models.ApiLog]:
+    """Return one OFFSET page of logs, newest first."""
+    result = await db.execute(
+        select(models.ApiLog)
+        .where(*filters)
+        .order_by(models.ApiLog.timestamp.desc(), models.ApiLog.id.desc())
+        .offset(offset)
+        .limit(limit)
+    )
+    return list(result.scalars().all())
+
+async def get_api_logs_keyset(
+    db: AsyncSession,
+    filters: list,
+    limit: int,
+    position: Optional[Tuple[datetime, int]] = None,
+    backwards: bool = False
+) -> Tuple[List[models.ApiLog], bool]:
+    """
+    Return up to limit logs, newest first, seeking past a (timestamp, id) position.
+
+    Forwards returns the rows older than the position; backwards returns the rows
+    newer than it (the previous page). The bool says whether more rows exist in
+    the direction travelled. Cost depends on the page size, not the page depth.
+    """
+    key = tuple_(models.ApiLog.timestamp, models.ApiLog.id)
+    query = select(models.ApiLog).where(*filters)
+    if backwards:
+        if position is not None:
+            query = query.where(key > position)
+        query = query.order_by(models.ApiLog.timestamp.asc(), models.ApiLog.id.asc())
+    else:
+        if position is not None:
+            query = query.where(key < position)
+        query = query.order_by(models.ApiLog.timestamp.desc(), models.ApiLog.id.desc())
+
+    # One extra row tells us whether there is another page
+    result = await db.execute(query.limit(limit + 1))
+    rows = list(result.scalars().all())
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if backwards:
+        rows.reverse()
+    return rows, has_more
+
+async def stream_api_logs(db: AsyncSession, filters: list, batch_size: int = 1000) -> AsyncIterator[list]:
+    """
+    Yield every matching log, newest first, in batches of rows.
+
+    Uses a server-side cursor (yield_per) and plain rows instead of ORM objects,
+    so memory stays flat however many rows match.
+    """
+    result = await db.stream(
+        select(*models.ApiLog.__table__.columns)
+        .where(*filters)
+        .order_by(models.ApiLog.timestamp.desc(), models.ApiLog.id.desc())
+        .execution_options(yield_per=batch_size)
+    )
+    async for rows in result.partitions():
+        yield rows
+
+async def get_api_log_rollups(
+    db: AsyncSession,
+    granularity: str,
+    start: datetime,
+    end: datetime,
+    filters: list
+) -> List[models.ApiLogRollup]:
+    """Return the rollup rows of one granularity whose buckets start in [start, end]."""
+    result = await db.execute(
+        select(models.ApiLogRollup).where(
+            models.ApiLogRollup.granularity == granularity,
+            models.ApiLogRollup.bucket_start >= start,
+            models.ApiLogRollup.bucket_start <= end,
+            *filters
+        )
+    )
+    return list(result.scalars().all())
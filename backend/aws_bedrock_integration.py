@@ -1,7 +1,6 @@
 import json
 import asyncio
 import logging
-import boto3
 import uuid
 import os
 from botocore.config import Config
@@ -10,6 +9,7 @@ from fastapi import APIRouter, HTTPException, Query
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
+from .aws_services.client_pool import client_pool
 
 # Configure logging first
 logging.basicConfig(level=logging.INFO)
@@ -70,7 +70,7 @@ def get_bedrock_agent_client(
     aws_region=None
 ):
     """
-    Create and return a Bedrock agent client using the provided credentials.
+    Return a pooled Bedrock agent client for the provided credentials.
     If no credentials are provided, it will use the ones from the .env file.
     """
     # Use provided credentials or fall back to defaults from .env
@@ -83,14 +83,7 @@ def get_bedrock_agent_client(
         raise ValueError("AWS credentials not provided and not found in .env file. Check your .env file or provide credentials in the request.")
         
     try:
-        agent_client = boto3.client(
-            service_name='bedrock-agent-runtime',
-            region_name=aws_region,
-            aws_access_key_id=aws_access_key,
-            aws_secret_access_key=aws_secret_key,
-            config=config
-        )
-        return agent_client
+        return client_pool.get_client('bedrock-agent-runtime', aws_access_key, aws_secret_key, aws_region, config)
     except NoCredentialsError:
         raise ValueError("Invalid AWS credentials")
     except BotoCoreError as e:
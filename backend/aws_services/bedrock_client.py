@@ -1,20 +1,24 @@
 import json
 import asyncio
 import logging
-import boto3
 import uuid
 import os
 import time
 from botocore.config import Config
 from botocore.exceptions import BotoCoreError, NoCredentialsError
-from fastapi import APIRouter, HTTPException, Query, Depends
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, HTTPException, Query, Depends, status
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
 from dotenv import load_dotenv
 from sqlalchemy.orm import Session
 from ..database import get_db
-from .. import models
 from ..routers.logs import add_log
+from .client_pool import client_pool
+from .executor import run_in_bedrock_executor, submit_to_bedrock_executor
+from ..settings_cache import agent_settings_cache
+from ..metrics import record_upstream
+from ..chat_history import ChatContext, build_thread_context, thread_history_cache
+from ..dependencies import get_optional_active_user
 
 # Configure logging first
 logging.basicConfig(level=logging.INFO)
@@ -58,7 +62,8 @@ logger.info(f"Using Bedrock Agent Alias ID: {DEFAULT_AGENT_ALIAS_ID}")
 class ChatRequest(BaseModel):
     message: str
     session_id: str = None
-    history: list[dict] = []  # List of previous messages
+    thread_id: int = None  # Stored thread whose messages give the agent its context
+    history: list[dict] = []  # Deprecated: ignored; send thread_id instead
     aws_access_key: str = None
     aws_secret_key: str = None
     aws_region: str = None
@@ -75,7 +80,7 @@ def get_bedrock_agent_client(
     aws_region=None
 ):
     """
-    Create and return a Bedrock agent client using the provided credentials.
+    Return a pooled Bedrock agent client for the provided credentials.
     If no credentials are provided, it will use the ones from the .env file.
     """
     # Use provided credentials or fall back to defaults from .env
@@ -88,19 +93,88 @@ def get_bedrock_agent_client(
         raise ValueError("AWS credentials not provided and not found in .env file. Check your .env file or provide credentials in the request.")
         
     try:
-        agent_client = boto3.client(
-            service_name='bedrock-agent-runtime',
-            region_name=aws_region,
-            aws_access_key_id=aws_access_key,
-            aws_secret_access_key=aws_secret_key,
-            config=config
-        )
-        return agent_client
+        # Reuse a pooled client so requests don't pay client construction and TLS setup
+        return client_pool.get_client('bedrock-agent-runtime', aws_access_key, aws_secret_key, aws_region, config)
     except NoCredentialsError:
         raise ValueError("Invalid AWS credentials")
     except BotoCoreError as e:
         raise ValueError(f"Error initializing Bedrock client: {str(e)}")
 
+async def resolve_agent_ids(db: Session = None, agent_id=None, agent_alias_id=None):
+    """
+    Resolve the Bedrock agent IDs to use.
+    Active database settings win, then provided values, then the .env defaults.
+    Database settings are read through the in-process settings cache, which loads
+    a miss on a worker thread (with a short-lived session when db is None).
+    """
+    settings = await agent_settings_cache.get_aws_async(db)
+    
+    if settings:
+        # Always use database settings if available, overriding any provided values
+        logger.info(f"Using Bedrock agent settings v{settings.version}: agent_id={settings.agent_id}, agent_alias_id={settings.agent_alias_id}")
+        return settings.agent_id, settings.agent_alias_id
+    
+    # Only if no database settings, use provided values or fall back to defaults
+    if not agent_id or not agent_alias_id:
+        logger.info("No agent IDs provided, falling back to defaults")
+        agent_id = agent_id or DEFAULT_AGENT_ID
+        agent_alias_id = agent_alias_id or DEFAULT_AGENT_ALIAS_ID
+    logger.info(f"Using agent_id: {agent_id}, agent_alias_id: {agent_alias_id}")
+    return agent_id, agent_alias_id
+
+def build_input_text(message, context: ChatContext = None):
+    """The agent's inputText: the conversation context, if any, followed by the message."""
+    return f"{context.text}\n{message}" if context and context.text else message
+
+def context_log_fields(context: ChatContext = None) -> dict:
+    """Token accounting of the context sent with a request, for the API logs."""
+    return context.accounting() if context else {}
+
+async def resolve_thread_context(request: ChatRequest, current_user) -> ChatContext:
+    """
+    Context for a request that names a thread, assembled server-side from the
+    thread's stored messages and bounded by the context token budget. Without
+    thread_id there is none, and the agent's own session memory carries the
+    conversation as before.
+    """
+    if request.thread_id is None:
+        return None
+    if current_user is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Authentication is required to chat in a thread",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    context = await build_thread_context(request.thread_id, current_user.id, request.message)
+    if context is None:
+        raise HTTPException(status_code=404, detail="Chat thread not found")
+    return context
+
+def invoke_agent_and_collect(agent_client, agent_id, agent_alias_id, session_id, message):
+    """
+    Invoke the Bedrock agent and concatenate the completion chunks.
+    This is blocking and must run on the Bedrock executor, not on the event loop.
+    """
+    response = agent_client.invoke_agent(
+        agentId=agent_id,
+        agentAliasId=agent_alias_id,
+        sessionId=session_id,
+        inputText=message,
+        enableTrace=True
+    )
+    
+    # The response is an EventStream object that we need to iterate through
+    full_response = ""
+    try:
+        for event in response['completion']:
+            if 'chunk' in event:
+                chunk = event['chunk']['bytes'].decode('utf-8')
+                full_response += chunk
+    except Exception as e:
+        logger.error(f"Error processing EventStream: {str(e)}")
+        raise ValueError(f"Error processing EventStream: {str(e)}")
+    return full_response
+
 async def invoke_bedrock_agent(
     message, 
     session_id=None,
@@ -109,62 +183,33 @@ async def invoke_bedrock_agent(
     aws_region=None,
     agent_id=None,
     agent_alias_id=None,
-    db: Session = None
+    db: Session = None,
+    context: ChatContext = None
 ):
     """
     Simple function to invoke AWS Bedrock agent and get a response.
     
     Note: This function prioritizes using the AWS credentials from the .env file
     and the agent IDs from the AWS settings page.
+    
+    Leave db as None from request handlers: settings and logs then use short-lived
+    sessions, so no pooled connection is held while the agent runs.
+    context, if given, is sent ahead of the message (see build_input_text).
     """
     logger.info("=== AWS BEDROCK AGENT INVOCATION DEBUG ===")
     logger.info(f"Incoming request - message: {message[:50]}..., session_id: {session_id}")
     logger.info(f"Provided agent_id: {agent_id}, agent_alias_id: {agent_alias_id}")
     
-    # Reload environment variables to get the latest settings
-    load_dotenv(dotenv_path=os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), '.env'), override=True)
-    logger.info(f"Env vars - AWS_BEDROCK_AGENT_ID: {os.getenv('AWS_BEDROCK_AGENT_ID')}, AWS_BEDROCK_AGENT_ALIAS_ID: {os.getenv('AWS_BEDROCK_AGENT_ALIAS_ID')}")
-    
     # Generate a session ID if not provided
     if not session_id:
         session_id = str(uuid.uuid4())
         logger.info(f"Generated new session ID: {session_id}")
     
-    # Always try to get settings from database first
-    logger.info("Attempting to get agent IDs from database")
-    if db:
-        # Try to get settings from database
-        logger.info("Database session available, querying for AWS settings")
-        settings = db.query(models.AwsSettings).filter(models.AwsSettings.is_active == True).order_by(models.AwsSettings.id.desc()).first()
-        if settings:
-            logger.info(f"Found settings in database: agent_id={settings.agent_id}, agent_alias_id={settings.agent_alias_id}")
-            # Always use database settings if available, overriding any provided values
-            agent_id = settings.agent_id
-            agent_alias_id = settings.agent_alias_id
-            logger.info(f"Using Bedrock Agent ID from database: {agent_id}")
-            logger.info(f"Using Bedrock Agent Alias ID from database: {agent_alias_id}")
-        else:
-            # Only if no database settings, use provided values or fall back to defaults
-            logger.info("No settings found in database")
-            if not agent_id or not agent_alias_id:
-                logger.info("No agent IDs provided, falling back to defaults")
-                agent_id = agent_id or DEFAULT_AGENT_ID
-                agent_alias_id = agent_alias_id or DEFAULT_AGENT_ALIAS_ID
-                logger.info(f"Using fallback agent_id: {agent_id}, agent_alias_id: {agent_alias_id}")
-            else:
-                logger.info(f"Using provided agent_id: {agent_id}, agent_alias_id: {agent_alias_id}")
-    else:
-        # No database session, use provided values or fall back to defaults
-        logger.info("No database session available")
-        if not agent_id or not agent_alias_id:
-            logger.info("No agent IDs provided, falling back to defaults")
-            agent_id = agent_id or DEFAULT_AGENT_ID
-            agent_alias_id = agent_alias_id or DEFAULT_AGENT_ALIAS_ID
-            logger.info(f"Using fallback agent_id: {agent_id}, agent_alias_id: {agent_alias_id}")
-        else:
-            logger.info(f"Using provided agent_id: {agent_id}, agent_alias_id: {agent_alias_id}")
-    
+    upstream_start = time.perf_counter()
     try:
+        # Settings lookup failures are logged and counted like any other upstream error
+        agent_id, agent_alias_id = await resolve_agent_ids(db, agent_id, agent_alias_id)
+        
         # Get the Bedrock agent client
         logger.info("Getting Bedrock agent client")
         bedrock_agent_runtime = get_bedrock_agent_client(
@@ -174,10 +219,7 @@ async def invoke_bedrock_agent(
         )
         
         # Prepare the request
-        request_body = {
-            'inputText': message,
-            'enableTrace': True
-        }
+        input_text = build_input_text(message, context)
         
         # Create request log entry
         request_log = {
@@ -188,63 +230,50 @@ async def invoke_bedrock_agent(
             "request_data": {
                 "agentId": agent_id,
                 "agentAliasId": agent_alias_id,
-                "message": message
+                "message": message,
+                **context_log_fields(context)
             }
         }
         
-        if db:  # Only log if we have a database session
-            add_log(db, request_log)
+        add_log(db, request_log)
         
         logger.info(f"Invoking AWS Bedrock agent with ID: {agent_id}, alias: {agent_alias_id}")
         
         # Measure response time
         start_time = time.time()
         
-        # Invoke the agent
-        response = bedrock_agent_runtime.invoke_agent(
-            agentId=agent_id,
-            agentAliasId=agent_alias_id,
-            sessionId=session_id,
-            inputText=message,
-            enableTrace=True
+        # Invoke the agent and drain the EventStream on the Bedrock executor
+        # so a slow agent never blocks the event loop
+        full_response = await run_in_bedrock_executor(
+            invoke_agent_and_collect,
+            bedrock_agent_runtime,
+            agent_id=agent_id,
+            agent_alias_id=agent_alias_id,
+            session_id=session_id,
+            message=input_text
         )
         
         # Calculate duration
         duration_ms = int((time.time() - start_time) * 1000)
+        upstream_seconds = time.perf_counter() - upstream_start
         
-        # Process the EventStream response
-        logger.info("Processing EventStream response")
-        full_response = ""
+        logger.info(f"AWS Bedrock agent response received, length: {len(full_response)}")
         
-        # The response is an EventStream object that we need to iterate through
-        try:
-            # EventStream needs to be processed by iterating through it
-            for event in response['completion']:
-                if 'chunk' in event:
-                    chunk = event['chunk']['bytes'].decode('utf-8')
-                    full_response += chunk
-            
-            logger.info(f"AWS Bedrock agent response received, length: {len(full_response)}")
-            
-            # Create response log entry
-            response_log = {
-                "log_type": "response",
-                "provider": "aws",
-                "session_id": session_id,
-                "endpoint": "bedrock-agent-runtime.invoke_agent",
-                "response_data": {
-                    "completion": full_response[:500],  # Limit size for logging
-                    "trace": ""  # Can't easily extract trace from EventStream
-                },
-                "status_code": 200,
-                "duration_ms": duration_ms
-            }
-            
-            if db:  # Only log if we have a database session
-                add_log(db, response_log)
-        except Exception as e:
-            logger.error(f"Error processing EventStream: {str(e)}")
-            raise ValueError(f"Error processing EventStream: {str(e)}")
+        # Create response log entry
+        response_log = {
+            "log_type": "response",
+            "provider": "aws",
+            "session_id": session_id,
+            "endpoint": "bedrock-agent-runtime.invoke_agent",
+            "response_data": {
+                "completion": full_response[:500],  # Limit size for logging
+                "trace": ""  # Can't easily extract trace from EventStream
+            },
+            "status_code": 200,
+            "duration_ms": duration_ms
+        }
+        
+        add_log(db, response_log)
             
         # Validate the response
         if not full_response:
@@ -256,10 +285,12 @@ async def invoke_bedrock_agent(
         
         logger.info(f"Full response length: {len(full_response)} characters")
         logger.info(f"Response preview: {full_response[:100]}...")
-                
+        
+        record_upstream("aws", "invoke_agent", upstream_seconds)
         return full_response
     
     except (BotoCoreError, NoCredentialsError) as e:
+        record_upstream("aws", "invoke_agent", time.perf_counter() - upstream_start, success=False)
         error_message = f"AWS Bedrock client error: {str(e)}"
         logger.error(error_message)
         
@@ -273,11 +304,11 @@ async def invoke_bedrock_agent(
             "status_code": 500
         }
         
-        if db:  # Only log if we have a database session
-            add_log(db, error_log)
+        add_log(db, error_log)
             
         raise HTTPException(status_code=500, detail=error_message)
     except Exception as e:
+        record_upstream("aws", "invoke_agent", time.perf_counter() - upstream_start, success=False)
         error_message = f"Error invoking AWS Bedrock agent: {str(e)}"
         logger.error(error_message)
         
@@ -291,11 +322,167 @@ async def invoke_bedrock_agent(
             "status_code": 500
         }
         
-        if db:  # Only log if we have a database session
-            add_log(db, error_log)
+        add_log(db, error_log)
             
         raise HTTPException(status_code=500, detail=error_message)
 
+def _next_event(events):
+    """Read the next EventStream event, returning None once the stream is exhausted."""
+    return next(events, None)
+
+def _close_stream(completion):
+    """Close an EventStream, releasing its upstream connection."""
+    try:
+        completion.close()
+    except Exception as e:
+        logger.warning(f"Error closing Bedrock EventStream: {str(e)}")
+
+def _abort_stream(completion, read):
+    """
+    Close an EventStream as soon as its reader goes away. With a read in flight, the
+    socket is shut down and the stream closed right here, so the blocked worker gets
+    an error instead of waiting for Bedrock's next event; otherwise a worker closes it.
+    """
+    if read is not None and not read.done():
+        raw_stream = getattr(completion, "_raw_stream", None)
+        try:
+            # urllib3's shutdown() wakes a recv() blocked in another thread; close() alone does not
+            if hasattr(raw_stream, "shutdown"):
+                raw_stream.shutdown()
+        except Exception as e:
+            logger.warning(f"Error shutting down Bedrock EventStream socket: {str(e)}")
+        _close_stream(completion)
+    else:
+        submit_to_bedrock_executor(_close_stream, completion)
+
+async def stream_bedrock_agent(
+    message,
+    session_id,
+    aws_access_key=None,
+    aws_secret_key=None,
+    aws_region=None,
+    agent_id=None,
+    agent_alias_id=None,
+    context: ChatContext = None
+):
+    """
+    Invoke the AWS Bedrock agent and yield NDJSON lines as soon as each chunk arrives.
+    
+    Each line is {"session_id", "chunk"}; the stream ends with {"session_id", "done": true}
+    or {"session_id", "error"}. If the client disconnects the generator is cancelled and the
+    upstream EventStream is closed so Bedrock stops sending.
+    """
+    completion = None
+    read = None
+    full_response = ""
+    first_chunk_ms = None
+    upstream_start = time.perf_counter()
+    
+    try:
+        agent_id, agent_alias_id = await resolve_agent_ids(None, agent_id, agent_alias_id)
+        
+        # Create request log entry
+        request_log = {
+            "log_type": "request",
+            "provider": "aws",
+            "session_id": session_id,
+            "endpoint": "bedrock-agent-runtime.invoke_agent",
+            "request_data": {
+                "agentId": agent_id,
+                "agentAliasId": agent_alias_id,
+                "message": message,
+                **context_log_fields(context),
+                "stream": True
+            }
+        }
+        add_log(None, request_log)
+        
+        bedrock_agent_runtime = get_bedrock_agent_client(
+            aws_access_key=aws_access_key,
+            aws_secret_key=aws_secret_key,
+            aws_region=aws_region
+        )
+        
+        logger.info(f"Streaming from AWS Bedrock agent with ID: {agent_id}, alias: {agent_alias_id}")
+        start_time = time.time()
+        
+        response = await run_in_bedrock_executor(
+            bedrock_agent_runtime.invoke_agent,
+            agentId=agent_id,
+            agentAliasId=agent_alias_id,
+            sessionId=session_id,
+            inputText=build_input_text(message, context),
+            enableTrace=True
+        )
+        completion = response['completion']
+        events = iter(completion)
+        
+        # Forward each chunk the moment Bedrock emits it. The read's own future is kept
+        # so a disconnect can tell whether a worker is still blocked on the stream
+        while True:
+            read = submit_to_bedrock_executor(_next_event, events)
+            event = await asyncio.wrap_future(read)
+            if event is None:
+                break
+            if 'chunk' not in event:
+                continue
+            chunk = event['chunk']['bytes'].decode('utf-8')
+            if not chunk:
+                continue
+            if first_chunk_ms is None:
+                first_chunk_ms = int((time.time() - start_time) * 1000)
+                logger.info(f"First Bedrock chunk for session {session_id} after {first_chunk_ms}ms")
+                record_upstream("aws", "invoke_agent_stream_first_chunk", time.perf_counter() - upstream_start)
+            full_response += chunk
+            yield json.dumps({"session_id": session_id, "chunk": chunk}) + "\n"
+        
+        duration_ms = int((time.time() - start_time) * 1000)
+        record_upstream("aws", "invoke_agent_stream", time.perf_counter() - upstream_start)
+        logger.info(f"AWS Bedrock stream completed, length: {len(full_response)}")
+        
+        # Create response log entry
+        response_log = {
+            "log_type": "response",
+            "provider": "aws",
+            "session_id": session_id,
+            "endpoint": "bedrock-agent-runtime.invoke_agent",
+            "response_data": {
+                "completion": full_response[:500],  # Limit size for logging
+                "first_chunk_ms": first_chunk_ms,
+                "stream": True
+            },
+            "status_code": 200,
+            "duration_ms": duration_ms
+        }
+        add_log(None, response_log)
+        
+        yield json.dumps({"session_id": session_id, "done": True}) + "\n"
+    except asyncio.CancelledError:
+        logger.info(f"Client disconnected, cancelling Bedrock stream for session {session_id}")
+        raise
+    except Exception as e:
+        record_upstream("aws", "invoke_agent_stream", time.perf_counter() - upstream_start, success=False)
+        error_message = f"Error streaming from AWS Bedrock agent: {str(e)}"
+        logger.error(error_message)
+        
+        # Create error log entry
+        error_log = {
+            "log_type": "error",
+            "provider": "aws",
+            "session_id": session_id,
+            "endpoint": "bedrock-agent-runtime.invoke_agent",
+            "error_message": error_message,
+            "status_code": 500
+        }
+        add_log(None, error_log)
+        
+        yield json.dumps({"session_id": session_id, "error": error_message}) + "\n"
+    finally:
+        # Closing the EventStream releases the upstream connection and, on a disconnect,
+        # interrupts the read in progress so its worker is freed at once
+        if completion is not None:
+            _abort_stream(completion, read)
+
 # Create the router
 router = APIRouter(
     prefix="/aws-bedrock",
@@ -304,11 +491,14 @@ router = APIRouter(
 )
 
 @router.post("/chat", response_model=ChatResponse)
-async def chat(request: ChatRequest, db: Session = Depends(get_db)):
+async def chat(request: ChatRequest, current_user=Depends(get_optional_active_user)):
     """
     Standard chat endpoint for AWS Bedrock.
     Send a message to AWS Bedrock agent and get a response.
+    With thread_id, the conversation context is read from the caller's stored thread.
+    No request-scoped session is taken, so the agent call doesn't hold a pooled connection.
     """
+    context = await resolve_thread_context(request, current_user)
     try:
         # Generate a session ID if not provided
         if not request.session_id:
@@ -325,7 +515,7 @@ async def chat(request: ChatRequest, db: Session = Depends(get_db)):
             aws_region=request.aws_region,
             agent_id=request.agent_id,
             agent_alias_id=request.agent_alias_id,
-            db=db
+            context=context
         )
         
         return ChatResponse(session_id=session_id, response=response)
@@ -333,12 +523,38 @@ async def chat(request: ChatRequest, db: Session = Depends(get_db)):
         logger.error(f"Error in AWS Bedrock chat endpoint: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/chat/stream")
+async def chat_stream(request: ChatRequest, current_user=Depends(get_optional_active_user)):
+    """
+    Streaming chat endpoint for AWS Bedrock.
+    Returns NDJSON lines as the agent produces them instead of waiting for the full completion.
+    """
+    session_id = request.session_id or str(uuid.uuid4())
+    context = await resolve_thread_context(request, current_user)
+    
+    return StreamingResponse(
+        stream_bedrock_agent(
+            message=request.message,
+            session_id=session_id,
+            aws_access_key=request.aws_access_key,
+            aws_secret_key=request.aws_secret_key,
+            aws_region=request.aws_region,
+            agent_id=request.agent_id,
+            agent_alias_id=request.agent_alias_id,
+            context=context
+        ),
+        media_type="application/x-ndjson",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # Stop reverse proxies from buffering the stream
+        }
+    )
+
 @router.get("/test")
 async def test_bedrock(
     message: str = Query(..., description="Message to send to the Bedrock agent"),
     agent_id: str = Query(None, description="Optional: Custom agent ID"),
-    agent_alias_id: str = Query(None, description="Optional: Custom agent alias ID"),
-    db: Session = Depends(get_db)
+    agent_alias_id: str = Query(None, description="Optional: Custom agent alias ID")
 ):
     """
     Test endpoint for AWS Bedrock agent using query parameters.
@@ -353,8 +569,7 @@ async def test_bedrock(
             message=message,
             session_id=session_id,
             agent_id=agent_id,
-            agent_alias_id=agent_alias_id,
-            db=db
+            agent_alias_id=agent_alias_id
         )
         
         return {"session_id": session_id, "response": response}
@@ -386,8 +601,8 @@ def get_prompts():
 @router.get("/config")
 async def get_config(db: Session = Depends(get_db)):
     """Return the current AWS Bedrock configuration (without sensitive information)"""
-    # Try to get settings from database first
-    settings = db.query(models.AwsSettings).filter(models.AwsSettings.is_active == True).order_by(models.AwsSettings.id.desc()).first()
+    # Try to get settings from database first (through the settings cache)
+    settings = await agent_settings_cache.get_aws_async(db)
     
     if settings:
         agent_id = settings.agent_id
@@ -404,6 +619,16 @@ async def get_config(db: Session = Depends(get_db)):
         "aws_credentials_configured": bool(DEFAULT_AWS_ACCESS_KEY and DEFAULT_AWS_SECRET_KEY)
     }
 
+@router.get("/client-pool")
+async def get_client_pool_stats():
+    """Return hit/miss counters for the shared AWS client pool"""
+    return client_pool.stats()
+
+@router.get("/history-cache")
+async def get_history_cache_stats():
+    """Return counters for the per-thread history tail cache"""
+    return thread_history_cache.stats()
+
 @router.get("/")
 async def root():
     """Root endpoint for checking the AWS Bedrock API status."""
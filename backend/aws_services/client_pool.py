@@ -0,0 +1,105 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import boto3
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Maximum number of distinct clients kept alive in the process
+DEFAULT_POOL_SIZE = int(os.getenv("AWS_CLIENT_POOL_SIZE", "16"))
+
+
+def _config_key(config):
+    """
+    Build a hashable key for a botocore Config.
+    Configs are module-level constants, and botocore rewrites their retry settings
+    when a client is created, so identity is the only stable key.
+    """
+    return id(config) if config is not None else None
+
+
+class AwsClientPool:
+    """
+    Process-wide registry of boto3 clients keyed by service, credentials, region and config.
+
+    boto3 clients are thread-safe once created, so a single client per key can be
+    shared by every request. The pool is bounded and evicts the least recently used
+    client when full.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_POOL_SIZE):
+        self.max_size = max(1, max_size)
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_client(self, service_name, aws_access_key, aws_secret_key, aws_region, config=None):
+        """Return a cached client for the given parameters, creating it on a miss."""
+        # Hash the secret so a rotated secret never reuses a stale client
+        secret_digest = hashlib.sha256((aws_secret_key or "").encode("utf-8")).hexdigest()
+        key = (service_name, aws_access_key, secret_digest, aws_region, _config_key(config))
+
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self._clients.move_to_end(key)
+                self.hits += 1
+                return client
+
+            self.misses += 1
+            logger.info(f"Creating new {service_name} client for region {aws_region}")
+            client = boto3.client(
+                service_name=service_name,
+                region_name=aws_region,
+                aws_access_key_id=aws_access_key,
+                aws_secret_access_key=aws_secret_key,
+                config=config
+            )
+            self._clients[key] = client
+
+            # Evict the least recently used client when over capacity
+            while len(self._clients) > self.max_size:
+                self._clients.popitem(last=False)
+                self.evictions += 1
+            return client
+
+    def warm(self, service_name, aws_access_key, aws_secret_key, aws_region, config=None):
+        """Create the client ahead of the first request. Failures are logged, not raised."""
+        if not aws_access_key or not aws_secret_key:
+            logger.warning(f"Skipping {service_name} client warm-up: AWS credentials not configured")
+            return False
+        try:
+            self.get_client(service_name, aws_access_key, aws_secret_key, aws_region, config)
+            logger.info(f"Warmed {service_name} client for region {aws_region}")
+            return True
+        except Exception as e:
+            logger.error(f"Error warming {service_name} client: {str(e)}")
+            return False
+
+    def clear(self):
+        """Drop every cached client."""
+        with self._lock:
+            self._clients.clear()
+
+    def stats(self):
+        """Return pool size and hit/miss counters."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._clients),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0
+            }
+
+
+# Shared pool used by every Bedrock code path
+client_pool = AwsClientPool()
@@ -0,0 +1,57 @@
+import asyncio
+import functools
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Maximum number of Bedrock calls running at the same time in this worker.
+# Matches the default max_pool_connections of the Bedrock client config.
+BEDROCK_MAX_CONCURRENCY = int(os.getenv("BEDROCK_MAX_CONCURRENCY", "50"))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_bedrock_executor():
+    """
+    Return the dedicated Bedrock thread pool, creating it on first use.
+    A separate pool keeps slow agent calls from starving asyncio's default executor.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=BEDROCK_MAX_CONCURRENCY,
+                thread_name_prefix="bedrock"
+            )
+        return _executor
+
+
+def submit_to_bedrock_executor(func, *args, **kwargs):
+    """
+    Submit a blocking call to the Bedrock executor and return its concurrent Future.
+    Use it when the caller needs to know when the worker is done, even after it stops waiting.
+    """
+    return get_bedrock_executor().submit(functools.partial(func, *args, **kwargs))
+
+
+async def run_in_bedrock_executor(func, *args, **kwargs):
+    """
+    Run a blocking boto3 call on the Bedrock executor and await its result.
+    Calls beyond BEDROCK_MAX_CONCURRENCY queue until a worker frees up.
+    """
+    return await asyncio.wrap_future(submit_to_bedrock_executor(func, *args, **kwargs))
+
+
+def shutdown_bedrock_executor():
+    """Cancel queued Bedrock work and wait for running calls to finish."""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        logger.info("Shutting down Bedrock executor")
+        executor.shutdown(wait=True, cancel_futures=True)
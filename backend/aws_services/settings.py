@@ -7,6 +7,7 @@ import logging
 from sqlalchemy.orm import Session
 from ..database import get_db
 from .. import models, crud
+from ..settings_cache import agent_settings_cache
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -97,6 +98,9 @@ async def update_aws_settings(request: AwsSettingsRequest, db: Session = Depends
         db.refresh(new_settings)
         logger.info(f"Created new settings record with ID {new_settings.id}")
         
+        # Make the chat path pick up the new agent IDs
+        agent_settings_cache.invalidate()
+        
         # Also update environment variables for immediate use
         logger.info("Updating environment variables for immediate use")
         os.environ["AWS_BEDROCK_AGENT_ID"] = request.agent_id
@@ -0,0 +1,99 @@
+"""
+Throughput comparison: sync Session vs AsyncSession inside async def handlers.
+
+Runs the same query at a fixed concurrency twice. First it calls the blocking
+SessionLocal from a coroutine, the old pattern in async routers, which stalls the
+event loop for every round trip. Then it uses the AsyncSession from get_async_db.
+Each query includes a simulated server round trip (pg_sleep on PostgreSQL, a
+registered sleep() function on SQLite) so the difference shows up without a
+remote database.
+
+Usage (from the repository root, DATABASE_URL set as for the app):
+    python -m backend.benchmark_async_db --requests 200 --concurrency 20 --latency-ms 5
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from sqlalchemy import event, text
+
+# Fall back to a throwaway SQLite file so the script runs without a configured database
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'benchmark_async_db.sqlite')}")
+
+from .database import engine, get_async_engine, get_async_sessionmaker, dispose_async_engine, SessionLocal
+
+
+def _register_sqlite_sleep(dbapi_connection, connection_record):
+    # SQLite has no sleep function; add one so both engines can simulate latency
+    dbapi_connection.create_function("sleep", 1, lambda ms: time.sleep(ms / 1000.0) or 0)
+
+
+def _sleep_query(latency_ms: float):
+    if engine.dialect.name == "postgresql":
+        return text("SELECT pg_sleep(:seconds)").bindparams(seconds=latency_ms / 1000.0)
+    return text("SELECT sleep(:ms)").bindparams(ms=latency_ms)
+
+
+async def run_sync_session(total: int, concurrency: int, latency_ms: float) -> float:
+    """Old pattern: a blocking Session used directly inside the coroutine."""
+    semaphore = asyncio.Semaphore(concurrency)
+    query = _sleep_query(latency_ms)
+
+    async def one():
+        async with semaphore:
+            db = SessionLocal()
+            try:
+                db.execute(query)
+            finally:
+                db.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    return time.perf_counter() - start
+
+
+async def run_async_session(total: int, concurrency: int, latency_ms: float) -> float:
+    """New pattern: an AsyncSession, awaited so other requests run meanwhile."""
+    semaphore = asyncio.Semaphore(concurrency)
+    query = _sleep_query(latency_ms)
+    session_factory = get_async_sessionmaker()
+
+    async def one():
+        async with semaphore:
+            async with session_factory() as db:
+                await db.execute(query)
+
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(one() for _ in range(total)))
+        return time.perf_counter() - start
+    finally:
+        await dispose_async_engine()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare sync and async session throughput")
+    parser.add_argument("--requests", type=int, default=200, help="Total number of queries")
+    parser.add_argument("--concurrency", type=int, default=20, help="Concurrent in-flight queries")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="Simulated round trip per query")
+    args = parser.parse_args()
+
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", _register_sqlite_sleep)
+        event.listen(get_async_engine().sync_engine, "connect", _register_sqlite_sleep)
+
+    sync_seconds = asyncio.run(run_sync_session(args.requests, args.concurrency, args.latency_ms))
+    async_seconds = asyncio.run(run_async_session(args.requests, args.concurrency, args.latency_ms))
+
+    print(f"Database:              {engine.dialect.name}")
+    print(f"Queries / concurrency: {args.requests} / {args.concurrency}")
+    print(f"Simulated latency:     {args.latency_ms:.1f}ms")
+    print(f"Sync Session:          {sync_seconds:.3f}s ({args.requests / sync_seconds:.0f} req/s)")
+    print(f"AsyncSession:          {async_seconds:.3f}s ({args.requests / async_seconds:.0f} req/s)")
+    print(f"Speedup:               {sync_seconds / async_seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Micro-benchmark for the request middleware: @app.middleware("http") vs pure ASGI.
+
+Builds two copies of a minimal FastAPI app. One uses the old BaseHTTPMiddleware
+versions of log_requests and auth_error_middleware. The other uses
+RequestLoggingMiddleware and AuthErrorMiddleware from backend.middleware. It
+drives both directly through the ASGI interface, so no HTTP client or server
+cost is included. A bare app with no middleware is measured as the baseline,
+and the overhead is reported per request.
+
+Usage (from the repository root):
+    python -m backend.benchmark_middleware --requests 5000
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from fastapi import FastAPI, Request, status
+from fastapi.responses import JSONResponse, StreamingResponse
+from jose import JWTError
+
+from .middleware import AuthErrorMiddleware, RequestLoggingMiddleware
+
+
+def _endpoints(app: FastAPI):
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    @app.get("/stream")
+    async def stream():
+        async def body():
+            for i in range(10):
+                yield f"chunk-{i}\n"
+        return StreamingResponse(body(), media_type="text/plain")
+
+    return app
+
+
+def build_baseline_app() -> FastAPI:
+    return _endpoints(FastAPI())
+
+
+def build_legacy_app() -> FastAPI:
+    """The BaseHTTPMiddleware versions previously defined in main.py."""
+    app = _endpoints(FastAPI())
+    logger = logging.getLogger("backend.main")
+
+    @app.middleware("http")
+    async def auth_error_middleware(request: Request, call_next):
+        try:
+            response = await call_next(request)
+            if response.status_code == status.HTTP_401_UNAUTHORIZED:
+                return JSONResponse(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    content={"detail": {"message": "Session expired", "code": "TOKEN_EXPIRED"}},
+                    headers={"WWW-Authenticate": "Bearer", "X-Error-Type": "token_expired"}
+                )
+            return response
+        except JWTError:
+            return JSONResponse(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                content={"detail": {"message": "Session expired", "code": "TOKEN_EXPIRED"}},
+                headers={"WWW-Authenticate": "Bearer", "X-Error-Type": "token_expired"}
+            )
+
+    @app.middleware("http")
+    async def log_requests(request: Request, call_next):
+        start_time = time.time()
+        method = request.method
+        url = str(request.url)
+        client_host = request.client.host if request.client else "unknown"
+        logger.info(f"Request: {method} {url} from {client_host}")
+        response = await call_next(request)
+        process_time = time.time() - start_time
+        logger.info(f"Response: {response.status_code} for {method} {url} - Took {process_time:.3f}s")
+        response.headers["X-Process-Time"] = str(process_time)
+        return response
+
+    return app
+
+
+def build_asgi_app() -> FastAPI:
+    app = _endpoints(FastAPI())
+    app.add_middleware(AuthErrorMiddleware)
+    app.add_middleware(RequestLoggingMiddleware)
+    return app
+
+
+async def _call(app, path: str):
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"benchmark")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("benchmark", 80),
+    }
+    request_sent = False
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # Nothing else arrives; park like a client that is still connected
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        pass
+
+    await app(scope, receive, send)
+
+
+async def _measure(app, path: str, requests: int) -> float:
+    # Warm up once so the middleware stack is built before timing
+    await _call(app, path)
+    start = time.perf_counter()
+    for _ in range(requests):
+        await _call(app, path)
+    return (time.perf_counter() - start) / requests * 1_000_000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure per-request middleware overhead")
+    parser.add_argument("--requests", type=int, default=5000, help="Requests per app and path")
+    args = parser.parse_args()
+
+    # Keep log formatting out of the measurement; both stacks log the same lines
+    logging.disable(logging.WARNING)
+
+    apps = {
+        "baseline": build_baseline_app(),
+        "legacy": build_legacy_app(),
+        "asgi": build_asgi_app(),
+    }
+
+    for path in ("/ping", "/stream"):
+        results = {name: asyncio.run(_measure(app, path, args.requests)) for name, app in apps.items()}
+        legacy_overhead = results["legacy"] - results["baseline"]
+        asgi_overhead = results["asgi"] - results["baseline"]
+        print(f"GET {path} ({args.requests} requests)")
+        print(f"  No middleware:            {results['baseline']:.1f}us/request")
+        print(f"  BaseHTTPMiddleware:       {results['legacy']:.1f}us/request (+{legacy_overhead:.1f}us)")
+        print(f"  Pure ASGI middleware:     {results['asgi']:.1f}us/request (+{asgi_overhead:.1f}us)")
+
+
+if __name__ == "__main__":
+    main()
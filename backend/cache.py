@@ -0,0 +1,97 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Small thread-safe cache with a per-entry TTL and LRU eviction.
+
+    Used for per-user data that is read on most requests and changes rarely,
+    with explicit invalidation from the CRUD functions that change it.
+    """
+
+    def __init__(self, ttl: float, max_size: int = 1024):
+        self.ttl = ttl
+        self.max_size = max(1, max_size)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return the cached value, or None if it is missing or expired."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def peek(self, key):
+        """Return the cached value without counting a hit or miss or refreshing its LRU position."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                return entry[0]
+            return None
+
+    def set(self, key, value, ttl: float = None):
+        """Store a value, evicting the least recently used entry when full."""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_where(self, predicate):
+        """Drop every entry whose key matches the predicate."""
+        with self._lock:
+            for key in [k for k in self._entries if predicate(k)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
+# Effective permission sets keyed by user ID
+permission_cache = TTLCache(
+    ttl=float(os.getenv("PERMISSION_CACHE_TTL", "300")),
+    max_size=int(os.getenv("PERMISSION_CACHE_SIZE", "4096"))
+)
+
+# Authenticated user snapshots keyed by (email, token expiry)
+user_cache = TTLCache(
+    ttl=float(os.getenv("USER_CACHE_TTL", "60")),
+    max_size=int(os.getenv("USER_CACHE_SIZE", "4096"))
+)
+
+
+def invalidate_user(*emails):
+    """Drop cached snapshots for the given emails across every token."""
+    emails = {e for e in emails if e}
+    if emails:
+        user_cache.invalidate_where(lambda key: key[0] in emails)
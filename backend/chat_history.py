@@ -0,0 +1,365 @@
+"""
+Server-side conversation history and token-budgeted context for chat requests.
+
+Chat endpoints take a thread_id instead of a client-uploaded history array; the
+context is assembled here from the thread's ChatMessage rows, so a turn's request
+body stays the same size however long the thread gets.
+
+Each recently used thread keeps a rolling window of its newest messages in an
+in-process cache, together with the thread's owner. The window is bounded by an
+approximate token budget (CHAT_CONTEXT_TOKEN_BUDGET) rather than a message
+count. Token estimates are computed once, when a message enters the window, and
+one oversized message (a pasted log dump) is clipped to
+CHAT_CONTEXT_MESSAGE_MAX_TOKENS instead of crowding out the rest. The async CRUD
+functions that write messages push them into the window, evicting the oldest
+ones to stay within budget, so a turn costs O(new messages) and no query.
+CHAT_HISTORY_CACHE_TTL bounds how long a window can miss writes made by another
+process.
+
+Tokens are estimated at CHAT_CONTEXT_CHARS_PER_TOKEN characters each, which is
+close enough for budgeting without a model-specific tokenizer.
+"""
+import logging
+import os
+import threading
+from collections import deque
+from typing import List, NamedTuple, Optional, Sequence
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from .cache import TTLCache
+from .database import get_async_sessionmaker
+
+logger = logging.getLogger(__name__)
+
+# Approximate tokens of history a context may hold
+CHAT_CONTEXT_TOKEN_BUDGET = int(os.getenv("CHAT_CONTEXT_TOKEN_BUDGET", "2000"))
+# Larger messages are clipped to this many tokens
+CHAT_CONTEXT_MESSAGE_MAX_TOKENS = int(os.getenv("CHAT_CONTEXT_MESSAGE_MAX_TOKENS", "500"))
+CHAT_CONTEXT_CHARS_PER_TOKEN = float(os.getenv("CHAT_CONTEXT_CHARS_PER_TOKEN", "4"))
+# Hard cap on messages per window, whatever their size
+CHAT_HISTORY_TAIL_SIZE = int(os.getenv("CHAT_HISTORY_TAIL_SIZE", "50"))
+
+# Role label, separator and newline around every message
+MESSAGE_OVERHEAD_TOKENS = 4
+CLIPPED_MARKER = " … [truncated]"
+CONTEXT_HEADER = "Reference context (for understanding only):\n"
+CONTEXT_FOOTER = "\n---\nPlease respond to this message:"
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate token count of a piece of text."""
+    if not text:
+        return 0
+    return int(-(-len(text) // CHAT_CONTEXT_CHARS_PER_TOKEN))
+
+
+FRAME_TOKENS = estimate_tokens(CONTEXT_HEADER) + estimate_tokens(CONTEXT_FOOTER)
+
+
+def _clip_chars(max_tokens: int = CHAT_CONTEXT_MESSAGE_MAX_TOKENS) -> int:
+    """Content characters kept from a clipped message."""
+    content_tokens = max(1, max_tokens - MESSAGE_OVERHEAD_TOKENS - estimate_tokens(CLIPPED_MARKER))
+    return int(content_tokens * CHAT_CONTEXT_CHARS_PER_TOKEN)
+
+
+class HistoryMessage(NamedTuple):
+    id: Optional[int]
+    role: str
+    content: str
+    # Estimated tokens of the rendered line, computed once
+    tokens: int
+    clipped: bool = False
+
+    @property
+    def line(self) -> str:
+        role = "User" if self.role == "user" else "Assistant"
+        return f"{role}: {self.content}\n"
+
+
+def make_message(message_id: Optional[int], role: str, content: str, clipped: bool = False) -> HistoryMessage:
+    """A history entry with its token estimate, clipping content over the per-message cap."""
+    content = content or ""
+    max_chars = _clip_chars()
+    if len(content) > max_chars:
+        content, clipped = content[:max_chars], True
+    if clipped:
+        content += CLIPPED_MARKER
+    return HistoryMessage(message_id, role, content, estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS, clipped)
+
+
+class ChatContext(NamedTuple):
+    """A rendered context and its token accounting."""
+    text: str
+    messages: int
+    tokens: int
+    budget: int
+    # Older messages that exist but didn't fit
+    truncated: bool
+    clipped: int
+
+    def accounting(self) -> dict:
+        return {
+            "context_messages": self.messages,
+            "context_tokens": self.tokens,
+            "context_budget": self.budget,
+            "context_truncated": self.truncated,
+            "context_clipped": self.clipped
+        }
+
+
+def _render(messages: Sequence[HistoryMessage], truncated: bool, budget: int) -> ChatContext:
+    if not messages:
+        return ChatContext("", 0, 0, budget, truncated, 0)
+    text = CONTEXT_HEADER + "".join(message.line for message in messages) + CONTEXT_FOOTER
+    tokens = FRAME_TOKENS + sum(message.tokens for message in messages)
+    return ChatContext(text, len(messages), tokens, budget, truncated, sum(message.clipped for message in messages))
+
+
+class ThreadWindow:
+    """
+    One thread's newest messages within the token budget, oldest first.
+    Mutated only under the owning cache's lock.
+    """
+
+    def __init__(self, user_id: int, budget: int, max_messages: int):
+        self.user_id = user_id
+        self.budget = budget
+        self.max_messages = max_messages
+        self.messages = deque()
+        self.tokens = 0
+        # True once older messages of the thread are outside the window
+        self.truncated = False
+        self._context = None
+
+    @property
+    def message_budget(self) -> int:
+        return max(0, self.budget - FRAME_TOKENS)
+
+    def extend(self, messages: Sequence[HistoryMessage]) -> int:
+        """Append messages and evict the oldest to stay within budget; returns the number evicted."""
+        for message in messages:
+            self.messages.append(message)
+            self.tokens += message.tokens
+        evicted = 0
+        # The newest message always stays, clipped to the per-message cap
+        while len(self.messages) > 1 and (self.tokens > self.message_budget or len(self.messages) > self.max_messages):
+            self.tokens -= self.messages.popleft().tokens
+            evicted += 1
+        if evicted:
+            self.truncated = True
+        self._context = None
+        return evicted
+
+    def context(self, exclude_last: bool = False) -> ChatContext:
+        """The rendered context, reused until the window changes."""
+        if exclude_last:
+            return _render(list(self.messages)[:-1], self.truncated, self.budget)
+        if self._context is None:
+            self._context = _render(self.messages, self.truncated, self.budget)
+        return self._context
+
+
+class ThreadHistoryCache:
+    """
+    Per-thread context windows, keyed by thread id.
+
+    A load that raced with a write is not cached: writes bump a counter, and a
+    load only stores its window if the counter didn't move.
+    """
+
+    def __init__(self, ttl: float, max_threads: int, budget: int = CHAT_CONTEXT_TOKEN_BUDGET,
+                 max_messages: int = CHAT_HISTORY_TAIL_SIZE):
+        self.budget = budget
+        self.max_messages = max(1, max_messages)
+        self._windows = TTLCache(ttl=ttl, max_size=max_threads)
+        self._writes = 0
+        self._lock = threading.Lock()
+
+        # Counters
+        self.loads = 0
+        self.appends = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.contexts_built = 0
+        self.context_tokens = 0
+        self.context_clipped = 0
+
+    async def _window(self, thread_id: int, db: AsyncSession = None) -> Optional[ThreadWindow]:
+        window = self._windows.get(thread_id)
+        if window is not None:
+            return window
+        if db is None:
+            async with get_async_sessionmaker()() as session:
+                return await self._load(session, thread_id)
+        return await self._load(db, thread_id)
+
+    async def _load(self, db: AsyncSession, thread_id: int) -> Optional[ThreadWindow]:
+        with self._lock:
+            writes = self._writes
+        owner = await db.scalar(select(models.ChatThread.user_id).where(models.ChatThread.id == thread_id))
+        if owner is None:
+            return None
+        # Read only as much of each message as could be kept, so one huge message
+        # doesn't get transferred in full; one extra row tells us if there is more
+        max_chars = _clip_chars()
+        message = models.ChatMessage
+        result = await db.execute(
+            select(message.id, message.role, func.substr(message.content, 1, max_chars + 1).label("content"))
+            .where(message.thread_id == thread_id)
+            .order_by(message.created_at.desc(), message.id.desc())
+            .limit(self.max_messages + 1)
+        )
+        rows = result.all()
+        window = ThreadWindow(owner, self.budget, self.max_messages)
+        newest_first = [make_message(row.id, row.role, row.content) for row in rows]
+        kept, tokens = [], 0
+        for entry in newest_first[:self.max_messages]:
+            if kept and tokens + entry.tokens > window.message_budget:
+                break
+            kept.append(entry)
+            tokens += entry.tokens
+        window.extend(list(reversed(kept)))
+        window.truncated = len(kept) < len(rows)
+        with self._lock:
+            self.loads += 1
+            if writes == self._writes:
+                self._windows.set(thread_id, window)
+        return window
+
+    async def get(self, thread_id: int, user_id: int, db: AsyncSession = None) -> Optional[List[HistoryMessage]]:
+        """
+        The messages in the thread's window, oldest first, or None if the thread isn't the user's.
+
+        Leave db as None from request handlers that don't hold a session; a miss then
+        reads through a short-lived one.
+        """
+        window = await self._window(thread_id, db)
+        if window is None or window.user_id != user_id:
+            return None
+        with self._lock:
+            return list(window.messages)
+
+    async def context(self, thread_id: int, user_id: int, message: str = None,
+                      db: AsyncSession = None) -> Optional[ChatContext]:
+        """
+        Context for the next prompt in a thread, or None if the thread isn't the user's.
+        If the client saved the current message before sending it, it is left out.
+        """
+        window = await self._window(thread_id, db)
+        if window is None or window.user_id != user_id:
+            return None
+        with self._lock:
+            last = window.messages[-1] if window.messages else None
+            exclude_last = last is not None and last.role == "user" and message is not None and _same_content(last, message)
+            context = window.context(exclude_last=exclude_last)
+            self.contexts_built += 1
+            self.context_tokens += context.tokens
+            self.context_clipped += context.clipped
+        return context
+
+    def record(self, thread_id: int, messages: Sequence[models.ChatMessage]):
+        """Push newly committed messages into the thread's cached window, if it has one."""
+        with self._lock:
+            self._writes += 1
+            window = self._windows.peek(thread_id)
+            if window is None:
+                return
+            last_id = window.messages[-1].id if window.messages else 0
+            if any(message.id <= last_id for message in messages):
+                # Out of order with what is cached; reload on next use
+                self._windows.invalidate(thread_id)
+                self.invalidations += 1
+                return
+            self.evictions += window.extend([make_message(message.id, message.role, message.content) for message in messages])
+            self.appends += len(messages)
+
+    def forget(self, thread_id: int):
+        """Drop a thread's window after messages were deleted or the thread itself was."""
+        with self._lock:
+            self._writes += 1
+            self._windows.invalidate(thread_id)
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._writes += 1
+            self._windows.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._windows.stats(),
+                "token_budget": self.budget,
+                "message_max_tokens": CHAT_CONTEXT_MESSAGE_MAX_TOKENS,
+                "max_messages": self.max_messages,
+                "loads": self.loads,
+                "appends": self.appends,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "contexts_built": self.contexts_built,
+                "context_tokens": self.context_tokens,
+                "avg_context_tokens": round(self.context_tokens / self.contexts_built, 1) if self.contexts_built else 0,
+                "context_clipped": self.context_clipped
+            }
+
+
+def _same_content(entry: HistoryMessage, message: str) -> bool:
+    """Whether a (possibly clipped) window entry holds the given message."""
+    if entry.clipped:
+        return message.startswith(entry.content[:-len(CLIPPED_MARKER)])
+    return entry.content == message
+
+
+def as_history(history: Sequence) -> List[HistoryMessage]:
+    """Normalize legacy client-supplied history ({"role", "content"} dicts or models)."""
+    normalized = []
+    for item in history or []:
+        if isinstance(item, HistoryMessage):
+            normalized.append(item)
+        elif isinstance(item, dict):
+            normalized.append(make_message(None, item.get("role", "user"), item.get("content", "")))
+        else:
+            normalized.append(make_message(None, item.role, item.content))
+    return normalized
+
+
+def without_current_message(history: List[HistoryMessage], message: str) -> List[HistoryMessage]:
+    """Drop the trailing user message if the client saved the current prompt before sending it."""
+    if history and history[-1].role == "user" and _same_content(history[-1], message):
+        return history[:-1]
+    return history
+
+
+def build_context(history: Sequence, budget: int = CHAT_CONTEXT_TOKEN_BUDGET) -> ChatContext:
+    """
+    Context from a list of messages (oldest first): the newest ones that fit the
+    token budget. Scans from the newest message and stops at the first that doesn't fit.
+    """
+    message_budget = max(0, budget - FRAME_TOKENS)
+    kept, tokens = [], 0
+    for item in reversed(history or []):
+        entry = as_history([item])[0]
+        if kept and tokens + entry.tokens > message_budget:
+            break
+        kept.append(entry)
+        tokens += entry.tokens
+    kept.reverse()
+    return _render(kept, len(kept) < len(history or []), budget)
+
+
+async def build_thread_context(thread_id: int, user_id: int, message: str, db: AsyncSession = None) -> Optional[ChatContext]:
+    """
+    Context for the next prompt in a thread, ending just before `message`.
+    Returns None if the thread isn't the user's.
+    """
+    return await thread_history_cache.context(thread_id, user_id, message, db=db)
+
+
+# Shared context windows, kept current by the async chat CRUD functions
+thread_history_cache = ThreadHistoryCache(
+    ttl=float(os.getenv("CHAT_HISTORY_CACHE_TTL", "300")),
+    max_threads=int(os.getenv("CHAT_HISTORY_CACHE_SIZE", "2048"))
+)
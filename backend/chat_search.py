@@ -0,0 +1,153 @@
+"""
+Full-text search over a user's chat messages.
+
+On PostgreSQL, chat_messages gets a stored generated tsvector column
+(search_vector) and a GIN index. The database keeps the column current for every
+insert and update, whichever code path writes the message. Queries use
+websearch_to_tsquery, so quoted phrases, OR and -exclusions work. Hits are
+ranked with ts_rank_cd. Snippets come from ts_headline and are computed only for
+the rows returned.
+
+Other databases (SQLite in development) fall back to a case-insensitive LIKE
+per search term, ranked by the number of terms matched.
+"""
+import html
+import logging
+import os
+import re
+from typing import List, Optional
+
+from sqlalchemy import case, func, literal, literal_column, or_, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+
+logger = logging.getLogger(__name__)
+
+# Text search configuration used to build and query the tsvector column
+CHAT_SEARCH_LANGUAGE = os.getenv("CHAT_SEARCH_LANGUAGE", "english")
+if not re.fullmatch(r"[A-Za-z_]+", CHAT_SEARCH_LANGUAGE):
+    raise ValueError(f"Invalid CHAT_SEARCH_LANGUAGE: {CHAT_SEARCH_LANGUAGE}")
+
+_REGCONFIG = literal_column(f"'{CHAT_SEARCH_LANGUAGE}'::regconfig")
+
+SEARCH_COLUMN = "search_vector"
+SEARCH_INDEX = "ix_chat_messages_search_vector"
+
+# Private-use characters mark matches in headlines; they are turned into <mark>
+# tags after the rest of the snippet has been HTML-escaped
+_MATCH_START = "\ue000"
+_MATCH_END = "\ue001"
+_HEADLINE_OPTIONS = f"StartSel={_MATCH_START}, StopSel={_MATCH_END}, MaxFragments=2, MaxWords=30, MinWords=10, FragmentDelimiter=\" … \""
+SNIPPET_CHARS = 240
+
+
+def ensure_chat_search_schema(engine):
+    """Add the generated tsvector column and its GIN index on PostgreSQL."""
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"ALTER TABLE {models.ChatMessage.__tablename__} ADD COLUMN IF NOT EXISTS {SEARCH_COLUMN} tsvector "
+            f"GENERATED ALWAYS AS (to_tsvector('{CHAT_SEARCH_LANGUAGE}', coalesce(content, ''))) STORED"
+        ))
+        conn.execute(text(
+            f"CREATE INDEX IF NOT EXISTS {SEARCH_INDEX} ON {models.ChatMessage.__tablename__} USING GIN ({SEARCH_COLUMN})"
+        ))
+
+
+def _render_snippet(headline: str) -> str:
+    """HTML-escape a headline and wrap the matched words in <mark>."""
+    escaped = html.escape(headline)
+    return escaped.replace(_MATCH_START, "<mark>").replace(_MATCH_END, "</mark>")
+
+
+def _search_terms(query: str) -> List[str]:
+    return [term for term in re.findall(r"\w+", query.lower()) if len(term) > 1][:10]
+
+
+def _fallback_snippet(content: str, terms: List[str]) -> str:
+    """Window of content around the first matched term, with every term marked."""
+    lowered = content.lower()
+    positions = [lowered.find(term) for term in terms if term in lowered]
+    first = min(positions) if positions else 0
+    start = max(0, first - SNIPPET_CHARS // 3)
+    window = content[start:start + SNIPPET_CHARS]
+    pattern = re.compile("|".join(re.escape(term) for term in terms), re.IGNORECASE)
+    marked = pattern.sub(lambda match: f"{_MATCH_START}{match.group(0)}{_MATCH_END}", window)
+    prefix = "… " if start > 0 else ""
+    suffix = " …" if start + SNIPPET_CHARS < len(content) else ""
+    return _render_snippet(prefix + marked + suffix)
+
+
+async def search_messages(
+    db: AsyncSession,
+    user_id: int,
+    query: str,
+    limit: int = 20,
+    thread_id: Optional[int] = None
+) -> List[dict]:
+    """Return the user's best-matching messages with thread ids and highlighted snippets."""
+    message = models.ChatMessage.__table__
+    thread = models.ChatThread.__table__
+    scope = [thread.c.user_id == user_id]
+    if thread_id is not None:
+        scope.append(message.c.thread_id == thread_id)
+
+    if db.get_bind().dialect.name == "postgresql":
+        tsquery = func.websearch_to_tsquery(_REGCONFIG, query)
+        search_vector = literal_column(f"{message.name}.{SEARCH_COLUMN}")
+        rank = func.ts_rank_cd(search_vector, tsquery)
+        # Rank and limit first so ts_headline only runs on the rows returned
+        top = (
+            select(message.c.id, message.c.thread_id, message.c.role, message.c.content,
+                   message.c.created_at, thread.c.title, rank.label("rank"))
+            .select_from(message.join(thread, thread.c.id == message.c.thread_id))
+            .where(*scope, search_vector.op("@@")(tsquery))
+            .order_by(rank.desc(), message.c.created_at.desc())
+            .limit(limit)
+            .subquery()
+        )
+        headline = func.ts_headline(_REGCONFIG, top.c.content, tsquery, _HEADLINE_OPTIONS)
+        result = await db.execute(
+            select(top.c.id, top.c.thread_id, top.c.role, top.c.created_at, top.c.title, top.c.rank, headline.label("headline"))
+            .order_by(top.c.rank.desc(), top.c.created_at.desc())
+        )
+        return [
+            {
+                "message_id": row.id,
+                "thread_id": row.thread_id,
+                "thread_title": row.title,
+                "role": row.role,
+                "created_at": row.created_at,
+                "rank": float(row.rank),
+                "snippet": _render_snippet(row.headline)
+            }
+            for row in result
+        ]
+
+    terms = _search_terms(query)
+    if not terms:
+        return []
+    matches = [message.c.content.icontains(term, autoescape=True) for term in terms]
+    matched_terms = sum((case((match, 1), else_=0) for match in matches), literal(0))
+    result = await db.execute(
+        select(message.c.id, message.c.thread_id, message.c.role, message.c.content,
+               message.c.created_at, thread.c.title, matched_terms.label("rank"))
+        .select_from(message.join(thread, thread.c.id == message.c.thread_id))
+        .where(*scope, or_(*matches))
+        .order_by(matched_terms.desc(), message.c.created_at.desc())
+        .limit(limit)
+    )
+    return [
+        {
+            "message_id": row.id,
+            "thread_id": row.thread_id,
+            "thread_title": row.title,
+            "role": row.role,
+            "created_at": row.created_at,
+            "rank": float(row.rank) / len(terms),
+            "snippet": _fallback_snippet(row.content, terms)
+        }
+        for row in result
+    ]
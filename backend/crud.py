@@ -6,6 +6,7 @@ from typing import List, Optional
 from sqlalchemy.exc import IntegrityError
 from passlib.context import CryptContext
 from sqlalchemy.sql import func
+from sqlalchemy import select, literal, union_all
 from fastapi import HTTPException
 
 # Use relative imports
@@ -13,6 +14,7 @@ from . import models
 from . import schemas
 # Import from the utils package
 from .utils import get_password_hash, verify_password
+from .cache import permission_cache, invalidate_user
 
 # Password hashing setup (consider moving to utils.py if not already there)
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -47,6 +49,7 @@ def update_user_password(db: Session, user: models.User, new_password: str) -> m
     db.add(user)
     db.commit()
     db.refresh(user)
+    invalidate_user(user.email)
     return user
 
 def update_user(db: Session, user_id: int, user_update: schemas.UserUpdate) -> models.User:
@@ -66,12 +69,14 @@ def update_user(db: Session, user_id: int, user_update: schemas.UserUpdate) -> m
         logger.debug(f"User {user_id} activation status change: {previous_status} -> {new_status}")
     
     # Apply all updates
+    previous_email = db_user.email
     for key, value in update_data.items():
         setattr(db_user, key, value)
     
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    invalidate_user(previous_email, db_user.email)
     
     # Log the final state after update
     logger.debug(f"User {user_id} updated. Current state: id={db_user.id}, email={db_user.email}, is_active={db_user.is_active}, is_admin={db_user.is_admin}")
@@ -83,8 +88,11 @@ def delete_user(db: Session, user_id: int) -> bool:
     if not db_user:
         return False
     
+    email = db_user.email
     db.delete(db_user)
     db.commit()
+    permission_cache.invalidate(user_id)
+    invalidate_user(email)
     return True
 
 # === Provider Access CRUD ===
@@ -317,6 +325,8 @@ def delete_role(db: Session, role_id: int) -> bool:
     if db_role:
         db.delete(db_role)
         db.commit()
+        # Every holder of the role loses its permissions
+        permission_cache.clear()
         return True
     return False
 
@@ -332,6 +342,7 @@ def create_role_permission(db: Session, permission: schemas.RolePermissionCreate
     db.add(db_permission)
     db.commit()
     db.refresh(db_permission)
+    permission_cache.clear()
     return db_permission
 
 def delete_role_permission(db: Session, permission_id: int) -> bool:
@@ -339,6 +350,7 @@ def delete_role_permission(db: Session, permission_id: int) -> bool:
     if db_permission:
         db.delete(db_permission)
         db.commit()
+        permission_cache.clear()
         return True
     return False
 
@@ -354,13 +366,16 @@ def create_user_role(db: Session, user_role: schemas.UserRoleCreate) -> models.U
     db.add(db_user_role)
     db.commit()
     db.refresh(db_user_role)
+    permission_cache.invalidate(db_user_role.user_id)
     return db_user_role
 
 def delete_user_role(db: Session, user_role_id: int) -> bool:
     db_user_role = get_user_role(db, user_role_id)
     if db_user_role:
+        user_id = db_user_role.user_id
         db.delete(db_user_role)
         db.commit()
+        permission_cache.invalidate(user_id)
         return True
     return False
 
@@ -376,6 +391,7 @@ def create_user_permission(db: Session, permission: schemas.UserRolePermissionCr
     db.add(db_permission)
     db.commit()
     db.refresh(db_permission)
+    permission_cache.invalidate(db_permission.user_id)
     return db_permission
 
 def update_user_permission(db: Session, permission_id: int, granted: bool) -> Optional[models.UserRolePermission]:
@@ -385,16 +401,46 @@ def update_user_permission(db: Session, permission_id: int, granted: bool) -> Op
         db.add(db_permission)
         db.commit()
         db.refresh(db_permission)
+        permission_cache.invalidate(db_permission.user_id)
     return db_permission
 
 def delete_user_permission(db: Session, permission_id: int) -> bool:
     db_permission = get_user_permission(db, permission_id)
     if db_permission:
+        user_id = db_permission.user_id
         db.delete(db_permission)
         db.commit()
+        permission_cache.invalidate(user_id)
         return True
     return False
 
+def get_effective_permissions(db: Session, user_id: int) -> dict:
+    """
+    Resolve a user's effective permissions in a single query.
+    Role permissions grant; user-specific rows then grant or revoke on top.
+    """
+    role_permissions = select(
+        models.RolePermission.permission,
+        literal(None).label("granted")
+    ).join(
+        models.UserRole, models.UserRole.role_id == models.RolePermission.role_id
+    ).where(models.UserRole.user_id == user_id)
+    
+    user_overrides = select(
+        models.UserRolePermission.permission,
+        models.UserRolePermission.granted
+    ).where(models.UserRolePermission.user_id == user_id)
+    
+    permissions = {}
+    overrides = {}
+    for permission, granted in db.execute(union_all(role_permissions, user_overrides)):
+        if granted is None:
+            permissions[permission] = True
+        else:
+            overrides[permission] = bool(granted)
+    permissions.update(overrides)
+    return permissions
+
 # === Provider Config CRUD ===
 
 def get_provider_config(db: Session, user_id: int, provider: str) -> Optional[models.ProviderConfig]:
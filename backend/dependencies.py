@@ -10,10 +10,12 @@ from dotenv import load_dotenv
 # Set up logger
 logger = logging.getLogger("backend.dependencies")
 
-from .database import get_db
+from .database import get_db, get_async_sessionmaker
 from . import models
 from . import schemas
 from . import crud
+from . import async_crud
+from .cache import permission_cache, user_cache
 # Import directly from utils.py
 import os
 
@@ -30,6 +32,8 @@ if not SECRET_KEY:
 
 # Use correct token URL with leading slash
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
+# Same scheme for endpoints that also serve anonymous callers
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login", auto_error=False)
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
@@ -41,7 +45,7 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail={"message": "Session expired", "code": "TOKEN_EXPIRED"},
@@ -56,16 +60,34 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         if email is None:
             raise credentials_exception
         token_data = schemas.TokenData(email=email)
+        expires_at = payload.get("exp")
     except JWTError as e:
         logger.error(f"JWT Error: {e}")
         raise credentials_exception
 
-    user = crud.get_user_by_email(db, email=token_data.email)
-    if user is None:
-        raise credentials_exception
-    return user
+    # Serve repeat requests with the same token from the principal cache
+    cache_key = (token_data.email, expires_at)
+    principal = user_cache.get(cache_key)
+    if principal is not None:
+        return principal
+
+    # Look the user up in its own short async session so authentication neither
+    # blocks the event loop nor leaves a connection checked out for the request
+    async with get_async_sessionmaker()() as db:
+        user = await async_crud.get_user_by_email(db, email=token_data.email)
+        if user is None:
+            raise credentials_exception
+        principal = schemas.UserPrincipal.model_validate(user)
 
-async def get_current_active_user(current_user: models.User = Depends(get_current_user)):
+    # Never keep an entry past the token's own expiry
+    ttl = user_cache.ttl
+    if expires_at is not None:
+        ttl = min(ttl, float(expires_at) - datetime.now(timezone.utc).timestamp())
+    if ttl > 0:
+        user_cache.set(cache_key, principal, ttl=ttl)
+    return principal
+
+async def get_current_active_user(current_user: schemas.UserPrincipal = Depends(get_current_user)):
     # Check if user is authenticated
     if not current_user.is_authenticated:
         raise HTTPException(status_code=400, detail="Inactive user")
@@ -80,6 +102,12 @@ async def get_current_active_user(current_user: models.User = Depends(get_curren
     
     return current_user
 
+async def get_optional_active_user(token: str | None = Depends(optional_oauth2_scheme)):
+    """The active user when a bearer token is sent, None for anonymous requests."""
+    if not token:
+        return None
+    return await get_current_active_user(await get_current_user(token))
+
 def get_current_admin_user(current_user: models.User = Depends(get_current_active_user)):
     if not current_user.is_admin:
         raise HTTPException(
@@ -90,27 +118,14 @@ def get_current_admin_user(current_user: models.User = Depends(get_current_activ
 
 # RBAC utility functions
 def get_user_permissions(db: Session, user_id: int):
-    # Get all permissions from user's roles
-    permissions = {}
-    
-    # Get user's roles
-    user_roles = crud.get_user_roles(db, user_id=user_id)
-    
-    # For each role, get permissions
-    for user_role in user_roles:
-        role_permissions = crud.get_role_permissions(db, role_id=user_role.role_id)
-        for perm in role_permissions:
-            permissions[perm.permission] = True
-    
-    # Get user-specific permissions (overrides)
-    user_permissions = crud.get_user_permissions(db, user_id=user_id)
-    for perm in user_permissions:
-        # User-specific permissions can grant or revoke permissions
-        if perm.granted:
-            permissions[perm.permission] = True
-        else:
-            permissions[perm.permission] = False
-    
+    """
+    Return the user's effective permissions as {permission: granted}.
+    Served from the permission cache; CRUD writes to roles and permissions invalidate it.
+    """
+    permissions = permission_cache.get(user_id)
+    if permissions is None:
+        permissions = crud.get_effective_permissions(db, user_id)
+        permission_cache.set(user_id, permissions)
     return permissions
 
 def has_permission(permission: str, current_user: models.User = Depends(get_current_active_user), db: Session = Depends(get_db)):
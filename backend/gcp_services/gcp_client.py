@@ -1,20 +1,30 @@
 import logging
-import httpx
+import os
 import time
 import json
-from backend.models import GcpSettings
-from backend.database import get_db
+import httpx
 from sqlalchemy.orm import Session
 from backend.routers.logs import add_log
+from backend.gcp_services.http_client import get_gcp_http_client, SESSION_TIMEOUT, RUN_TIMEOUT
+from backend.gcp_services.session_registry import gcp_session_registry
+from backend.settings_cache import agent_settings_cache, GcpAgentSettings
+from backend.metrics import record_upstream
 
-def get_active_gcp_settings(db: Session):
-    settings = db.query(GcpSettings).filter(GcpSettings.is_active == True).first()
+class GcpRequestError(Exception):
+    """Raised when the GCP agent answers with an error status"""
+    def __init__(self, message: str, status_code: int = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+async def get_active_gcp_settings(db: Session = None) -> GcpAgentSettings:
+    # Served from the in-process settings cache; a miss is read on a worker thread
+    settings = await agent_settings_cache.get_gcp_async(db)
     if not settings:
         raise Exception("No active GCP settings found.")
     return settings
 
-def start_gcp_session(session_id: str, db: Session):
-    settings = get_active_gcp_settings(db)
+async def start_gcp_session(session_id: str, db: Session = None, settings: GcpAgentSettings = None):
+    settings = settings or await get_active_gcp_settings(db)
     # Use session_endpoint for session creation
     url = settings.session_endpoint.rstrip('/')
     
@@ -42,46 +52,50 @@ def start_gcp_session(session_id: str, db: Session):
     start_time = time.time()
     
     try:
-        with httpx.Client() as client:
-            logging.info(f"[GCP CALL] Sending POST request to {url}...")
-            logging.info(f"[GCP CALL] Request payload: {json.dumps(payload, default=str)}")
-            resp = client.post(url, json=payload)
-            logging.info(f"[GCP CALL] Response status: {resp.status_code}")
-            logging.info(f"[GCP CALL] Response body: {resp.text}")
-            
-            # Calculate duration
-            duration_ms = int((time.time() - start_time) * 1000)
-            logging.info(f"GCP session response: {resp.status_code} {resp.text}")
-            
-            # Create response log entry
-            response_data = resp.json() if resp.text and resp.status_code < 400 else {}
-            response_log = {
-                "log_type": "response",
+        client = get_gcp_http_client()
+        logging.info(f"[GCP CALL] Sending POST request to {url}...")
+        logging.info(f"[GCP CALL] Request payload: {json.dumps(payload, default=str)}")
+        resp = await client.post(url, json=payload, timeout=SESSION_TIMEOUT)
+        record_upstream("gcp", "create_session", time.time() - start_time, success=resp.status_code < 400)
+        logging.info(f"[GCP CALL] Response status: {resp.status_code}")
+        logging.info(f"[GCP CALL] Response body: {resp.text}")
+        
+        # Calculate duration
+        duration_ms = int((time.time() - start_time) * 1000)
+        logging.info(f"GCP session response: {resp.status_code} {resp.text}")
+        
+        # Create response log entry
+        response_data = resp.json() if resp.text and resp.status_code < 400 else {}
+        response_log = {
+            "log_type": "response",
+            "provider": "gcp",
+            "session_id": session_id,
+            "endpoint": url,
+            "response_data": response_data,
+            "status_code": resp.status_code,
+            "duration_ms": duration_ms
+        }
+        add_log(db, response_log)
+        
+        if resp.status_code >= 400:
+            error_msg = f"Failed to start GCP session: {resp.text}"
+            # Log error
+            error_log = {
+                "log_type": "error",
                 "provider": "gcp",
                 "session_id": session_id,
                 "endpoint": url,
-                "response_data": response_data,
-                "status_code": resp.status_code,
-                "duration_ms": duration_ms
+                "error_message": error_msg,
+                "status_code": resp.status_code
             }
-            add_log(db, response_log)
+            add_log(db, error_log)
+            raise GcpRequestError(error_msg, resp.status_code)
             
-            if resp.status_code >= 400:
-                error_msg = f"Failed to start GCP session: {resp.text}"
-                # Log error
-                error_log = {
-                    "log_type": "error",
-                    "provider": "gcp",
-                    "session_id": session_id,
-                    "endpoint": url,
-                    "error_message": error_msg,
-                    "status_code": resp.status_code
-                }
-                add_log(db, error_log)
-                raise Exception(error_msg)
-                
-            return response_data
+        return response_data
     except Exception as e:
+        # Transport failures and timeouts never produced a response to record above
+        if isinstance(e, httpx.HTTPError):
+            record_upstream("gcp", "create_session", time.time() - start_time, success=False)
         # Log any exceptions
         error_log = {
             "log_type": "error",
@@ -93,38 +107,62 @@ def start_gcp_session(session_id: str, db: Session):
         add_log(db, error_log)
         raise
 
-def send_gcp_message(session_id: str, new_message: dict, db: Session, app_name: str = None, user_id = None, start_session: bool = True):
+def session_already_exists(error: GcpRequestError) -> bool:
+    """Whether a failed session creation means the session is already there upstream"""
+    if error.status_code == 409:
+        return True
+    return error.status_code == 400 and "already exists" in str(error).lower()
+
+async def ensure_gcp_session(session_id: str, db: Session = None, force: bool = False):
+    """
+    Create the GCP session unless it is already known to exist on the active endpoint.
+    Returns True if a session creation call was made.
+    """
+    settings = await get_active_gcp_settings(db)
+    if not force and gcp_session_registry.is_created(settings.session_endpoint, session_id):
+        logging.info(f"GCP session {session_id} already created, skipping session call")
+        return False
+    
+    try:
+        await start_gcp_session(session_id, db, settings=settings)
+    except GcpRequestError as e:
+        # Sessions outlive this process and clients may reuse ids; an existing one is usable
+        if not session_already_exists(e):
+            raise
+        logging.info(f"GCP session {session_id} already exists upstream")
+    gcp_session_registry.mark_created(settings.session_endpoint, session_id)
+    return True
+
+async def invalidate_gcp_session(session_id: str, db: Session = None):
+    """Forget a session so the next turn creates it again"""
+    settings = await get_active_gcp_settings(db)
+    gcp_session_registry.invalidate(settings.session_endpoint, session_id)
+
+async def send_gcp_message(session_id: str, new_message: dict, db: Session = None, app_name: str = None, user_id = None, start_session: bool = True):
     try:
-        settings = get_active_gcp_settings(db)
+        settings = await get_active_gcp_settings(db)
         # Get the base URL for the GCP agent
         url = settings.agent_run_endpoint.rstrip('/')
         logging.info(f"GCP agent endpoint URL: {url}")
 
-        # Extract app_name and user_id from the session_endpoint to ensure consistency
-        session_url = settings.session_endpoint.rstrip('/')
-        import re
-        
-        # Extract app_name from session URL
-        app_match = re.search(r"/apps/([^/]+)/", session_url)
-        if app_match and not app_name:
-            app_name = app_match.group(1)
+        # Use app_name and user_id parsed from the session_endpoint to ensure consistency
+        if settings.app_name and not app_name:
+            app_name = settings.app_name
             logging.info(f"Using app_name from session URL: {app_name}")
         elif not app_name:
             app_name = os.getenv("APP_NAME", "agentic_adk")
             logging.info(f"Using default app_name: {app_name}")
         
-        # Extract user_id from session URL
-        user_match = re.search(r"/users/([^/]+)/", session_url)
-        if user_match and not user_id:
-            user_id = user_match.group(1)
+        if settings.user_id and not user_id:
+            user_id = settings.user_id
             logging.info(f"Using user_id from session URL: {user_id}")
         elif not user_id:
             user_id = f"u_{int(time.time())}"
             logging.info(f"Generated user_id: {user_id}")
         else:
             # If user_id is provided but doesn't match the session URL, use the one from the URL
-            if user_match:
-                user_id = user_match.group(1)
+            if settings.user_id:
+                user_id = settings.user_id
                 logging.info(f"Overriding provided user_id with one from session URL: {user_id}")
             else:
                 user_id = str(user_id)
@@ -197,52 +235,58 @@ def send_gcp_message(session_id: str, new_message: dict, db: Session, app_name:
     start_time = time.time()
     
     try:
-        # Set timeout to avoid hanging requests
-        with httpx.Client(timeout=30.0) as client:
-            resp = client.post(url, json=payload)
-            
-            # Calculate duration
-            duration_ms = int((time.time() - start_time) * 1000)
-            logging.info(f"GCP agent response: {resp.status_code} {resp.text[:200]}...")  # Limit log size
-            
-            # Parse response data
-            try:
-                if resp.text:
-                    response_data = resp.json()
-                else:
-                    response_data = {}
-            except json.JSONDecodeError as jde:
-                logging.error(f"Failed to parse JSON response: {str(jde)}")
-                response_data = {"raw_text": resp.text[:500]}  # Limit size for logging
-            
-            # Create response log entry
-            response_log = {
-                "log_type": "response",
+        # Reuse the pooled client; the run endpoint has its own timeout
+        client = get_gcp_http_client()
+        resp = await client.post(url, json=payload, timeout=RUN_TIMEOUT)
+        record_upstream("gcp", "run", time.time() - start_time, success=resp.status_code < 400)
+        
+        # Calculate duration
+        duration_ms = int((time.time() - start_time) * 1000)
+        logging.info(f"GCP agent response: {resp.status_code} {resp.text[:200]}...")  # Limit log size
+        
+        # Parse response data
+        try:
+            if resp.text:
+                response_data = resp.json()
+            else:
+                response_data = {}
+        except json.JSONDecodeError as jde:
+            logging.error(f"Failed to parse JSON response: {str(jde)}")
+            response_data = {"raw_text": resp.text[:500]}  # Limit size for logging
+        
+        # Create response log entry
+        response_log = {
+            "log_type": "response",
+            "provider": "gcp",
+            "session_id": session_id,
+            "endpoint": url,
+            "response_data": response_data,
+            "status_code": resp.status_code,
+            "duration_ms": duration_ms
+        }
+        add_log(db, response_log)
+        
+        if resp.status_code >= 400:
+            error_msg = f"Failed to send GCP message: {resp.text}"
+            # Log error
+            error_log = {
+                "log_type": "error",
                 "provider": "gcp",
                 "session_id": session_id,
                 "endpoint": url,
-                "response_data": response_data,
-                "status_code": resp.status_code,
-                "duration_ms": duration_ms
+                "error_message": error_msg,
+                "status_code": resp.status_code
             }
-            add_log(db, response_log)
-            
-            if resp.status_code >= 400:
-                error_msg = f"Failed to send GCP message: {resp.text}"
-                # Log error
-                error_log = {
-                    "log_type": "error",
-                    "provider": "gcp",
-                    "session_id": session_id,
-                    "endpoint": url,
-                    "error_message": error_msg,
-                    "status_code": resp.status_code
-                }
-                add_log(db, error_log)
-                raise Exception(error_msg)
-                
-            return response_data
+            add_log(db, error_log)
+            raise GcpRequestError(error_msg, resp.status_code)
+        
+        # A successful run proves the session exists, so later turns skip the session call
+        gcp_session_registry.mark_created(settings.session_endpoint, session_id)
+        return response_data
     except Exception as e:
+        # Transport failures and timeouts never produced a response to record above
+        if isinstance(e, httpx.HTTPError):
+            record_upstream("gcp", "run", time.time() - start_time, success=False)
         # Log any exceptions
         error_log = {
             "log_type": "error",
@@ -0,0 +1,79 @@
+import logging
+import os
+
+import httpx
+
+logger = logging.getLogger("gcp_http_client")
+
+# Connection pool settings for the shared GCP agent client
+GCP_HTTP_MAX_CONNECTIONS = int(os.getenv("GCP_HTTP_MAX_CONNECTIONS", "100"))
+GCP_HTTP_MAX_KEEPALIVE = int(os.getenv("GCP_HTTP_MAX_KEEPALIVE", "20"))
+GCP_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("GCP_HTTP_KEEPALIVE_EXPIRY", "30"))
+# HTTP/2 is used when the h2 package is installed unless GCP_HTTP2 says otherwise
+GCP_HTTP2 = os.getenv("GCP_HTTP2")
+
+# Per-endpoint timeouts (seconds). Session creation is a quick POST; agent runs can take a while.
+SESSION_TIMEOUT = httpx.Timeout(
+    float(os.getenv("GCP_SESSION_TIMEOUT", "10")),
+    connect=float(os.getenv("GCP_CONNECT_TIMEOUT", "5"))
+)
+RUN_TIMEOUT = httpx.Timeout(
+    float(os.getenv("GCP_RUN_TIMEOUT", "30")),
+    connect=float(os.getenv("GCP_CONNECT_TIMEOUT", "5"))
+)
+
+_client = None
+
+
+def _http2_available() -> bool:
+    # HTTP/2 needs the optional h2 package
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _create_client() -> httpx.AsyncClient:
+    wanted = GCP_HTTP2 is None or GCP_HTTP2.lower() in ("1", "true", "yes")
+    http2 = wanted and _http2_available()
+    if GCP_HTTP2 is not None and wanted and not http2:
+        logger.warning("GCP_HTTP2 is enabled but the h2 package is not installed, using HTTP/1.1")
+    logger.info(
+        f"Creating GCP HTTP client (max_connections={GCP_HTTP_MAX_CONNECTIONS}, "
+        f"max_keepalive={GCP_HTTP_MAX_KEEPALIVE}, http2={http2})"
+    )
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=GCP_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=GCP_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=GCP_HTTP_KEEPALIVE_EXPIRY
+        ),
+        timeout=RUN_TIMEOUT
+    )
+
+
+async def start_gcp_http_client():
+    """Create the shared client. Called from main.lifespan."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _create_client()
+    return _client
+
+
+def get_gcp_http_client() -> httpx.AsyncClient:
+    """Return the shared client, creating it if the app lifespan hasn't."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _create_client()
+    return _client
+
+
+async def close_gcp_http_client():
+    """Close pooled connections. Called on shutdown."""
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+        logger.info("GCP HTTP client closed")
+    _client = None
@@ -0,0 +1,77 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger("gcp_session_registry")
+
+# How long a created session is trusted before it is created again (seconds)
+GCP_SESSION_TTL = float(os.getenv("GCP_SESSION_TTL", "3600"))
+GCP_SESSION_REGISTRY_SIZE = int(os.getenv("GCP_SESSION_REGISTRY_SIZE", "10000"))
+
+
+class GcpSessionRegistry:
+    """
+    Remembers which session IDs were already created on a GCP session endpoint.
+
+    Entries expire after a TTL, the oldest entries are evicted when the registry is
+    full, and everything is cleared when the active GCP settings change.
+    """
+
+    def __init__(self, ttl: float = GCP_SESSION_TTL, max_size: int = GCP_SESSION_REGISTRY_SIZE):
+        self.ttl = ttl
+        self.max_size = max(1, max_size)
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def is_created(self, session_endpoint: str, session_id: str) -> bool:
+        """Return True if the session is known to exist on this endpoint."""
+        key = (session_endpoint, session_id)
+        now = time.monotonic()
+        with self._lock:
+            expires_at = self._sessions.get(key)
+            if expires_at is not None and expires_at > now:
+                self._sessions.move_to_end(key)
+                self.hits += 1
+                return True
+            if expires_at is not None:
+                del self._sessions[key]
+            self.misses += 1
+            return False
+
+    def mark_created(self, session_endpoint: str, session_id: str):
+        """Record that the session now exists on this endpoint."""
+        key = (session_endpoint, session_id)
+        with self._lock:
+            self._sessions[key] = time.monotonic() + self.ttl
+            self._sessions.move_to_end(key)
+            while len(self._sessions) > self.max_size:
+                self._sessions.popitem(last=False)
+
+    def invalidate(self, session_endpoint: str, session_id: str):
+        """Forget a session, e.g. after the agent reports it doesn't exist."""
+        with self._lock:
+            self._sessions.pop((session_endpoint, session_id), None)
+
+    def clear(self):
+        """Forget every session. Called when the GCP settings change."""
+        with self._lock:
+            self._sessions.clear()
+        logger.info("GCP session registry cleared")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._sessions),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
+# Shared registry for the GCP chat path
+gcp_session_registry = GcpSessionRegistry()
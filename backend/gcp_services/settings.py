@@ -2,6 +2,8 @@ from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.orm import Session
 from backend.models import GcpSettings
 from backend.database import get_db
+from backend.gcp_services.session_registry import gcp_session_registry
+from backend.settings_cache import agent_settings_cache
 import logging
 
 # Define router without prefix to match our successful test
@@ -34,5 +36,9 @@ def set_gcp_settings(data: dict, db: Session = Depends(get_db)):
     db.add(new_settings)
     db.commit()
     db.refresh(new_settings)
+    # Make the chat path pick up the new endpoints
+    agent_settings_cache.invalidate()
+    # Sessions created on the old endpoints don't exist on the new ones
+    gcp_session_registry.clear()
     logger.info(f"Saved new GCP settings: {new_settings}")
     return {"message": "GCP settings updated.", "id": new_settings.id}
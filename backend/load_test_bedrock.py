@@ -0,0 +1,93 @@
+"""
+Load test for invoke_bedrock_agent against a stubbed Bedrock agent client.
+
+Runs the same number of concurrent chats twice: once with the agent call made
+inline on the event loop (the old behaviour) and once through the Bedrock
+executor. With the executor, N concurrent chats should take about as long as one.
+
+Usage (from the repository root):
+    python -m backend.load_test_bedrock --concurrency 10 --latency 0.5
+"""
+import argparse
+import asyncio
+import os
+import time
+
+# The Bedrock module imports the database and auth modules, which require these settings
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SECRET_KEY", "load-test-secret")
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "AKIALOADTEST")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "load-test-secret")
+
+from . import models
+from .aws_services import bedrock_client
+from .database import engine
+from .aws_services.executor import shutdown_bedrock_executor
+
+
+class StubAgentClient:
+    """Mimics bedrock-agent-runtime: a blocking invoke followed by a streamed completion."""
+
+    def __init__(self, latency: float, chunks: int = 5):
+        self.latency = latency
+        self.chunks = chunks
+
+    def _completion(self):
+        # Split the latency between time-to-first-byte and the streamed chunks
+        for i in range(self.chunks):
+            time.sleep(self.latency / (2 * self.chunks))
+            yield {"chunk": {"bytes": f"chunk-{i} ".encode("utf-8")}}
+
+    def invoke_agent(self, **kwargs):
+        time.sleep(self.latency / 2)
+        return {"completion": self._completion()}
+
+
+async def run_inline(stub, concurrency):
+    """Old behaviour: the blocking call runs directly inside the coroutine."""
+    async def one(i):
+        return bedrock_client.invoke_agent_and_collect(stub, "agent", "alias", f"session-{i}", "hello")
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(concurrency)))
+    return time.perf_counter() - start
+
+
+async def run_executor(stub, concurrency):
+    """New behaviour: invoke_bedrock_agent hands the call to the Bedrock executor."""
+    original = bedrock_client.get_bedrock_agent_client
+    bedrock_client.get_bedrock_agent_client = lambda **kwargs: stub
+    try:
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            bedrock_client.invoke_bedrock_agent("hello", session_id=f"session-{i}", agent_id="agent", agent_alias_id="alias")
+            for i in range(concurrency)
+        ))
+        return time.perf_counter() - start
+    finally:
+        bedrock_client.get_bedrock_agent_client = original
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test invoke_bedrock_agent with a stubbed agent")
+    parser.add_argument("--concurrency", type=int, default=10, help="Number of concurrent chats")
+    parser.add_argument("--latency", type=float, default=0.5, help="Simulated agent latency in seconds")
+    args = parser.parse_args()
+
+    # Settings and API logs are read and written through short-lived sessions
+    models.Base.metadata.create_all(bind=engine)
+
+    stub = StubAgentClient(args.latency)
+    inline = asyncio.run(run_inline(stub, args.concurrency))
+    pooled = asyncio.run(run_executor(stub, args.concurrency))
+    shutdown_bedrock_executor()
+
+    print(f"Concurrent chats:      {args.concurrency}")
+    print(f"Single chat latency:   {args.latency:.3f}s")
+    print(f"Inline (blocking):     {inline:.3f}s")
+    print(f"Bedrock executor:      {pooled:.3f}s")
+    print(f"Speedup:               {inline / pooled:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
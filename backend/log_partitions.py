@@ -0,0 +1,281 @@
+"""
+Index, partition and retention maintenance for the api_logs table.
+
+create_all() only adds indexes when it creates a table, so the composite indexes
+declared on ApiLog are added to existing databases here.
+
+On PostgreSQL, API_LOGS_PARTITIONING=true makes api_logs a table partitioned by
+month on timestamp. Partitions for the current month and the next
+API_LOGS_PARTITIONS_AHEAD months are created at startup and on every maintenance
+run. A default partition catches rows outside those ranges. With
+API_LOGS_RETENTION_MONTHS set, months that have fully aged out are dropped as
+whole partitions. Unpartitioned tables fall back to batched DELETEs.
+
+An existing unpartitioned table is converted once with:
+    python -m backend.log_partitions migrate
+"""
+import argparse
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+
+from sqlalchemy import Column, MetaData, Table, delete, select, text
+from sqlalchemy.schema import CreateTable
+
+from .database import ensure_indexes
+from .models import ApiLog
+from .log_stats import prune_rollups
+
+logger = logging.getLogger("api_logs")
+
+API_LOGS_PARTITIONING = os.getenv("API_LOGS_PARTITIONING", "false").lower() in ("1", "true", "yes")
+API_LOGS_PARTITIONS_AHEAD = int(os.getenv("API_LOGS_PARTITIONS_AHEAD", "2"))
+# 0 keeps logs forever
+API_LOGS_RETENTION_MONTHS = int(os.getenv("API_LOGS_RETENTION_MONTHS", "0"))
+API_LOGS_RETENTION_BATCH = int(os.getenv("API_LOGS_RETENTION_BATCH", "5000"))
+# How often the background task re-runs maintenance (seconds)
+API_LOGS_MAINTENANCE_INTERVAL = float(os.getenv("API_LOGS_MAINTENANCE_INTERVAL", "21600"))
+
+TABLE_NAME = ApiLog.__tablename__
+DEFAULT_PARTITION = f"{TABLE_NAME}_default"
+LEGACY_TABLE = f"{TABLE_NAME}_unpartitioned"
+
+
+def _add_months(year: int, month: int, months: int):
+    index = year * 12 + (month - 1) + months
+    return index // 12, index % 12 + 1
+
+
+def _partition_name(year: int, month: int) -> str:
+    return f"{TABLE_NAME}_y{year:04d}m{month:02d}"
+
+
+def _partition_bounds(name: str):
+    """(start, end) of a monthly partition from its name, or None for other tables."""
+    suffix = name[len(TABLE_NAME) + 1:]
+    if len(suffix) != 8 or suffix[0] != "y" or suffix[5] != "m" or not (suffix[1:5] + suffix[6:]).isdigit():
+        return None
+    year, month = int(suffix[1:5]), int(suffix[6:])
+    end_year, end_month = _add_months(year, month, 1)
+    return (datetime(year, month, 1, tzinfo=timezone.utc), datetime(end_year, end_month, 1, tzinfo=timezone.utc))
+
+
+def partitioning_enabled(engine) -> bool:
+    if not API_LOGS_PARTITIONING:
+        return False
+    if engine.dialect.name != "postgresql":
+        logger.warning(f"API_LOGS_PARTITIONING is only supported on PostgreSQL, not {engine.dialect.name}")
+        return False
+    return True
+
+
+def _partitioned_table_ddl() -> str:
+    """CREATE TABLE for api_logs partitioned by month; the partition key must be part of the primary key."""
+    columns = []
+    for column in ApiLog.__table__.columns:
+        copy = Column(
+            column.name,
+            column.type,
+            primary_key=column.primary_key or column.name == "timestamp",
+            nullable=column.nullable and column.name != "timestamp",
+            server_default=column.server_default,
+            autoincrement=True if column.name == "id" else "auto",
+        )
+        columns.append(copy)
+    table = Table(TABLE_NAME, MetaData(), *columns, postgresql_partition_by="RANGE (timestamp)")
+    return str(CreateTable(table).compile(dialect=_postgresql_dialect()))
+
+
+def _postgresql_dialect():
+    from sqlalchemy.dialects import postgresql
+
+    return postgresql.dialect()
+
+
+def is_partitioned(conn) -> bool:
+    return conn.execute(
+        text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(:name)"),
+        {"name": TABLE_NAME}
+    ).first() is not None
+
+
+def _table_exists(conn, name: str) -> bool:
+    return conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is not None
+
+
+def ensure_partitions(conn, now: datetime = None, ahead: int = API_LOGS_PARTITIONS_AHEAD, start=None):
+    """Create monthly partitions from start (default: this month) through `ahead` months from now."""
+    now = now or datetime.now(timezone.utc)
+    year, month = start or (now.year, now.month)
+    last = _add_months(now.year, now.month, ahead)
+    created = []
+    while (year, month) <= last:
+        name = _partition_name(year, month)
+        if not _table_exists(conn, name):
+            end_year, end_month = _add_months(year, month, 1)
+            conn.execute(text(
+                f"CREATE TABLE {name} PARTITION OF {TABLE_NAME} "
+                f"FOR VALUES FROM ('{year:04d}-{month:02d}-01 00:00:00+00') "
+                f"TO ('{end_year:04d}-{end_month:02d}-01 00:00:00+00')"
+            ))
+            created.append(name)
+        year, month = _add_months(year, month, 1)
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {TABLE_NAME} DEFAULT"))
+    if created:
+        logger.info(f"Created api_logs partitions: {', '.join(created)}")
+    return created
+
+
+def _list_partitions(conn):
+    return [row[0] for row in conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:name) ORDER BY c.relname"
+    ), {"name": TABLE_NAME})]
+
+
+def _retention_cutoff(now: datetime, months: int) -> datetime:
+    year, month = _add_months(now.year, now.month, -months)
+    return datetime(year, month, 1, tzinfo=timezone.utc)
+
+
+def drop_expired_partitions(conn, months: int = API_LOGS_RETENTION_MONTHS, now: datetime = None):
+    """Drop monthly partitions that end before the retention cutoff."""
+    if months <= 0:
+        return []
+    cutoff = _retention_cutoff(now or datetime.now(timezone.utc), months)
+    dropped = []
+    for name in _list_partitions(conn):
+        bounds = _partition_bounds(name)
+        if bounds and bounds[1] <= cutoff:
+            conn.execute(text(f"DROP TABLE {name}"))
+            dropped.append(name)
+    if dropped:
+        logger.info(f"Dropped expired api_logs partitions: {', '.join(dropped)}")
+    return dropped
+
+
+def delete_expired_logs(engine, months: int = API_LOGS_RETENTION_MONTHS, now: datetime = None,
+                        batch_size: int = API_LOGS_RETENTION_BATCH) -> int:
+    """Retention for unpartitioned tables: delete expired rows in short transactions."""
+    if months <= 0:
+        return 0
+    cutoff = _retention_cutoff(now or datetime.now(timezone.utc), months)
+    total = 0
+    while True:
+        with engine.begin() as conn:
+            expired_ids = select(ApiLog.id).where(ApiLog.timestamp < cutoff).limit(batch_size).scalar_subquery()
+            deleted = conn.execute(delete(ApiLog).where(ApiLog.id.in_(expired_ids))).rowcount
+        total += deleted
+        if deleted < batch_size:
+            break
+    if total:
+        logger.info(f"Deleted {total} api_logs rows older than {cutoff.date()}")
+    return total
+
+
+def prepare_api_logs_table(engine):
+    """Create api_logs as a partitioned table before create_all() would create a plain one."""
+    if not partitioning_enabled(engine):
+        return
+    with engine.begin() as conn:
+        if not _table_exists(conn, TABLE_NAME):
+            conn.execute(text(_partitioned_table_ddl()))
+            logger.info("Created partitioned api_logs table")
+        elif not is_partitioned(conn):
+            logger.warning("api_logs exists but is not partitioned; run 'python -m backend.log_partitions migrate'")
+            return
+        ensure_partitions(conn)
+
+
+def ensure_api_log_indexes(engine):
+    """Add any ApiLog indexes missing from an existing table."""
+    created = ensure_indexes(engine, ApiLog.__table__)
+    if created:
+        logger.info(f"Created api_logs indexes: {', '.join(created)}")
+
+
+def run_log_maintenance(engine, now: datetime = None):
+    """Add missing indexes, create upcoming partitions and apply retention to logs and rollups."""
+    ensure_api_log_indexes(engine)
+    prune_rollups(engine, now=now, hourly_retention_months=API_LOGS_RETENTION_MONTHS)
+    if partitioning_enabled(engine):
+        with engine.begin() as conn:
+            if is_partitioned(conn):
+                ensure_partitions(conn, now=now)
+                drop_expired_partitions(conn, now=now)
+                return
+    delete_expired_logs(engine, now=now)
+
+
+def migrate_to_partitioned(engine):
+    """
+    Convert an existing unpartitioned api_logs table to monthly partitions in one
+    transaction. Rows are copied, so run it in a maintenance window on large tables.
+    """
+    with engine.begin() as conn:
+        if is_partitioned(conn):
+            logger.info("api_logs is already partitioned")
+            return
+        # Move the old table, its sequence and its index names out of the way
+        conn.execute(text(f"ALTER TABLE {TABLE_NAME} RENAME TO {LEGACY_TABLE}"))
+        conn.execute(text(f"ALTER TABLE {LEGACY_TABLE} RENAME CONSTRAINT {TABLE_NAME}_pkey TO {LEGACY_TABLE}_pkey"))
+        conn.execute(text(f"ALTER SEQUENCE IF EXISTS {TABLE_NAME}_id_seq RENAME TO {LEGACY_TABLE}_id_seq"))
+        for index in ApiLog.__table__.indexes:
+            conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+
+        conn.execute(text(_partitioned_table_ddl()))
+        oldest = conn.execute(text(f"SELECT min(timestamp) FROM {LEGACY_TABLE}")).scalar()
+        start = (oldest.year, oldest.month) if oldest else None
+        ensure_partitions(conn, start=start)
+
+        # timestamp is part of the key now; rows without one are stamped with the migration time
+        undated = conn.execute(text(f"SELECT count(*) FROM {LEGACY_TABLE} WHERE timestamp IS NULL")).scalar()
+        if undated:
+            logger.warning(f"{undated} api_logs rows have no timestamp; copying them with the migration time")
+        column_list = ", ".join(column.name for column in ApiLog.__table__.columns)
+        select_list = ", ".join(
+            "COALESCE(timestamp, now())" if column.name == "timestamp" else column.name
+            for column in ApiLog.__table__.columns
+        )
+        copied = conn.execute(text(
+            f"INSERT INTO {TABLE_NAME} ({column_list}) SELECT {select_list} FROM {LEGACY_TABLE}"
+        )).rowcount
+        conn.execute(text(
+            f"SELECT setval('{TABLE_NAME}_id_seq', (SELECT COALESCE(max(id), 0) + 1 FROM {LEGACY_TABLE}), false)"
+        ))
+        conn.execute(text(f"DROP TABLE {LEGACY_TABLE}"))
+    ensure_api_log_indexes(engine)
+    logger.info(f"Migrated {copied} rows into the partitioned api_logs table")
+
+
+async def log_maintenance_loop(engine, interval: float = API_LOGS_MAINTENANCE_INTERVAL):
+    """Background task: keep partitions created ahead of time and retention applied."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(run_log_maintenance, engine)
+        except Exception as e:
+            logger.error(f"api_logs maintenance failed: {str(e)}", exc_info=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="api_logs index, partition and retention maintenance")
+    parser.add_argument("command", choices=["maintain", "migrate", "ddl"],
+                        help="maintain: indexes, partitions and retention; migrate: convert to partitions; ddl: print the partitioned CREATE TABLE")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "ddl":
+        print(_partitioned_table_ddl())
+        return
+
+    from .database import engine
+
+    if args.command == "migrate":
+        migrate_to_partitioned(engine)
+    run_log_maintenance(engine)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+"""
+Rollups of api_logs for the /api/logs/stats endpoint.
+
+Every batch the log writer inserts is also folded into api_log_rollups, one row
+per (granularity, bucket, provider, endpoint, log_type), in the same transaction.
+Each rollup keeps a count, an error count, the duration sum/min/max and a
+log-bucket sketch of duration_ms. Sketches from different buckets merge by
+adding counts, so percentiles over any window come from a few hundred rollup
+rows instead of a scan of the raw logs.
+
+Rollups for logs written before this existed (or after a crash) are rebuilt with:
+    python -m backend.log_stats rebuild --hours 48
+"""
+import argparse
+import logging
+import math
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .models import ApiLog, ApiLogRollup
+
+logger = logging.getLogger("api_logs")
+
+# Bucket widths in seconds
+GRANULARITIES = {"minute": 60, "hour": 3600}
+# Windows up to this many hours are answered from minute rollups, longer ones from hourly
+LOG_STATS_MINUTE_MAX_HOURS = float(os.getenv("LOG_STATS_MINUTE_MAX_HOURS", "6"))
+# Minute rollups are pruned after this many hours; hourly ones follow API_LOGS_RETENTION_MONTHS
+LOG_ROLLUP_MINUTE_RETENTION_HOURS = float(os.getenv("LOG_ROLLUP_MINUTE_RETENTION_HOURS", "48"))
+
+# Percentiles read from the sketch are within this relative error of the true duration
+SKETCH_RELATIVE_ACCURACY = 0.02
+_GAMMA = (1 + SKETCH_RELATIVE_ACCURACY) / (1 - SKETCH_RELATIVE_ACCURACY)
+_LOG_GAMMA = math.log(_GAMMA)
+
+GROUP_FIELDS = ("provider", "endpoint", "log_type")
+
+
+# --- Duration sketch ---
+
+# Durations of 0ms (or less) have their own key; index 0 is the bucket holding 1ms
+ZERO_KEY = "zero"
+
+
+def _sketch_key(duration_ms: float) -> str:
+    # JSON object keys are strings
+    if duration_ms <= 0:
+        return ZERO_KEY
+    return str(math.ceil(math.log(duration_ms) / _LOG_GAMMA))
+
+
+def _sketch_order(key: str) -> float:
+    return float("-inf") if key == ZERO_KEY else int(key)
+
+
+def _sketch_value(key: str) -> float:
+    if key == ZERO_KEY:
+        return 0.0
+    return 2 * _GAMMA ** int(key) / (_GAMMA + 1)
+
+
+def merge_sketches(into: Dict[str, int], other: Optional[Dict[str, int]]) -> Dict[str, int]:
+    for key, count in (other or {}).items():
+        into[key] = into.get(key, 0) + count
+    return into
+
+
+def sketch_quantile(sketch: Dict[str, int], q: float) -> Optional[float]:
+    """Estimate the q-quantile (0..1) of the durations in a sketch."""
+    total = sum(sketch.values())
+    if not total:
+        return None
+    rank = q * (total - 1)
+    seen = 0
+    for key in sorted(sketch, key=_sketch_order):
+        seen += sketch[key]
+        if seen > rank:
+            return round(_sketch_value(key), 1)
+    return round(_sketch_value(max(sketch, key=_sketch_order)), 1)
+
+
+# --- Incremental rollups ---
+
+def _bucket_start(timestamp: datetime, granularity: str) -> datetime:
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    timestamp = timestamp.astimezone(timezone.utc)
+    if granularity == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(second=0, microsecond=0)
+
+
+def is_error(row: dict) -> bool:
+    return row.get("log_type") == "error" or (row.get("status_code") or 0) >= 400 or bool(row.get("error_message"))
+
+
+def aggregate_rows(rows: Iterable[dict]) -> Dict[tuple, dict]:
+    """Fold log rows into rollup deltas keyed by (granularity, bucket_start, provider, endpoint, log_type)."""
+    deltas = {}
+    for row in rows:
+        timestamp = row.get("timestamp") or datetime.now(timezone.utc)
+        duration = row.get("duration_ms")
+        error = is_error(row)
+        for granularity in GRANULARITIES:
+            key = (granularity, _bucket_start(timestamp, granularity),
+                   row.get("provider") or "unknown", row.get("endpoint") or "", row.get("log_type") or "error")
+            delta = deltas.get(key)
+            if delta is None:
+                delta = deltas[key] = {"count": 0, "errors": 0, "duration_count": 0, "duration_sum": 0.0,
+                                       "duration_min": None, "duration_max": None, "duration_sketch": {}}
+            delta["count"] += 1
+            delta["errors"] += int(error)
+            if duration is not None:
+                delta["duration_count"] += 1
+                delta["duration_sum"] += duration
+                delta["duration_min"] = duration if delta["duration_min"] is None else min(delta["duration_min"], duration)
+                delta["duration_max"] = duration if delta["duration_max"] is None else max(delta["duration_max"], duration)
+                sketch_key = _sketch_key(duration)
+                delta["duration_sketch"][sketch_key] = delta["duration_sketch"].get(sketch_key, 0) + 1
+    return deltas
+
+
+def _merge_delta(rollup: ApiLogRollup, delta: dict):
+    rollup.count += delta["count"]
+    rollup.errors += delta["errors"]
+    rollup.duration_count += delta["duration_count"]
+    rollup.duration_sum += delta["duration_sum"]
+    if delta["duration_min"] is not None:
+        rollup.duration_min = delta["duration_min"] if rollup.duration_min is None else min(rollup.duration_min, delta["duration_min"])
+        rollup.duration_max = delta["duration_max"] if rollup.duration_max is None else max(rollup.duration_max, delta["duration_max"])
+    # Assign a new dict so the JSON column is seen as changed
+    rollup.duration_sketch = merge_sketches(dict(rollup.duration_sketch or {}), delta["duration_sketch"])
+
+
+def _find_rollup(db: Session, key: tuple) -> Optional[ApiLogRollup]:
+    granularity, bucket_start, provider, endpoint, log_type = key
+    return db.execute(
+        select(ApiLogRollup).where(
+            ApiLogRollup.granularity == granularity,
+            ApiLogRollup.bucket_start == bucket_start,
+            ApiLogRollup.provider == provider,
+            ApiLogRollup.endpoint == endpoint,
+            ApiLogRollup.log_type == log_type
+        ).with_for_update()
+    ).scalars().first()
+
+
+def apply_rollups(db: Session, rows: List[dict]) -> bool:
+    """
+    Add rows to their rollups in the caller's transaction; the caller commits.
+
+    Runs inside a savepoint and never raises, so a rollup problem can't cost the
+    log rows themselves. Returns False if the rollups were not updated.
+    """
+    if not rows:
+        return True
+    try:
+        with db.begin_nested():
+            # Lock rollups in key order so concurrent writers with overlapping keys can't deadlock
+            for key, delta in sorted(aggregate_rows(rows).items(), key=lambda item: item[0]):
+                rollup = _find_rollup(db, key)
+                if rollup is None:
+                    granularity, bucket_start, provider, endpoint, log_type = key
+                    rollup = ApiLogRollup(
+                        granularity=granularity, bucket_start=bucket_start, provider=provider,
+                        endpoint=endpoint, log_type=log_type, count=0, errors=0,
+                        duration_count=0, duration_sum=0.0, duration_sketch={}
+                    )
+                    try:
+                        # Another worker may create the same bucket concurrently
+                        with db.begin_nested():
+                            db.add(rollup)
+                            db.flush()
+                    except IntegrityError:
+                        rollup = _find_rollup(db, key)
+                _merge_delta(rollup, delta)
+            db.flush()
+        return True
+    except Exception as e:
+        logger.error(f"Error updating API log rollups for {len(rows)} rows: {str(e)}")
+        return False
+
+
+def choose_granularity(hours: float) -> str:
+    return "minute" if hours <= LOG_STATS_MINUTE_MAX_HOURS else "hour"
+
+
+def window_start(end: datetime, hours: float, granularity: str) -> datetime:
+    """Start of a stats window, aligned down to a bucket boundary."""
+    return _bucket_start(end - timedelta(hours=hours), granularity)
+
+
+# --- Summaries ---
+
+def _empty_summary() -> dict:
+    return {"count": 0, "errors": 0, "duration_count": 0, "duration_sum": 0.0,
+            "duration_min": None, "duration_max": None, "duration_sketch": {}}
+
+
+def _add_rollup(summary: dict, rollup: ApiLogRollup):
+    summary["count"] += rollup.count
+    summary["errors"] += rollup.errors
+    summary["duration_count"] += rollup.duration_count
+    summary["duration_sum"] += rollup.duration_sum
+    if rollup.duration_min is not None:
+        summary["duration_min"] = rollup.duration_min if summary["duration_min"] is None else min(summary["duration_min"], rollup.duration_min)
+        summary["duration_max"] = rollup.duration_max if summary["duration_max"] is None else max(summary["duration_max"], rollup.duration_max)
+    merge_sketches(summary["duration_sketch"], rollup.duration_sketch)
+
+
+def _format_summary(summary: dict) -> dict:
+    duration_count = summary["duration_count"]
+    sketch = summary["duration_sketch"]
+    return {
+        "count": summary["count"],
+        "errors": summary["errors"],
+        "error_rate": round(summary["errors"] / summary["count"], 4) if summary["count"] else 0.0,
+        "duration_ms": {
+            "count": duration_count,
+            "avg": round(summary["duration_sum"] / duration_count, 1) if duration_count else None,
+            "min": summary["duration_min"],
+            "max": summary["duration_max"],
+            "p50": sketch_quantile(sketch, 0.50),
+            "p95": sketch_quantile(sketch, 0.95),
+            "p99": sketch_quantile(sketch, 0.99),
+        }
+    }
+
+
+def summarize_rollups(rollups: Iterable[ApiLogRollup], group_by: List[str], include_series: bool = False) -> List[dict]:
+    """Merge rollups into one summary per group, optionally with a per-bucket series."""
+    groups = {}
+    series = {}
+    for rollup in rollups:
+        group_key = tuple(getattr(rollup, field) for field in group_by)
+        _add_rollup(groups.setdefault(group_key, _empty_summary()), rollup)
+        if include_series:
+            bucket_start = _bucket_start(rollup.bucket_start, rollup.granularity)
+            _add_rollup(series.setdefault(group_key, {}).setdefault(bucket_start, _empty_summary()), rollup)
+
+    result = []
+    for group_key in sorted(groups):
+        entry = dict(zip(group_by, group_key))
+        entry.update(_format_summary(groups[group_key]))
+        if include_series:
+            entry["series"] = [
+                {"bucket_start": bucket_start.isoformat(), **_format_summary(summary)}
+                for bucket_start, summary in sorted(series[group_key].items())
+            ]
+        result.append(entry)
+    return result
+
+
+# --- Maintenance ---
+
+def prune_rollups(engine, now: datetime = None, hourly_retention_months: int = 0) -> int:
+    """Delete minute rollups past LOG_ROLLUP_MINUTE_RETENTION_HOURS and, optionally, old hourly ones."""
+    now = now or datetime.now(timezone.utc)
+    with engine.begin() as conn:
+        deleted = conn.execute(delete(ApiLogRollup).where(
+            ApiLogRollup.granularity == "minute",
+            ApiLogRollup.bucket_start < now - timedelta(hours=LOG_ROLLUP_MINUTE_RETENTION_HOURS)
+        )).rowcount
+        if hourly_retention_months > 0:
+            deleted += conn.execute(delete(ApiLogRollup).where(
+                ApiLogRollup.granularity == "hour",
+                ApiLogRollup.bucket_start < now - timedelta(days=31 * hourly_retention_months)
+            )).rowcount
+    if deleted:
+        logger.info(f"Pruned {deleted} API log rollups")
+    return deleted
+
+
+def rebuild_rollups(session_factory, hours: float, batch_size: int = 5000) -> int:
+    """
+    Recompute rollups for the last `hours` from api_logs. Run it while the app is
+    stopped, or rows written during the rebuild can be counted twice.
+    """
+    since = _bucket_start(datetime.now(timezone.utc) - timedelta(hours=hours), "hour")
+    db = session_factory()
+    try:
+        db.execute(delete(ApiLogRollup).where(ApiLogRollup.bucket_start >= since))
+        columns = [column.name for column in ApiLog.__table__.columns if column.name not in ("request_data", "response_data")]
+        last_id = 0
+        total = 0
+        while True:
+            result = db.execute(
+                select(*[ApiLog.__table__.c[name] for name in columns])
+                .where(ApiLog.timestamp >= since, ApiLog.id > last_id)
+                .order_by(ApiLog.id)
+                .limit(batch_size)
+            ).mappings().all()
+            if not result:
+                break
+            rows = [dict(row) for row in result]
+            if not apply_rollups(db, rows):
+                raise RuntimeError("Rollup rebuild failed, see the error above")
+            last_id = rows[-1]["id"]
+            total += len(rows)
+        db.commit()
+        logger.info(f"Rebuilt API log rollups from {total} rows since {since.isoformat()}")
+        return total
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the api_logs rollups used by /api/logs/stats")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--hours", type=float, default=48, help="How far back to rebuild")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    from .database import Base, SessionLocal, engine
+
+    Base.metadata.create_all(bind=engine)
+    rebuild_rollups(SessionLocal, args.hours)
+
+
+if __name__ == "__main__":
+    main()
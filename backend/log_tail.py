@@ -0,0 +1,217 @@
+"""
+Fan-out of newly written API logs to /api/logs/tail subscribers.
+
+Two backends, picked by LOG_TAIL_BACKEND:
+  memory    the log writer hands each committed batch straight to the
+            subscribers in this process (single node, the default off PostgreSQL)
+  postgres  the writer sends one NOTIFY per row in the insert transaction, and
+            every node delivers what it hears on a dedicated LISTEN connection,
+            so a tail on any node sees logs written by all of them
+"auto" (the default) uses postgres when DATABASE_URL points at PostgreSQL.
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+
+logger = logging.getLogger("api_logs")
+
+LOG_TAIL_BACKEND = os.getenv("LOG_TAIL_BACKEND", "auto").lower()
+LOG_TAIL_CHANNEL = os.getenv("LOG_TAIL_CHANNEL", "api_logs")
+LOG_TAIL_MAX_SUBSCRIBERS = int(os.getenv("LOG_TAIL_MAX_SUBSCRIBERS", "100"))
+# Events buffered per subscriber before a slow client starts losing them
+LOG_TAIL_QUEUE_SIZE = int(os.getenv("LOG_TAIL_QUEUE_SIZE", "1000"))
+# Seconds to wait before reconnecting a dropped LISTEN connection
+LOG_TAIL_RECONNECT_DELAY = float(os.getenv("LOG_TAIL_RECONNECT_DELAY", "5"))
+# NOTIFY payloads must stay under 8000 bytes; bigger events are sent without content
+NOTIFY_PAYLOAD_LIMIT = 7900
+
+FILTER_FIELDS = ("provider", "session_id", "type")
+
+
+class TailSubscription:
+    """One SSE client: its filters, a bounded queue and a count of events it missed."""
+
+    def __init__(self, filters: Dict[str, str], max_queue_size: int = LOG_TAIL_QUEUE_SIZE):
+        self.filters = {field: value for field, value in filters.items() if value}
+        self.queue = asyncio.Queue(maxsize=max_queue_size)
+        self.dropped = 0
+
+    def matches(self, event: dict) -> bool:
+        return all(event.get(field) == value for field, value in self.filters.items())
+
+    def offer(self, event: dict):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+
+class LogBroadcaster:
+    """
+    Delivers log events to subscribers on the event loop.
+
+    publish() may be called from any thread (the log writer runs in its own);
+    delivery is handed to the loop with call_soon_threadsafe.
+    """
+
+    def __init__(self, backend: str = LOG_TAIL_BACKEND, max_subscribers: int = LOG_TAIL_MAX_SUBSCRIBERS):
+        self.backend = backend
+        self.max_subscribers = max_subscribers
+        self._subscribers: List[TailSubscription] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._listener_task: Optional[asyncio.Task] = None
+        self._lock = threading.Lock()
+
+        # Counters
+        self.published = 0
+        self.delivered = 0
+        self.notify_errors = 0
+
+    def configure(self, dialect_name: str):
+        """Resolve the "auto" backend once the database dialect is known."""
+        if self.backend == "auto":
+            self.backend = "postgres" if dialect_name == "postgresql" else "memory"
+        elif self.backend == "postgres" and dialect_name != "postgresql":
+            logger.warning(f"LOG_TAIL_BACKEND=postgres needs PostgreSQL, not {dialect_name}; using memory")
+            self.backend = "memory"
+
+    @property
+    def uses_notify(self) -> bool:
+        return self.backend == "postgres"
+
+    @property
+    def wants_events(self) -> bool:
+        """Whether the writer should build events for its batches at all."""
+        return self.uses_notify or bool(self._subscribers)
+
+    # --- Subscribers (event loop only) ---
+
+    def subscribe(self, filters: Dict[str, str]) -> Optional[TailSubscription]:
+        """Register a subscriber, or return None when LOG_TAIL_MAX_SUBSCRIBERS is reached."""
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                return None
+            self._loop = asyncio.get_running_loop()
+            subscription = TailSubscription(filters)
+            self._subscribers.append(subscription)
+            return subscription
+
+    def unsubscribe(self, subscription: TailSubscription):
+        with self._lock:
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+
+    def _deliver(self, events: List[dict]):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for event in events:
+            for subscription in subscribers:
+                if subscription.matches(event):
+                    subscription.offer(event)
+                    self.delivered += 1
+
+    # --- Producers ---
+
+    def notify(self, db, events: List[dict]):
+        """
+        Postgres backend: queue one NOTIFY per event in the caller's transaction,
+        so listeners only hear about rows that were committed.
+        """
+        if not self.uses_notify or not events:
+            return
+        payloads = [{"channel": LOG_TAIL_CHANNEL, "payload": _notify_payload(event)} for event in events]
+        try:
+            db.execute(text("SELECT pg_notify(:channel, :payload)"), payloads)
+        except Exception as e:
+            self.notify_errors += 1
+            logger.error(f"Error sending log tail notifications: {str(e)}")
+            raise
+
+    def publish(self, events: List[dict]):
+        """Memory backend: deliver committed events to this process's subscribers."""
+        if self.uses_notify or not events:
+            return
+        self.published += len(events)
+        loop = self._loop
+        if loop is None or loop.is_closed() or not self._subscribers:
+            return
+        loop.call_soon_threadsafe(self._deliver, events)
+
+    # --- Postgres listener ---
+
+    async def start(self, database_url: str):
+        """Start the LISTEN task when the postgres backend is in use."""
+        self._loop = asyncio.get_running_loop()
+        if self.uses_notify and self._listener_task is None:
+            self._listener_task = asyncio.create_task(self._listen(database_url))
+
+    async def stop(self):
+        if self._listener_task is not None:
+            self._listener_task.cancel()
+            try:
+                await self._listener_task
+            except asyncio.CancelledError:
+                pass
+            self._listener_task = None
+
+    async def _listen(self, database_url: str):
+        import asyncpg
+
+        dsn = make_url(database_url).set(drivername="postgresql").render_as_string(hide_password=False)
+
+        def on_notification(connection, pid, channel, payload):
+            try:
+                self.published += 1
+                self._deliver([json.loads(payload)])
+            except Exception as e:
+                logger.error(f"Invalid log tail notification: {str(e)}")
+
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(dsn)
+                await connection.add_listener(LOG_TAIL_CHANNEL, on_notification)
+                logger.info(f"Listening for API logs on channel {LOG_TAIL_CHANNEL}")
+                # Notifications arrive through the callback; wake up now and then to check the connection
+                while not connection.is_closed():
+                    await asyncio.sleep(LOG_TAIL_RECONNECT_DELAY)
+                logger.warning("Log tail LISTEN connection closed, reconnecting")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Log tail listener error: {str(e)}")
+            finally:
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+            await asyncio.sleep(LOG_TAIL_RECONNECT_DELAY)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "backend": self.backend,
+                "subscribers": len(self._subscribers),
+                "published": self.published,
+                "delivered": self.delivered,
+                "dropped": sum(subscription.dropped for subscription in self._subscribers),
+                "notify_errors": self.notify_errors
+            }
+
+
+def _notify_payload(event: dict) -> str:
+    payload = json.dumps(event, default=str)
+    if len(payload.encode()) > NOTIFY_PAYLOAD_LIMIT:
+        payload = json.dumps(dict(event, content=None, content_truncated=True), default=str)
+    if len(payload.encode()) > NOTIFY_PAYLOAD_LIMIT:
+        error = (event.get("error") or "")[:1000]
+        payload = json.dumps(dict(event, content=None, content_truncated=True, error=error), default=str)
+    return payload
+
+
+# Shared broadcaster configured and started by main.lifespan
+log_broadcaster = LogBroadcaster()
@@ -0,0 +1,233 @@
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import insert
+
+from .database import SessionLocal
+from .models import ApiLog
+from .log_stats import apply_rollups
+from .log_tail import log_broadcaster
+
+logger = logging.getLogger("api_logs")
+
+# Queue and batching settings for the background API log writer
+API_LOG_QUEUE_SIZE = int(os.getenv("API_LOG_QUEUE_SIZE", "10000"))
+API_LOG_BATCH_SIZE = int(os.getenv("API_LOG_BATCH_SIZE", "200"))
+API_LOG_FLUSH_INTERVAL = float(os.getenv("API_LOG_FLUSH_INTERVAL", "1.0"))
+
+
+class ApiLogWriter:
+    """
+    Background writer that persists ApiLog rows in batches.
+
+    Producers call enqueue() from any thread or coroutine; it never blocks and never
+    touches the caller's database session. A writer thread drains the bounded queue
+    and flushes multi-row INSERTs once a batch fills up or the flush interval passes.
+    When the queue is full new rows are dropped and counted rather than slowing the request.
+    """
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        max_queue_size: int = API_LOG_QUEUE_SIZE,
+        batch_size: int = API_LOG_BATCH_SIZE,
+        flush_interval: float = API_LOG_FLUSH_INTERVAL
+    ):
+        self.session_factory = session_factory
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+        # Counters
+        self.enqueued = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.batches = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """Start the writer thread if it isn't already running."""
+        if self.running:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="api-log-writer", daemon=True)
+        self._thread.start()
+        logger.info(f"API log writer started (batch_size={self.batch_size}, flush_interval={self.flush_interval}s)")
+
+    def stop(self, timeout: float = 10.0):
+        """Stop the writer thread after flushing everything already queued."""
+        if not self.running:
+            return
+        self._stop_event.set()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.warning(f"API log writer did not drain within {timeout}s, {self._queue.qsize()} rows left")
+        else:
+            logger.info(f"API log writer stopped: {self.stats()}")
+        self._thread = None
+
+    def enqueue(self, row: dict) -> bool:
+        """Queue a row for writing. Returns False if it was dropped because the queue is full."""
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.enqueued += 1
+        return True
+
+    def stats(self) -> dict:
+        """Return queue depth and writer counters."""
+        with self._lock:
+            return {
+                "running": self.running,
+                "queued": self._queue.qsize(),
+                "queue_capacity": self._queue.maxsize,
+                "enqueued": self.enqueued,
+                "dropped": self.dropped,
+                "written": self.written,
+                "failed": self.failed,
+                "batches": self.batches
+            }
+
+    def _run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            timeout = max(0.0, deadline - time.monotonic())
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                pass
+
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                if batch:
+                    self._flush(batch)
+                    batch = []
+                deadline = time.monotonic() + self.flush_interval
+
+            if self._stop_event.is_set() and self._queue.empty():
+                break
+
+        # Drain whatever was picked up before the stop signal
+        if batch:
+            self._flush(batch)
+
+    def _flush(self, rows):
+        db = self.session_factory()
+        try:
+            # Request, response and error rows carry different columns; insert each
+            # shape as one executemany, which SQLAlchemy sends as multi-row INSERTs
+            shapes = {}
+            for row in rows:
+                shapes.setdefault(tuple(sorted(row)), []).append(row)
+            events = []
+            for shaped_rows in shapes.values():
+                events.extend(_insert_rows(db, shaped_rows))
+            # Fold the batch into the /api/logs/stats rollups in the same transaction
+            apply_rollups(db, rows)
+            log_broadcaster.notify(db, events)
+            db.commit()
+            written, failed = len(rows), 0
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error writing batch of {len(rows)} API logs, retrying row by row: {str(e)}")
+            events = []
+            written, failed = self._flush_rows(db, rows)
+        finally:
+            db.close()
+        # Outside the transaction's try: the rows are committed whatever happens to the tail
+        _publish(sorted(events, key=lambda event: int(event["id"])))
+
+        with self._lock:
+            self.written += written
+            self.failed += failed
+            self.batches += 1
+
+    def _flush_rows(self, db, rows):
+        # Isolate the bad rows so one unserialisable payload doesn't lose the batch
+        written = failed = 0
+        for row in rows:
+            try:
+                events = _insert_rows(db, [row])
+                apply_rollups(db, [row])
+                log_broadcaster.notify(db, events)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                failed += 1
+                logger.error(f"Dropping API log that could not be written: {str(e)}")
+                continue
+            written += 1
+            _publish(events)
+        return written, failed
+
+
+def _publish(events: list):
+    """Hand committed rows to the live tail; a tail failure must never reach the write path."""
+    try:
+        log_broadcaster.publish(events)
+    except Exception as e:
+        logger.warning(f"Error publishing {len(events)} API logs to the live tail: {str(e)}")
+
+
+def _insert_rows(db, rows: list) -> list:
+    """
+    Insert rows of one shape. When the log tail needs them, the new ids are
+    returned with RETURNING and the rows come back formatted as tail events.
+    """
+    if not log_broadcaster.wants_events:
+        db.execute(insert(ApiLog), rows)
+        return []
+    ids = db.execute(insert(ApiLog).returning(ApiLog.id, sort_by_parameter_order=True), rows).scalars().all()
+    return [format_log_entry(ApiLog(id=log_id, **row)) for log_id, row in zip(ids, rows)]
+
+
+def format_log_entry(log: ApiLog) -> dict:
+    """The JSON shape of a log used by /api/logs, the export and the live tail"""
+    return {
+        "id": str(log.id),
+        "timestamp": log.timestamp.isoformat(),
+        "type": log.log_type,
+        "provider": log.provider,
+        "session_id": log.session_id,
+        "endpoint": log.endpoint,
+        "content": log.request_data if log.log_type == "request" else log.response_data,
+        "status": log.status_code,
+        "duration": log.duration_ms,
+        "error": log.error_message
+    }
+
+
+def build_log_row(log_data: dict) -> dict:
+    """Normalise log data into an ApiLog row, stamping the time it was produced."""
+    row = dict(log_data)
+
+    # Ensure all required fields are present
+    if 'log_type' not in row:
+        logger.error("Missing required field: log_type")
+        row['log_type'] = 'error'  # Default
+    if 'provider' not in row:
+        logger.error("Missing required field: provider")
+        row['provider'] = 'unknown'  # Default
+
+    # Rows are written later in batches, so record when the event happened
+    row.setdefault('timestamp', datetime.now(timezone.utc))
+    return row
+
+
+# Shared writer started and drained by main.lifespan
+api_log_writer = ApiLogWriter()
@@ -1,21 +1,31 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse
 from contextlib import asynccontextmanager
 import os
+import asyncio
 import logging
-import time
 from dotenv import load_dotenv
-from .database import engine, Base
+from .database import engine, Base, dispose_async_engine, ensure_indexes
 from . import models
 from .routers import auth, prompts, settings, chat, documents, roles, user_roles, chat_threads, favorite_prompts, users, provider_access, navigation, debug
 from .aws_services.bedrock_client import router as aws_bedrock_router
+from .aws_services import bedrock_client
+from .aws_services.client_pool import client_pool
+from .aws_services.executor import shutdown_bedrock_executor
 from .aws_services.settings import router as aws_settings_router
 from .gcp_services.settings import router as gcp_settings_router
+from .gcp_services.http_client import start_gcp_http_client, close_gcp_http_client
 from .routers.gcp_chat import router as gcp_chat_router
 from .routers.gcp_simple import router as gcp_simple_router
 from .routers.logs import router as logs_router
+from .log_writer import api_log_writer
+from .log_tail import log_broadcaster
+from .chat_search import ensure_chat_search_schema
+from .log_partitions import prepare_api_logs_table, run_log_maintenance, log_maintenance_loop
+from .middleware import AuthErrorMiddleware, RequestLoggingMiddleware, MetricsMiddleware
+from .metrics import registry as metrics_registry
 from .init_navigation import initialize_navigation
 
 # Configure logging with rotating file handler
@@ -76,14 +86,36 @@ async def lifespan(app: FastAPI):
         # Database initialization
         try:
             # Base.metadata.drop_all(bind=engine) # Uncomment to drop tables on startup (for development)
+            # Create api_logs as a partitioned table first when API_LOGS_PARTITIONING is on
+            prepare_api_logs_table(engine)
             models.Base.metadata.create_all(bind=engine) # Use the imported models module
             logger.info("Database tables created successfully.")
+            # Add missing api_logs indexes, upcoming partitions and apply retention
+            run_log_maintenance(engine)
+            # Full-text search column and index for chat messages (PostgreSQL only)
+            ensure_chat_search_schema(engine)
+            created_indexes = ensure_indexes(engine, models.ChatMessage.__table__)
+            if created_indexes:
+                logger.info(f"Created chat_messages indexes: {', '.join(created_indexes)}")
         except Exception as db_error:
             logger.error(f"Error creating database tables: {db_error}", exc_info=True)
             # Continue application startup even if database initialization fails
             # This allows the application to start with limited functionality
             logger.warning("Application will start with limited database functionality")
         
+        # Start the live log tail (LISTEN/NOTIFY on PostgreSQL) before the writer publishes to it
+        log_broadcaster.configure(engine.dialect.name)
+        await log_broadcaster.start(engine.url.render_as_string(hide_password=False))
+        
+        # Start the background API log writer
+        api_log_writer.start()
+        
+        # Re-run api_logs maintenance periodically so partitions exist before they are needed
+        app.state.log_maintenance_task = asyncio.create_task(log_maintenance_loop(engine))
+        
+        # Open the pooled HTTP client used for GCP agent calls
+        await start_gcp_http_client()
+        
         # Initialize navigation items
         try:
             initialize_navigation()
@@ -97,6 +129,16 @@ async def lifespan(app: FastAPI):
         aws_secret_key = os.getenv("AWS_SECRET_ACCESS_KEY")
         if not aws_access_key or not aws_secret_key:
             logger.warning("AWS credentials not found in environment variables. AWS services may not function properly.")
+        else:
+            # Warm the Bedrock client pool so the first chat doesn't pay client construction
+            await asyncio.to_thread(
+                client_pool.warm,
+                'bedrock-agent-runtime',
+                bedrock_client.DEFAULT_AWS_ACCESS_KEY,
+                bedrock_client.DEFAULT_AWS_SECRET_KEY,
+                bedrock_client.DEFAULT_AWS_REGION,
+                bedrock_client.config
+            )
         
         logger.info("Application initialization completed successfully")
     except Exception as e:
@@ -108,6 +150,20 @@ async def lifespan(app: FastAPI):
     
     # Shutdown: Add cleanup logic here if needed
     logger.info("Shutting down application...")
+    log_maintenance_task = getattr(app.state, "log_maintenance_task", None)
+    if log_maintenance_task:
+        # Let the loop unwind before the engines and executors below are torn down
+        log_maintenance_task.cancel()
+        try:
+            await log_maintenance_task
+        except asyncio.CancelledError:
+            pass
+    await asyncio.to_thread(shutdown_bedrock_executor)
+    await close_gcp_http_client()
+    # Flush queued API logs before exiting
+    await asyncio.to_thread(api_log_writer.stop)
+    await log_broadcaster.stop()
+    await dispose_async_engine()
 
 app = FastAPI(
     title="IntelliOps AI Backend",
@@ -127,80 +183,12 @@ origins = cors_origins_str.split(",")
 # Log the origins for debugging
 logger.info(f"CORS origins configured: {origins}")
 
-# Request logging middleware
-from fastapi import status
-from fastapi.responses import JSONResponse
-from jose import JWTError
-
-@app.middleware("http")
-async def auth_error_middleware(request: Request, call_next):
-    try:
-        response = await call_next(request)
-        # Check if it's an auth error response
-        if response.status_code == status.HTTP_401_UNAUTHORIZED:
-            return JSONResponse(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                content={
-                    "detail": {
-                        "message": "Session expired",
-                        "code": "TOKEN_EXPIRED"
-                    }
-                },
-                headers={
-                    "WWW-Authenticate": "Bearer",
-                    "X-Error-Type": "token_expired"
-                }
-            )
-        return response
-    except JWTError as e:
-        return JSONResponse(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            content={
-                "detail": {
-                    "message": "Session expired",
-                    "code": "TOKEN_EXPIRED"
-                }
-            },
-            headers={
-                "WWW-Authenticate": "Bearer",
-                "X-Error-Type": "token_expired"
-            }
-        )
-
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    start_time = time.time()
-    
-    # Get request details
-    method = request.method
-    url = str(request.url)
-    client_host = request.client.host if request.client else "unknown"
-    
-    # Log the incoming request
-    logger.info(f"Request: {method} {url} from {client_host}")
-    
-    # Process the request
-    try:
-        response = await call_next(request)
-        process_time = time.time() - start_time
-        
-        # Log the response status and timing
-        status_code = response.status_code
-        logger.info(f"Response: {status_code} for {method} {url} - Took {process_time:.3f}s")
-        
-        # Add custom header with processing time
-        response.headers["X-Process-Time"] = str(process_time)
-        
-        # Log detailed info for 4xx and 5xx responses to help with debugging
-        if status_code >= 400:
-            logger.warning(f"Error response {status_code} for {method} {url}")
-        
-        return response
-    except Exception as e:
-        # Log exceptions
-        process_time = time.time() - start_time
-        logger.error(f"Error processing {method} {url}: {str(e)} - Took {process_time:.3f}s")
-        raise
+# Auth error rewriting and request logging, as pure ASGI middleware so
+# streaming responses pass through unbuffered. Logging wraps auth errors.
+app.add_middleware(AuthErrorMiddleware)
+app.add_middleware(RequestLoggingMiddleware)
+# Outermost of the three so it sees the final status of every request
+app.add_middleware(MetricsMiddleware)
 
 # CORS middleware
 app.add_middleware(
@@ -261,7 +249,7 @@ async def aws_settings_page():
 
 from fastapi import Depends
 from sqlalchemy.orm import Session
-from .database import get_db
+from .database import get_db, get_pool_stats
 
 from sqlalchemy import text
 
@@ -273,3 +261,13 @@ def health_check(db: Session = Depends(get_db)):
     except Exception as e:
         return {"status": "error", "detail": str(e)}
 
+@app.get("/metrics", tags=["Health"], include_in_schema=False)
+def prometheus_metrics():
+    """Request, upstream and database pool metrics in the Prometheus text format"""
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/api/health/db-pool", tags=["Health"])
+def db_pool_stats():
+    """Connection pool occupancy, overflow and checkout wait times"""
+    return get_pool_stats()
+
@@ -0,0 +1,226 @@
+"""
+In-process metrics rendered in the Prometheus text exposition format.
+
+Counters, gauges and histograms are kept in plain dicts behind a lock, so
+recording a sample is a dictionary update and a bisect. Pool gauges are read
+from the database module when /metrics is scraped instead of being pushed.
+"""
+import bisect
+import os
+import threading
+
+# Histogram buckets in seconds. They run from fast API calls up to the 600s agent timeout.
+LATENCY_BUCKETS = tuple(
+    float(b) for b in os.getenv(
+        "METRICS_LATENCY_BUCKETS",
+        "0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30,60,120,300,600"
+    ).split(",")
+)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set(self, value: float, **labels):
+        """Mirror a running total that is counted elsewhere (e.g. the pool metrics)."""
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket counts (last slot is +Inf), then sum and count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self):
+        lines = self._header()
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = f'le="{_format_value(bound)}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {repr(float(total))}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds the metrics and the callbacks that refresh scrape-time gauges."""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        """Register a callable run at scrape time to update gauges."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            collector()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# --- HTTP ---
+http_requests_total = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route template and status code",
+    ("method", "route", "status")
+))
+http_request_duration_seconds = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency until the response body completes",
+    ("method", "route")
+))
+http_requests_in_flight = registry.register(Gauge(
+    "http_requests_in_flight", "HTTP requests currently being handled",
+    ("method",)
+))
+
+# --- Upstream agents ---
+upstream_request_duration_seconds = registry.register(Histogram(
+    "upstream_request_duration_seconds", "Latency of Bedrock and GCP agent calls",
+    ("provider", "operation", "outcome")
+))
+upstream_errors_total = registry.register(Counter(
+    "upstream_errors_total", "Failed Bedrock and GCP agent calls",
+    ("provider", "operation")
+))
+
+# --- Database pool ---
+db_pool_connections = registry.register(Gauge(
+    "db_pool_connections", "Database pool connections by state",
+    ("engine", "state")
+))
+db_pool_checkouts_total = registry.register(Counter(
+    "db_pool_checkouts_total", "Connections checked out of the sync pool since start"
+))
+db_pool_checkout_timeouts_total = registry.register(Counter(
+    "db_pool_checkout_timeouts_total", "Checkouts that timed out waiting for a sync pool connection"
+))
+db_pool_wait_seconds_total = registry.register(Counter(
+    "db_pool_wait_seconds_total", "Total time spent waiting for sync pool connections"
+))
+
+
+def record_upstream(provider: str, operation: str, seconds: float, success: bool = True):
+    """Record one Bedrock or GCP agent call."""
+    outcome = "success" if success else "error"
+    upstream_request_duration_seconds.observe(seconds, provider=provider, operation=operation, outcome=outcome)
+    if not success:
+        upstream_errors_total.inc(provider=provider, operation=operation)
+
+
+def _collect_db_pool():
+    # Imported here so the metrics module has no import-time database dependency
+    from .database import get_pool_stats
+
+    stats = get_pool_stats()
+    for engine_name, pool_stats in (("sync", stats), ("async", stats.get("async_pool"))):
+        if not pool_stats or "size" not in pool_stats:
+            continue
+        db_pool_connections.set(pool_stats["size"], engine=engine_name, state="size")
+        db_pool_connections.set(pool_stats["checked_out"], engine=engine_name, state="checked_out")
+        db_pool_connections.set(pool_stats["checked_in"], engine=engine_name, state="checked_in")
+        db_pool_connections.set(pool_stats["overflow"], engine=engine_name, state="overflow")
+    db_pool_checkouts_total.set(stats["checkouts"])
+    db_pool_checkout_timeouts_total.set(stats["timeouts"])
+    db_pool_wait_seconds_total.set(stats["wait_seconds_total"])
+
+
+registry.add_collector(_collect_db_pool)
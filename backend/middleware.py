@@ -0,0 +1,159 @@
+import logging
+import time
+
+from fastapi import status
+from jose import JWTError
+from starlette.datastructures import MutableHeaders, URL
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Body returned for every 401 so the frontend can send the user back to login
+TOKEN_EXPIRED_BODY = b'{"detail":{"message":"Session expired","code":"TOKEN_EXPIRED"}}'
+TOKEN_EXPIRED_HEADERS = [
+    (b"content-type", b"application/json"),
+    (b"content-length", str(len(TOKEN_EXPIRED_BODY)).encode("latin-1")),
+    (b"www-authenticate", b"Bearer"),
+    (b"x-error-type", b"token_expired"),
+]
+
+
+class AuthErrorMiddleware:
+    """
+    Rewrite any 401 response, or an uncaught JWTError, into the standard
+    "Session expired" JSON body.
+
+    Pure ASGI: other responses pass straight through, so streaming bodies are
+    never buffered or wrapped in an extra task.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        response_started = False
+        rewriting = False
+
+        async def send_wrapper(message):
+            nonlocal response_started, rewriting
+            if message["type"] == "http.response.start":
+                response_started = True
+                if message["status"] == status.HTTP_401_UNAUTHORIZED:
+                    rewriting = True
+                    await _send_token_expired(send)
+                    return
+            elif rewriting:
+                # Drop the original 401 body; ours has already been sent
+                return
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except JWTError:
+            if response_started:
+                raise
+            await _send_token_expired(send)
+
+
+async def _send_token_expired(send):
+    await send({
+        "type": "http.response.start",
+        "status": status.HTTP_401_UNAUTHORIZED,
+        "headers": list(TOKEN_EXPIRED_HEADERS)
+    })
+    await send({"type": "http.response.body", "body": TOKEN_EXPIRED_BODY})
+
+
+class RequestLoggingMiddleware:
+    """
+    Log each request and its response status, and set X-Process-Time.
+
+    Timing uses perf_counter up to the moment the response headers are sent,
+    the same point the old call_next-based middleware measured. The body is
+    forwarded untouched.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+
+        # Get request details
+        method = scope["method"]
+        url = str(URL(scope=scope))
+        client = scope.get("client")
+        client_host = client[0] if client else "unknown"
+
+        # Log the incoming request
+        logger.info(f"Request: {method} {url} from {client_host}")
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                process_time = time.perf_counter() - start_time
+                status_code = message["status"]
+                logger.info(f"Response: {status_code} for {method} {url} - Took {process_time:.3f}s")
+
+                # Add custom header with processing time
+                headers = MutableHeaders(scope=message)
+                headers["X-Process-Time"] = f"{process_time:.6f}"
+
+                # Log detailed info for 4xx and 5xx responses to help with debugging
+                if status_code >= 400:
+                    logger.warning(f"Error response {status_code} for {method} {url}")
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            # Log exceptions
+            process_time = time.perf_counter() - start_time
+            logger.error(f"Error processing {method} {url}: {str(e)} - Took {process_time:.3f}s")
+            raise
+
+
+class MetricsMiddleware:
+    """
+    Count requests and record latency per route template for /metrics.
+
+    The route label is the matched path template (e.g. /api/users/{user_id}),
+    so the number of series stays bounded; unmatched paths share one label.
+    Latency runs until the response body completes, so streamed chats count in full.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+        method = scope["method"]
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        metrics.http_requests_in_flight.inc(method=method)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            metrics.http_requests_in_flight.dec(method=method)
+            # The router stores the matched route on the scope
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            metrics.http_requests_total.inc(method=method, route=route, status=status_code)
+            metrics.http_request_duration_seconds.observe(time.perf_counter() - start_time, method=method, route=route)
@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Text, DateTime, JSON, UniqueConstraint
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Text, DateTime, JSON, UniqueConstraint, Index, Float
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .database import Base
@@ -175,6 +175,10 @@ class ChatThread(Base):
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
+    # Newest-first reads per thread (last message previews, message windows) walk this index
+    __table_args__ = (
+        Index('ix_chat_messages_thread_id_created_at_id', 'thread_id', 'created_at', 'id'),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     thread_id = Column(Integer, ForeignKey("chat_threads.id", ondelete="CASCADE"), nullable=False, index=True)
@@ -201,6 +205,14 @@ class GcpSettings(Base):
 
 class ApiLog(Base):
     __tablename__ = "api_logs"
+    # Composite indexes for the /api/logs filter shapes, all ending in the (timestamp, id)
+    # sort key so filtered keyset pages are index range scans
+    __table_args__ = (
+        Index('ix_api_logs_timestamp_id', 'timestamp', 'id'),
+        Index('ix_api_logs_provider_timestamp_id', 'provider', 'timestamp', 'id'),
+        Index('ix_api_logs_log_type_timestamp_id', 'log_type', 'timestamp', 'id'),
+        Index('ix_api_logs_session_id_timestamp_id', 'session_id', 'timestamp', 'id'),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
@@ -217,6 +229,31 @@ class ApiLog(Base):
     def __repr__(self):
         return f"<ApiLog(id={self.id}, timestamp='{self.timestamp}', type='{self.log_type}', provider='{self.provider}')>"
 
+class ApiLogRollup(Base):
+    """Per-minute and per-hour aggregates of api_logs, updated as log batches are written"""
+    __tablename__ = "api_log_rollups"
+    __table_args__ = (
+        UniqueConstraint('granularity', 'bucket_start', 'provider', 'endpoint', 'log_type', name='_api_log_rollup_uc'),
+        Index('ix_api_log_rollups_granularity_bucket', 'granularity', 'bucket_start'),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    granularity = Column(String(10), nullable=False)  # 'minute' or 'hour'
+    bucket_start = Column(DateTime(timezone=True), nullable=False)
+    provider = Column(String(50), nullable=False)
+    endpoint = Column(String(255), nullable=False, default="")  # '' when the log had no endpoint
+    log_type = Column(String(50), nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+    errors = Column(Integer, nullable=False, default=0)
+    duration_count = Column(Integer, nullable=False, default=0)
+    duration_sum = Column(Float, nullable=False, default=0)
+    duration_min = Column(Integer, nullable=True)
+    duration_max = Column(Integer, nullable=True)
+    duration_sketch = Column(JSON, nullable=True)  # log-bucket histogram of duration_ms, see log_stats
+
+    def __repr__(self):
+        return f"<ApiLogRollup(granularity='{self.granularity}', bucket_start='{self.bucket_start}', provider='{self.provider}', count={self.count})>"
+
 class NavigationItem(Base):
     __tablename__ = "navigation_items"
 
@@ -1,6 +1,7 @@
+import asyncio
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm, OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
 from jose import JWTError, jwt
 from passlib.context import CryptContext
@@ -12,8 +13,8 @@ pwd_context = CryptContext(schemes=["sha256_crypt"], deprecated="auto")
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
-from .. import crud, models, schemas, utils
-from ..database import get_db
+from .. import async_crud, models, schemas, utils
+from ..database import get_async_db
 from ..dependencies import create_access_token, get_current_active_user, get_current_user
 
 router = APIRouter(
@@ -24,19 +25,19 @@ router = APIRouter(
 ACCESS_TOKEN_EXPIRE_MINUTES = 30 # Or load from config
 
 @router.post("/register", response_model=schemas.User)
-def register(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_email(db, email=user.email)
+async def register(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
+    db_user = await async_crud.get_user_by_email(db, email=user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    return crud.create_user(db=db, user=user)
+    return await async_crud.create_user(db=db, user=user)
 
 @router.post("/login")
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
     # Get user by email
-    user = crud.get_user_by_email(db, email=form_data.username) # Use email as username
+    user = await async_crud.get_user_by_email(db, email=form_data.username) # Use email as username
     
-    # Check if user exists and password is correct
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    # Check if user exists and password is correct (hash check runs off the event loop)
+    if not user or not await asyncio.to_thread(verify_password, form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -74,7 +75,7 @@ def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db:
 # Add password reset endpoints later
 
 @router.post("/refresh", response_model=schemas.Token)
-def refresh_token(current_user: models.User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def refresh_token(current_user: schemas.UserPrincipal = Depends(get_current_user)):
     # Create a new access token
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
@@ -4,11 +4,11 @@ from pydantic import BaseModel
 import logging
 import uuid
 import os
-import boto3
 import asyncio
 from botocore.config import Config
 from botocore.exceptions import BotoCoreError, NoCredentialsError
 from dotenv import load_dotenv
+from ..aws_services.client_pool import client_pool
 
 # Load environment variables
 load_dotenv()
@@ -39,7 +39,7 @@ def get_bedrock_agent_client(
     aws_region=None
 ):
     """
-    Create and return a Bedrock agent client using the provided credentials.
+    Return a pooled Bedrock agent client for the provided credentials.
     If no credentials are provided, it will use the ones from the .env file.
     """
     # Use provided credentials or fall back to defaults from .env
@@ -51,14 +51,7 @@ def get_bedrock_agent_client(
         raise ValueError("AWS credentials not provided and not found in .env file")
         
     try:
-        agent_client = boto3.client(
-            service_name='bedrock-agent-runtime',
-            region_name=aws_region,
-            aws_access_key_id=aws_access_key,
-            aws_secret_access_key=aws_secret_key,
-            config=config
-        )
-        return agent_client
+        return client_pool.get_client('bedrock-agent-runtime', aws_access_key, aws_secret_key, aws_region, config)
     except NoCredentialsError:
         raise ValueError("Invalid AWS credentials")
     except BotoCoreError as e:
@@ -179,12 +172,12 @@ async def chat(request: ChatRequest):
 
         # For safety, use a direct approach similar to our test script
         try:
-            # Create the Bedrock agent client
-            agent_client = boto3.client(
-                service_name='bedrock-agent-runtime',
-                region_name=DEFAULT_AWS_REGION,
-                aws_access_key_id=DEFAULT_AWS_ACCESS_KEY,
-                aws_secret_access_key=DEFAULT_AWS_SECRET_KEY
+            # Get the pooled Bedrock agent client
+            agent_client = client_pool.get_client(
+                'bedrock-agent-runtime',
+                DEFAULT_AWS_ACCESS_KEY,
+                DEFAULT_AWS_SECRET_KEY,
+                DEFAULT_AWS_REGION
             )
             
             # Invoke the agent directly
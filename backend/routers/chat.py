@@ -7,6 +7,7 @@ import uuid # For generating session IDs if needed
 from .. import models, schemas
 from ..database import get_db
 from ..dependencies import get_current_active_user
+from ..chat_history import as_history, thread_history_cache, without_current_message
 
 router = APIRouter(
     prefix="/api/chat",
@@ -27,7 +28,14 @@ async def handle_chat_message( # Mark as async if potential I/O bound operations
     """
     session_id = chat_request.session_id or str(uuid.uuid4())
     user_message = chat_request.user_message
-    history = chat_request.history
+    if chat_request.thread_id is not None:
+        # Assemble the history server-side from the stored thread
+        history = await thread_history_cache.get(chat_request.thread_id, current_user.id)
+        if history is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat thread not found")
+        history = without_current_message(history, user_message)
+    else:
+        history = as_history(chat_request.history)
 
     # --- Placeholder Logic ---
     # In a real implementation, this is where you would:
@@ -1,9 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
-from .. import models, schemas, crud
-from ..database import get_db
+from .. import models, schemas, async_crud, chat_search
+from ..database import get_async_db
 from ..dependencies import get_current_user
 
 router = APIRouter(
@@ -12,20 +12,52 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+# Search endpoint
+@router.get("/search", response_model=List[schemas.ChatSearchHit])
+async def search_chat_messages(
+    q: str = Query(..., min_length=1, max_length=500, description="Search text; supports \"phrases\", OR and -exclusions on PostgreSQL"),
+    thread_id: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Full-text search across the current user's messages, best matches first."""
+    return await chat_search.search_messages(db, user_id=current_user.id, query=q, limit=limit, thread_id=thread_id)
+
 # Chat Thread endpoints
 @router.get("/threads", response_model=List[schemas.ChatThread])
-def read_chat_threads(
+async def read_chat_threads(
     skip: int = 0, 
     limit: int = 100, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    return crud.get_chat_threads_for_user(db, user_id=current_user.id, skip=skip, limit=limit)
+    return await async_crud.get_chat_threads_for_user(db, user_id=current_user.id, skip=skip, limit=limit)
+
+@router.get("/threads/summaries", response_model=List[schemas.ChatThreadSummary])
+async def read_chat_thread_summaries(
+    skip: int = 0,
+    limit: int = 100,
+    snippet_chars: int = Query(200, ge=0, le=2000),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Threads with message counts and last-message previews for the history sidebar, in one query."""
+    summaries = await async_crud.get_chat_thread_summaries(
+        db, user_id=current_user.id, skip=skip, limit=limit, snippet_chars=snippet_chars
+    )
+    return [
+        schemas.ChatThreadSummary(
+            **schemas.ChatThread.model_validate(summary.pop("thread")).model_dump(),
+            **summary
+        )
+        for summary in summaries
+    ]
 
 @router.post("/threads", response_model=schemas.ChatThread, status_code=status.HTTP_201_CREATED)
-def create_chat_thread(
+async def create_chat_thread(
     thread: schemas.ChatThreadBase,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user)
 ):
     # Create a new chat thread for the current user
@@ -33,15 +65,15 @@ def create_chat_thread(
         **thread.dict(),
         user_id=current_user.id
     )
-    return crud.create_chat_thread(db=db, thread=thread_data)
+    return await async_crud.create_chat_thread(db=db, thread=thread_data)
 
 @router.get("/threads/{thread_id}", response_model=schemas.ChatThread)
-def read_chat_thread(
+async def read_chat_thread(
     thread_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    db_thread = crud.get_chat_thread(db, thread_id=thread_id, user_id=current_user.id)
+    db_thread = await async_crud.get_chat_thread(db, thread_id=thread_id, user_id=current_user.id)
     if db_thread is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -50,13 +82,13 @@ def read_chat_thread(
     return db_thread
 
 @router.put("/threads/{thread_id}", response_model=schemas.ChatThread)
-def update_chat_thread(
+async def update_chat_thread(
     thread_id: int,
     title: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    db_thread = crud.update_chat_thread(db, thread_id=thread_id, user_id=current_user.id, title=title)
+    db_thread = await async_crud.update_chat_thread(db, thread_id=thread_id, user_id=current_user.id, title=title)
     if db_thread is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -65,12 +97,12 @@ def update_chat_thread(
     return db_thread
 
 @router.delete("/threads/{thread_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_chat_thread(
+async def delete_chat_thread(
     thread_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    success = crud.delete_chat_thread(db, thread_id=thread_id, user_id=current_user.id)
+    success = await async_crud.delete_chat_thread(db, thread_id=thread_id, user_id=current_user.id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -80,32 +112,70 @@ def delete_chat_thread(
 
 # Chat Message endpoints
 @router.get("/threads/{thread_id}/messages", response_model=List[schemas.ChatMessage])
-def read_chat_messages(
+async def read_chat_messages(
     thread_id: int,
     skip: int = 0, 
     limit: int = 100, 
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user)
 ):
     # Check if thread exists and belongs to the current user
-    db_thread = crud.get_chat_thread(db, thread_id=thread_id, user_id=current_user.id)
+    db_thread = await async_crud.get_chat_thread(db, thread_id=thread_id, user_id=current_user.id)
     if db_thread is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail=f"Chat thread with id {thread_id} not found"
         )
     
-    return crud.get_chat_messages_for_thread(db, thread_id=thread_id, skip=skip, limit=limit)
+    return await async_crud.get_chat_messages_for_thread(db, thread_id=thread_id, skip=skip, limit=limit)
+
+@router.get("/threads/{thread_id}/messages/window", response_model=schemas.ChatMessageWindow)
+async def read_chat_message_window(
+    thread_id: int,
+    before: Optional[int] = Query(None, description="Messages older than this message id"),
+    after: Optional[int] = Query(None, description="Messages newer than this message id"),
+    around: Optional[int] = Query(None, description="Messages centred on this message id"),
+    limit: int = Query(50, ge=1, le=500),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Keyset window of a thread's messages, newest messages by default. Page back
+    with before=<first id> and forward with after=<last id>.
+    """
+    if sum(anchor is not None for anchor in (before, after, around)) > 1:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Use only one of before, after or around"
+        )
+    
+    # Check if thread exists and belongs to the current user
+    db_thread = await async_crud.get_chat_thread(db, thread_id=thread_id, user_id=current_user.id)
+    if db_thread is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Chat thread with id {thread_id} not found"
+        )
+    
+    window = await async_crud.get_chat_message_window(
+        db, thread_id=thread_id, limit=limit, before=before, after=after, around=around
+    )
+    if window is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Message {before or after or around} not found in chat thread {thread_id}"
+        )
+    return window
 
 @router.post("/threads/{thread_id}/messages", response_model=schemas.ChatMessage, status_code=status.HTTP_201_CREATED)
-def create_chat_message(
+async def create_chat_message(
     thread_id: int,
     message: schemas.ChatMessageBase,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user)
 ):
     # Check if thread exists and belongs to the current user
-    db_thread = crud.get_chat_thread(db, thread_id=thread_id, user_id=current_user.id)
+    db_thread = await async_crud.get_chat_thread(db, thread_id=thread_id, user_id=current_user.id)
     if db_thread is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -117,16 +187,37 @@ def create_chat_message(
         **message.dict(),
         thread_id=thread_id
     )
-    return crud.create_chat_message(db=db, message=message_data)
+    return await async_crud.create_chat_message(db=db, message=message_data)
+
+@router.post("/threads/{thread_id}/turns", response_model=List[schemas.ChatMessage], status_code=status.HTTP_201_CREATED)
+async def append_chat_turn(
+    thread_id: int,
+    turn: schemas.ChatTurnCreate,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """
+    Save a whole chat turn (e.g. the user message and the assistant reply) in one
+    transaction, instead of one POST and commit per message.
+    """
+    created = await async_crud.append_chat_messages(
+        db, thread_id=thread_id, user_id=current_user.id, messages=turn.messages
+    )
+    if created is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Chat thread with id {thread_id} not found"
+        )
+    return created
 
 @router.delete("/messages/{message_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_chat_message(
+async def delete_chat_message(
     message_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: models.User = Depends(get_current_user)
 ):
     # Get the message to check ownership
-    db_message = crud.get_chat_message(db, message_id=message_id)
+    db_message = await async_crud.get_chat_message(db, message_id=message_id)
     if db_message is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -134,7 +225,7 @@ def delete_chat_message(
         )
     
     # Check if the message belongs to a thread owned by the current user
-    db_thread = crud.get_chat_thread(db, thread_id=db_message.thread_id, user_id=current_user.id)
+    db_thread = await async_crud.get_chat_thread(db, thread_id=db_message.thread_id, user_id=current_user.id)
     if db_thread is None:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -142,7 +233,7 @@ def delete_chat_message(
         )
     
     # Delete the message
-    success = crud.delete_chat_message(db, message_id=message_id)
+    success = await async_crud.delete_chat_message(db, message_id=message_id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -1,8 +1,7 @@
 from fastapi import APIRouter, HTTPException, Depends, Request
-from sqlalchemy.orm import Session
-from backend.database import get_db
-from backend.gcp_services.gcp_client import start_gcp_session, send_gcp_message
+from backend.gcp_services.gcp_client import ensure_gcp_session, invalidate_gcp_session, send_gcp_message, GcpRequestError
 from backend.dependencies import get_current_active_user
+from backend.gcp_services.session_registry import gcp_session_registry
 import logging
 import json
 import os
@@ -82,8 +81,15 @@ def test_gcp_chat_endpoint():
     logger.info("GCP chat test endpoint called")
     return {"status": "ok", "message": "GCP chat endpoint is working"}
 
+@router.get("/api/gcp-chat/sessions")
+def get_gcp_session_registry_stats():
+    """Return hit/miss counters for the GCP session registry"""
+    return gcp_session_registry.stats()
+
 @router.post("/api/gcp-chat")
-async def gcp_chat(request: Request, db: Session = Depends(get_db), current_user=Depends(get_current_active_user)):
+async def gcp_chat(request: Request, current_user=Depends(get_current_active_user)):
+    # No request-scoped session here: settings come from the cache and logs from the
+    # background writer, so no pooled connection is held while the agent runs
     try:
         data = await request.json()
         logger.info(f"Received GCP chat request: {data}")
@@ -103,11 +109,10 @@ async def gcp_chat(request: Request, db: Session = Depends(get_db), current_user
         if user_id is None:
             raise HTTPException(status_code=400, detail="user_id could not be determined from authentication context")
 
-        # Always try to create the session first
+        # Create the session unless it was already created on this endpoint
         try:
-            logger.info(f"Creating GCP session with session_id: {session_id}")
-            session_resp = start_gcp_session(session_id, db)
-            logger.info(f"GCP session created successfully: {session_resp}")
+            if await ensure_gcp_session(session_id):
+                logger.info(f"GCP session created successfully: {session_id}")
         except Exception as e:
             logger.warning(f"Session creation attempt resulted in: {str(e)}")
             logger.warning("Continuing with message sending anyway")
@@ -117,14 +122,28 @@ async def gcp_chat(request: Request, db: Session = Depends(get_db), current_user
         # This ensures we use the same user_id that was used in session creation
         try:
             logger.info(f"Sending message to GCP agent with session_id: {session_id}")
-            agent_resp = send_gcp_message(
-                session_id=session_id, 
-                new_message=new_message, 
-                db=db, 
-                app_name=None,  # Let it extract from session URL
-                user_id=None,   # Let it extract from session URL
-                start_session=False  # Don't try to create the session in this call
-            )
+            try:
+                agent_resp = await send_gcp_message(
+                    session_id=session_id, 
+                    new_message=new_message, 
+                    app_name=None,  # Let it extract from session URL
+                    user_id=None,   # Let it extract from session URL
+                    start_session=False  # Don't try to create the session in this call
+                )
+            except GcpRequestError as e:
+                if e.status_code != 404:
+                    raise
+                # The agent lost the session (restart or expiry), create it again and retry once
+                logger.warning(f"GCP session {session_id} not found upstream, re-creating it")
+                await invalidate_gcp_session(session_id)
+                await ensure_gcp_session(session_id, force=True)
+                agent_resp = await send_gcp_message(
+                    session_id=session_id,
+                    new_message=new_message,
+                    app_name=None,
+                    user_id=None,
+                    start_session=False
+                )
             logger.info(f"GCP agent response received: {type(agent_resp)}")
             
             # Check for null response
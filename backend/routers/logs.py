@@ -1,15 +1,37 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from datetime import datetime, timedelta
-from backend.database import get_db
-from backend.models import ApiLog
-import logging
+from datetime import datetime, timedelta, timezone
+from backend import async_crud
+from backend.database import get_db, get_async_db, get_async_sessionmaker, db_session
+from backend.models import ApiLog, ApiLogRollup, User
+from backend.dependencies import get_current_admin_user
+from backend.log_writer import api_log_writer, build_log_row, format_log_entry
+from backend.log_tail import log_broadcaster, TailSubscription
+from backend.log_stats import apply_rollups, choose_granularity, window_start, summarize_rollups, GROUP_FIELDS
+import asyncio
+import base64
+import csv
+import io
 import json
+import logging
+import os
+import zlib
 
 router = APIRouter()
 logger = logging.getLogger("api_logs")
 
+# Upper bound for count=approximate; larger result sets report the cap
+LOG_COUNT_CAP = int(os.getenv("LOG_COUNT_CAP", "10000"))
+# Rows fetched per server-side cursor batch by /api/logs/export
+LOG_EXPORT_BATCH_SIZE = int(os.getenv("LOG_EXPORT_BATCH_SIZE", "1000"))
+# Seconds between keep-alive comments on an idle /api/logs/tail stream
+LOG_TAIL_HEARTBEAT = float(os.getenv("LOG_TAIL_HEARTBEAT", "15"))
+# Reconnect delay suggested to EventSource clients
+LOG_TAIL_RETRY_MS = int(os.getenv("LOG_TAIL_RETRY_MS", "3000"))
+
 @router.get("/api/logs/test")
 def test_log_creation(db: Session = Depends(get_db)):
     """Test endpoint to create a sample log entry"""
@@ -26,8 +48,8 @@ def test_log_creation(db: Session = Depends(get_db)):
             "duration_ms": 0
         }
         
-        # Add the log
-        log = add_log(db, test_log)
+        # Write the log immediately so the new ID can be returned
+        log = write_log_now(db, test_log)
         
         if log:
             return {"message": "Test log created successfully", "log_id": log.id}
@@ -37,115 +59,356 @@ def test_log_creation(db: Session = Depends(get_db)):
         logger.error(f"Error in test_log_creation: {str(e)}")
         return {"error": str(e)}
 
-@router.get("/api/logs")
-def get_logs(
+@router.get("/api/logs/writer")
+def get_log_writer_stats():
+    """Return queue depth and drop counters for the background log writer"""
+    return api_log_writer.stats()
+
+def _encode_cursor(log: ApiLog, direction: str) -> str:
+    """Opaque cursor for the (timestamp, id) position of a log row"""
+    payload = {"ts": log.timestamp.isoformat(), "id": log.id, "dir": direction}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+def _decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        position = (datetime.fromisoformat(payload["ts"]), int(payload["id"]))
+        if payload["dir"] not in ("next", "prev"):
+            raise ValueError(f"Unknown direction {payload['dir']}")
+        return position, payload["dir"]
+    except Exception as e:
+        logger.warning(f"Invalid logs cursor {cursor!r}: {str(e)}")
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _build_log_filters(
+    provider: Optional[str],
+    log_type: Optional[str],
+    session_id: Optional[str],
+    start_date: Optional[str],
+    end_date: Optional[str]
+) -> list:
+    """Filter clauses shared by the log listing and export endpoints"""
+    # Collect filters
+    filters = []
+    if provider:
+        filters.append(ApiLog.provider == provider)
+    if log_type:
+        filters.append(ApiLog.log_type == log_type)
+    if session_id:
+        filters.append(ApiLog.session_id == session_id)
+    
+    # Date filtering
+    if start_date:
+        try:
+            start = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
+            filters.append(ApiLog.timestamp >= start)
+        except ValueError:
+            logger.warning(f"Invalid start_date format: {start_date}")
+    
+    if end_date:
+        try:
+            end = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
+            filters.append(ApiLog.timestamp <= end)
+        except ValueError:
+            logger.warning(f"Invalid end_date format: {end_date}")
+    return filters
+
+async def _count_logs(db: AsyncSession, filters: list, count: str):
+    """Return (total, is_approximate) for the requested count mode"""
+    if count == "none":
+        return None, False
+    if count == "approximate":
+        # Count at most LOG_COUNT_CAP + 1 rows; a total above the cap is reported as the cap
+        total = await async_crud.count_api_logs(db, filters, cap=LOG_COUNT_CAP + 1)
+        return min(total, LOG_COUNT_CAP), total > LOG_COUNT_CAP
+    return await async_crud.count_api_logs(db, filters), False
+
+@router.get("/api/logs/stats")
+async def get_log_stats(
+    hours: float = Query(24, gt=0, le=24 * 90, description="Window size, ending now"),
     provider: Optional[str] = None,
     log_type: Optional[str] = None,
-    session_id: Optional[str] = None,
-    start_date: Optional[str] = None,
-    end_date: Optional[str] = None,
-    page: int = Query(1, ge=1, description="Page number"),
-    page_size: int = Query(50, ge=1, le=100, description="Number of logs per page"),
-    db: Session = Depends(get_db)
+    endpoint: Optional[str] = None,
+    group_by: str = Query("provider", description="Comma-separated provider, endpoint and/or log_type, or 'none'"),
+    series: bool = Query(False, description="Include a per-bucket time series for each group"),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get API logs with optional filtering and pagination"""
+    """
+    Request counts, error rates and duration percentiles from the api_log_rollups table.
+
+    Windows up to LOG_STATS_MINUTE_MAX_HOURS use minute buckets, longer ones hourly
+    buckets; the window start is aligned down to a bucket boundary.
+    """
+    fields = [] if group_by == "none" else [field.strip() for field in group_by.split(",") if field.strip()]
+    invalid = [field for field in fields if field not in GROUP_FIELDS]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"Invalid group_by field(s): {', '.join(invalid)}")
     try:
-        # Start with base query
-        query = db.query(ApiLog)
-        
-        # Apply filters
+        filters = []
         if provider:
-            query = query.filter(ApiLog.provider == provider)
+            filters.append(ApiLogRollup.provider == provider)
         if log_type:
-            query = query.filter(ApiLog.log_type == log_type)
-        if session_id:
-            query = query.filter(ApiLog.session_id == session_id)
+            filters.append(ApiLogRollup.log_type == log_type)
+        if endpoint:
+            filters.append(ApiLogRollup.endpoint == endpoint)
         
-        # Date filtering
-        if start_date:
-            try:
-                start = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-                query = query.filter(ApiLog.timestamp >= start)
-            except ValueError:
-                logger.warning(f"Invalid start_date format: {start_date}")
+        granularity = choose_granularity(hours)
+        end = datetime.now(timezone.utc)
+        start = window_start(end, hours, granularity)
+        rollups = await async_crud.get_api_log_rollups(db, granularity, start, end, filters)
         
-        if end_date:
+        return {
+            "window": {
+                "start": start.isoformat(),
+                "end": end.isoformat(),
+                "hours": hours,
+                "granularity": granularity
+            },
+            "group_by": fields,
+            "groups": summarize_rollups(rollups, fields, include_series=series)
+        }
+    except Exception as e:
+        logger.error(f"Error retrieving log stats: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error retrieving log stats: {str(e)}")
+
+EXPORT_CSV_COLUMNS = ["id", "timestamp", "type", "provider", "session_id", "endpoint", "status", "duration", "error", "content"]
+
+def _export_chunk(rows, export_format: str, include_header: bool) -> bytes:
+    """Serialise one batch of rows as NDJSON lines or CSV records"""
+    if export_format == "ndjson":
+        return "".join(json.dumps(format_log_entry(row), default=str) + "\n" for row in rows).encode()
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if include_header:
+        writer.writerow(EXPORT_CSV_COLUMNS)
+    for row in rows:
+        log = format_log_entry(row)
+        log["content"] = json.dumps(log["content"], default=str) if log["content"] is not None else ""
+        writer.writerow([log[column] for column in EXPORT_CSV_COLUMNS])
+    return buffer.getvalue().encode()
+
+async def _export_logs(filters: list, export_format: str, compress: bool):
+    # The session is opened here rather than with Depends(get_async_db): dependency
+    # cleanup runs before a streamed body is sent, and the cursor must outlive it
+    compressor = zlib.compressobj(wbits=31) if compress else None  # wbits=31 writes a gzip stream
+    exported = 0
+    try:
+        async with get_async_sessionmaker()() as db:
+            async for rows in async_crud.stream_api_logs(db, filters, batch_size=LOG_EXPORT_BATCH_SIZE):
+                chunk = _export_chunk(rows, export_format, include_header=exported == 0)
+                exported += len(rows)
+                if compressor:
+                    chunk = compressor.compress(chunk)
+                if chunk:
+                    yield chunk
+            if exported == 0 and export_format == "csv":
+                chunk = _export_chunk([], export_format, include_header=True)
+                yield compressor.compress(chunk) if compressor else chunk
+        if compressor:
+            yield compressor.flush()
+        logger.info(f"Exported {exported} API logs as {export_format}")
+    except Exception as e:
+        # Headers are already sent; the truncated body is all the client will see
+        logger.error(f"Error exporting logs after {exported} rows: {str(e)}", exc_info=True)
+        raise
+
+@router.get("/api/logs/export")
+async def export_logs(
+    provider: Optional[str] = None,
+    log_type: Optional[str] = None,
+    session_id: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="ndjson or csv"),
+    compress: bool = Query(False, description="gzip the response (Content-Encoding: gzip)"),
+    current_user: User = Depends(get_current_admin_user)
+):
+    """
+    Stream every log matching the get_logs filters as NDJSON or CSV, newest first.
+
+    Rows are read through a server-side cursor in batches of LOG_EXPORT_BATCH_SIZE,
+    so memory stays constant regardless of export size.
+    """
+    filters = _build_log_filters(provider, log_type, session_id, start_date, end_date)
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/csv; charset=utf-8"
+    filename = f"api-logs-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}.{format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(_export_logs(filters, format, compress), media_type=media_type, headers=headers)
+
+async def _tail_events(subscription: TailSubscription):
+    # Starlette cancels this generator when the client disconnects; finally unsubscribes
+    try:
+        yield f"retry: {LOG_TAIL_RETRY_MS}\n\n"
+        reported_drops = 0
+        while True:
             try:
-                end = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-                query = query.filter(ApiLog.timestamp <= end)
-            except ValueError:
-                logger.warning(f"Invalid end_date format: {end_date}")
-        
-        # Get total count for pagination metadata
-        total_count = query.count()
+                event = await asyncio.wait_for(subscription.queue.get(), timeout=LOG_TAIL_HEARTBEAT)
+            except asyncio.TimeoutError:
+                # Comment line keeps proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+                continue
+            
+            # Send everything already queued in one chunk
+            events = [event]
+            while not subscription.queue.empty() and len(events) < 100:
+                events.append(subscription.queue.get_nowait())
+            chunk = "".join(f"id: {e['id']}\nevent: log\ndata: {json.dumps(e, default=str)}\n\n" for e in events)
+            if subscription.dropped > reported_drops:
+                chunk = f"event: dropped\ndata: {json.dumps({'dropped': subscription.dropped - reported_drops})}\n\n" + chunk
+                reported_drops = subscription.dropped
+            yield chunk
+    finally:
+        log_broadcaster.unsubscribe(subscription)
+
+@router.get("/api/logs/tail")
+async def tail_logs(
+    provider: Optional[str] = None,
+    session_id: Optional[str] = None,
+    log_type: Optional[str] = None,
+    current_user: User = Depends(get_current_admin_user)
+):
+    """
+    Server-sent events stream of new API logs as they are written.
+
+    Each "log" event carries the same fields as a /api/logs entry and only logs
+    matching the filters are sent. A "dropped" event reports logs skipped because
+    the client fell LOG_TAIL_QUEUE_SIZE events behind.
+    """
+    subscription = log_broadcaster.subscribe({"provider": provider, "session_id": session_id, "type": log_type})
+    if subscription is None:
+        raise HTTPException(status_code=503, detail="Too many log tail connections")
+    return StreamingResponse(
+        _tail_events(subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/api/logs/tail/stats")
+def get_log_tail_stats(current_user: User = Depends(get_current_admin_user)):
+    """Return the live tail backend, subscriber count and delivery counters"""
+    return log_broadcaster.stats()
+
+@router.get("/api/logs")
+async def get_logs(
+    provider: Optional[str] = None,
+    log_type: Optional[str] = None,
+    session_id: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    page: int = Query(1, ge=1, description="Page number (offset pagination)"),
+    page_size: int = Query(50, ge=1, le=100, description="Number of logs per page"),
+    cursor: Optional[str] = Query(None, description="Keyset pagination: empty for the first page, then next_cursor or prev_cursor"),
+    count: Optional[str] = Query(None, pattern="^(exact|approximate|none)$", description="Total to return: exact, approximate (capped) or none"),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Get API logs with optional filtering and pagination.
+
+    Passing cursor switches to keyset pagination on (timestamp, id), which costs the
+    same at any depth and skips the total unless count is given. Without cursor the
+    page/OFFSET mode and its exact total are kept for existing clients.
+    """
+    try:
+        filters = _build_log_filters(provider, log_type, session_id, start_date, end_date)
         
-        # Order by timestamp descending (newest first)
-        query = query.order_by(ApiLog.timestamp.desc())
+        if cursor is not None:
+            # Keyset mode: seek from the cursor position instead of counting and skipping rows
+            position, direction = _decode_cursor(cursor) if cursor else (None, "next")
+            backwards = direction == "prev"
+            logs, has_more = await async_crud.get_api_logs_keyset(
+                db, filters, limit=page_size, position=position, backwards=backwards
+            )
+            has_next = True if backwards else has_more
+            has_prev = has_more if backwards else position is not None
+            total, total_is_approximate = await _count_logs(db, filters, count or "none")
+            
+            return {
+                "logs": [format_log_entry(log) for log in logs],
+                "pagination": {
+                    "page_size": page_size,
+                    "next_cursor": _encode_cursor(logs[-1], "next") if logs and has_next else None,
+                    "prev_cursor": _encode_cursor(logs[0], "prev") if logs and has_prev else None,
+                    "has_next": has_next,
+                    "has_prev": has_prev,
+                    "total": total,
+                    "total_is_approximate": total_is_approximate
+                }
+            }
         
-        # Apply pagination
+        # Get total count and the page (newest first)
+        total_count, total_is_approximate = await _count_logs(db, filters, count or "exact")
         offset = (page - 1) * page_size
-        logs = query.offset(offset).limit(page_size).all()
+        logs = await async_crud.get_api_logs(db, filters, offset=offset, limit=page_size)
         
         # Calculate pagination metadata
-        total_pages = (total_count + page_size - 1) // page_size  # Ceiling division
-        has_next = page < total_pages
+        if total_count is None:
+            total_pages = None
+            has_next = len(logs) == page_size
+        else:
+            total_pages = (total_count + page_size - 1) // page_size  # Ceiling division
+            has_next = page < total_pages
         has_prev = page > 1
         
-        # Format for frontend
-        result = []
-        for log in logs:
-            result.append({
-                "id": str(log.id),
-                "timestamp": log.timestamp.isoformat(),
-                "type": log.log_type,
-                "provider": log.provider,
-                "session_id": log.session_id,
-                "endpoint": log.endpoint,
-                "content": log.request_data if log.log_type == "request" else log.response_data,
-                "status": log.status_code,
-                "duration": log.duration_ms,
-                "error": log.error_message
-            })
-        
         # Add pagination metadata
         return {
-            "logs": result,
+            "logs": [format_log_entry(log) for log in logs],
             "pagination": {
                 "total": total_count,
                 "page": page,
                 "page_size": page_size,
                 "total_pages": total_pages,
                 "has_next": has_next,
-                "has_prev": has_prev
+                "has_prev": has_prev,
+                "total_is_approximate": total_is_approximate
             }
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error retrieving logs: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error retrieving logs: {str(e)}")
 
 # Helper function to add logs (used internally by other services)
-def add_log(db: Session, log_data: dict):
-    """Add a new API log entry"""
+def add_log(db: Optional[Session], log_data: dict):
+    """
+    Queue an API log entry for the background writer.
+
+    The caller's session is not touched, so logging never commits a request's
+    transaction. If the writer isn't running (scripts, tests) the row is written
+    synchronously instead, through a short-lived session when db is None.
+    """
     try:
-        # Debug logging
-        logger.info(f"Adding log entry: {json.dumps(log_data, default=str)}")
-        
-        # Ensure all required fields are present
-        if 'log_type' not in log_data:
-            logger.error("Missing required field: log_type")
-            log_data['log_type'] = 'error'  # Default
-            
-        if 'provider' not in log_data:
-            logger.error("Missing required field: provider")
-            log_data['provider'] = 'unknown'  # Default
-        
-        # Create and save the log
-        log = ApiLog(**log_data)
+        row = build_log_row(log_data)
+        if api_log_writer.running:
+            if not api_log_writer.enqueue(row):
+                logger.warning("API log queue full, dropping log entry")
+            return None
+        if db is None:
+            with db_session() as scoped_db:
+                return write_log_now(scoped_db, row)
+        return write_log_now(db, row)
+    except Exception as e:
+        logger.error(f"Error adding log: {str(e)}")
+        # Don't raise the exception to prevent API failures
+        return None
+
+def write_log_now(db: Session, log_data: dict):
+    """Write an API log entry immediately and return it"""
+    try:
+        row = build_log_row(log_data)
+        log = ApiLog(**row)
         db.add(log)
+        apply_rollups(db, [row])
+        db.flush()
+        events = [format_log_entry(log)]
+        log_broadcaster.notify(db, events)
         db.commit()
+        log_broadcaster.publish(events)
         db.refresh(log)
-        
-        logger.info(f"Successfully added log entry with ID: {log.id}")
+        logger.debug(f"Added log entry with ID: {log.id}")
         return log
     except Exception as e:
         logger.error(f"Error adding log: {str(e)}")
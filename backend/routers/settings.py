@@ -39,12 +39,10 @@ def update_user_profile(
     # Example: Only allow updating the name for now
     # Create schemas.UserUpdate(BaseModel): name: Optional[str] = None ...
     if hasattr(user_update, 'name') and user_update.name is not None:
-         current_user.name = user_update.name
+        # current_user is a cached snapshot; update_user writes the row and invalidates it
+        return crud.update_user(db, current_user.id, schemas.UserUpdate(name=user_update.name))
     # Add email update logic here if needed, potentially requiring verification
 
-    db.add(current_user)
-    db.commit()
-    db.refresh(current_user)
     return current_user
 
 
@@ -57,12 +55,14 @@ def update_password(
     """
     Update the password for the currently authenticated user.
     """
-    if not utils.verify_password(password_update.current_password, current_user.hashed_password):
+    # The cached principal carries no password hash, so load the row
+    db_user = crud.get_user(db, user_id=current_user.id)
+    if not db_user or not utils.verify_password(password_update.current_password, db_user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Incorrect current password",
         )
-    crud.update_user_password(db, user=current_user, new_password=password_update.new_password)
+    crud.update_user_password(db, user=db_user, new_password=password_update.new_password)
     # No response body needed for 204
 
 
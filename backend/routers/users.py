@@ -29,10 +29,12 @@ async def change_password(password_update: schemas.PasswordUpdate,
                         current_user: models.User = Depends(get_current_active_user),
                         db: Session = Depends(get_db)):
     """Change current user password"""
-    if not crud.verify_password(password_update.current_password, current_user.hashed_password):
+    # The cached principal carries no password hash, so load the row
+    db_user = crud.get_user(db, user_id=current_user.id)
+    if not db_user or not crud.verify_password(password_update.current_password, db_user.hashed_password):
         raise HTTPException(status_code=400, detail="Incorrect current password")
     
-    crud.update_user_password(db, current_user, password_update.new_password)
+    crud.update_user_password(db, db_user, password_update.new_password)
     return {"message": "Password updated successfully"}
 
 # Admin endpoints for user management
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr, Json, Field
+from pydantic import BaseModel, EmailStr, Json, Field, field_validator
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 
@@ -39,6 +39,9 @@ class ChatMessageBase(BaseModel):
     role: str # 'user' or 'assistant'
     content: str
 
+class ChatTurnCreate(BaseModel):
+    messages: List[ChatMessageBase] = Field(..., min_length=1, max_length=50) # In order, e.g. user then assistant
+
 class FavoritePromptBase(BaseModel):
     prompt_id: str
 
@@ -144,6 +147,12 @@ class ChatThread(BaseModel):
     class Config:
         from_attributes = True
 
+class ChatThreadSummary(ChatThread):
+    message_count: int = 0
+    last_message_role: Optional[str] = None
+    last_message_snippet: Optional[str] = None # First characters of the last message
+    last_message_at: Optional[datetime] = None
+
 class ChatMessage(BaseModel):
     id: int
     thread_id: int
@@ -154,6 +163,20 @@ class ChatMessage(BaseModel):
     class Config:
         from_attributes = True
 
+class ChatSearchHit(BaseModel):
+    message_id: int
+    thread_id: int
+    thread_title: Optional[str] = None
+    role: str
+    created_at: Optional[datetime] = None
+    rank: float
+    snippet: str # HTML-escaped excerpt with matches wrapped in <mark>
+
+class ChatMessageWindow(BaseModel):
+    messages: List[ChatMessage] # Oldest first
+    has_more_before: bool
+    has_more_after: bool
+
 class FavoritePrompt(BaseModel):
     id: int
     user_id: int
@@ -253,6 +276,28 @@ class Token(BaseModel):
 class TokenData(BaseModel):
     email: Optional[str] = None
 
+class UserPrincipal(BaseModel):
+    """Immutable snapshot of the authenticated user, cached by get_current_user (no password hash)"""
+    id: int
+    email: str
+    name: str
+    is_admin: bool = False
+    is_authenticated: bool = True
+    is_active: bool = True
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+    @field_validator("is_admin", "is_authenticated", "is_active", mode="before")
+    @classmethod
+    def null_flag_is_false(cls, value):
+        # The flag columns are nullable; NULL means the flag is not set, so the
+        # inactive/deactivated checks still answer 400/403 instead of failing validation
+        return False if value is None else value
+
+    class Config:
+        from_attributes = True
+        frozen = True
+
 # --- Log Schema (Example) ---
 class LogEntry(BaseModel):
     id: int
@@ -275,7 +320,8 @@ class ChatHistory(BaseModel):
 class ChatRequest(BaseModel):
     session_id: Optional[str] = None # Or generate if None
     user_message: str
-    history: List[ChatHistory] = []
+    thread_id: Optional[int] = None # Stored thread the history is read from
+    history: List[ChatHistory] = [] # Deprecated: only used when thread_id is not given
 
 class ChatResponse(BaseModel):
     session_id: str
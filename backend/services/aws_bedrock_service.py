@@ -14,6 +14,8 @@ from botocore.config import Config
 from botocore.exceptions import BotoCoreError, NoCredentialsError
 import backoff
 from dotenv import load_dotenv
+from ..aws_services.client_pool import client_pool
+from ..chat_history import build_context, thread_history_cache, without_current_message
 
 # Load environment variables
 load_dotenv()
@@ -89,23 +91,11 @@ DEFAULT_AGENT_ID = os.getenv("AWS_BEDROCK_AGENT_ID", "NOPNUNTEOB")
 DEFAULT_AGENT_ALIAS_ID = os.getenv("AWS_BEDROCK_AGENT_ALIAS_ID", "UHMWSV1HUM")
 
 def get_bedrock_client():
-    """Create and return Bedrock runtime and agent-runtime clients"""
+    """Return pooled Bedrock runtime and agent-runtime clients"""
     try:
         # We need both runtime and agent-runtime clients
-        runtime_client = boto3.client(
-            service_name='bedrock-runtime',
-            region_name=AWS_REGION,
-            aws_access_key_id=AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-            config=config
-        )
-        agent_client = boto3.client(
-            service_name='bedrock-agent-runtime',
-            region_name=AWS_REGION,
-            aws_access_key_id=AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-            config=config
-        )
+        runtime_client = client_pool.get_client('bedrock-runtime', AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_REGION, config)
+        agent_client = client_pool.get_client('bedrock-agent-runtime', AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, AWS_REGION, config)
         return runtime_client, agent_client
     except NoCredentialsError:
         logger.error("AWS credentials not found.")
@@ -120,7 +110,8 @@ def get_bedrock_client():
 class ChatRequest(BaseModel):
     session_id: str
     user_message: str
-    history: list[dict] = []  # List of previous messages
+    thread_id: int = None  # Stored thread to read the history from
+    history: list[dict] = []  # Deprecated: only used when thread_id is not given
     agent_id: str = None  # Optional, will use default if not provided
     agent_alias_id: str = None  # Optional, will use default if not provided
 
@@ -131,18 +122,23 @@ class ChatResponse(BaseModel):
 # -------------------------------
 # Conversation Context Generation
 # -------------------------------
-def generate_context(history, max_messages=5):
-    """Generate a conversation context from the last few messages."""
-    recent_messages = history[-max_messages:] if history else []
-    if not recent_messages:
-        return ""
-
-    context = "Reference context (for understanding only):\n"
-    for msg in recent_messages:
-        role = "User" if msg["role"] == "user" else "Assistant"
-        context += f"{role}: {msg['content']}\n"
-    context += "\n---\nPlease respond to this message:"
-    return context
+def generate_context(history):
+    """Generate a conversation context from the newest messages that fit the token budget."""
+    context = build_context(history)
+    logger.info(f"Conversation context: {json.dumps(context.accounting())}")
+    return context.text
+
+async def load_history(request: ChatRequest, user_id: int = None):
+    """
+    History for a request: read server-side from the stored thread when thread_id
+    is given (the thread must belong to user_id), else the client-supplied list.
+    """
+    if request.thread_id is None:
+        return request.history
+    history = await thread_history_cache.get(request.thread_id, user_id) if user_id is not None else None
+    if history is None:
+        raise HTTPException(status_code=404, detail="Chat thread not found")
+    return without_current_message(history, request.user_message)
 
 # -------------------------------
 # AWS Bedrock Invocation with Retry
@@ -284,7 +280,6 @@ async def stream_response_generator(session_id, user_message, context, agent_id=
                                 "session_id": session_id,
                                 "chunk": cleaned_chunk
                             }) + "\n"
-                            await asyncio.sleep(0.01)
 
         # Log the complete streaming session
         duration = time.time() - start_time
@@ -307,12 +302,12 @@ async def stream_response_generator(session_id, user_message, context, agent_id=
 # -------------------------------
 # Main Chat Functions
 # -------------------------------
-async def process_chat(request: ChatRequest) -> ChatResponse:
-    """Process a standard chat request"""
+async def process_chat(request: ChatRequest, user_id: int = None) -> ChatResponse:
+    """Process a standard chat request; user_id is required to chat in a stored thread"""
     start_time = time.time()
     session_id = request.session_id
     user_message = request.user_message
-    history = request.history
+    history = await load_history(request, user_id)
     agent_id = request.agent_id
     agent_alias_id = request.agent_alias_id
 
@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import os
+import re
+import threading
+import time
+from typing import Optional
+
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import db_session
+
+logger = logging.getLogger("settings_cache")
+
+# Upper bound on staleness when settings are changed by another worker process
+SETTINGS_CACHE_TTL = float(os.getenv("SETTINGS_CACHE_TTL", "30"))
+
+
+class AwsAgentSettings(BaseModel):
+    """Snapshot of the active AWS Bedrock agent settings"""
+    id: int
+    agent_id: str
+    agent_alias_id: str
+    version: int
+
+    class Config:
+        frozen = True
+
+
+class GcpAgentSettings(BaseModel):
+    """Snapshot of the active GCP agent settings with app_name/user_id parsed from the session URL"""
+    id: int
+    session_endpoint: str
+    agent_run_endpoint: str
+    app_name: Optional[str] = None
+    user_id: Optional[str] = None
+    version: int
+
+    class Config:
+        frozen = True
+
+
+def parse_session_endpoint(session_endpoint: str):
+    """Extract app_name and user_id from a GCP session URL, or None where absent"""
+    session_url = session_endpoint.rstrip('/')
+    app_match = re.search(r"/apps/([^/]+)/", session_url)
+    user_match = re.search(r"/users/([^/]+)/", session_url)
+    return (
+        app_match.group(1) if app_match else None,
+        user_match.group(1) if user_match else None
+    )
+
+
+class AgentSettingsCache:
+    """
+    In-process cache of the active AWS and GCP agent settings.
+
+    Each write through the settings endpoints calls invalidate(), which bumps the
+    version and forces the next read to reload from the database. Entries also
+    expire after SETTINGS_CACHE_TTL so other workers pick up changes.
+    A missing row is cached too, so an unconfigured provider doesn't query every request.
+    """
+
+    def __init__(self, ttl: float = SETTINGS_CACHE_TTL):
+        self.ttl = ttl
+        self.version = 0
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _get(self, provider: str):
+        with self._lock:
+            entry = self._entries.get(provider)
+            if entry is None:
+                return False, None
+            value, version, loaded_at = entry
+            if version != self.version or time.monotonic() - loaded_at > self.ttl:
+                return False, None
+            return True, value
+
+    def _put(self, provider: str, value, version: int):
+        with self._lock:
+            # Don't store a value loaded before a concurrent invalidation
+            if version == self.version:
+                self._entries[provider] = (value, version, time.monotonic())
+
+    def get_aws(self, db: Optional[Session] = None) -> Optional[AwsAgentSettings]:
+        """
+        Return the active AWS agent settings, or None if none are saved.
+        Without a db session a short-lived one is opened, and only on a cache miss.
+        """
+        found, value = self._get("aws")
+        if found:
+            return value
+        if db is None:
+            with db_session() as scoped_db:
+                return self.get_aws(scoped_db)
+
+        version = self.version
+        settings = db.query(models.AwsSettings).filter(models.AwsSettings.is_active == True).order_by(models.AwsSettings.id.desc()).first()
+        value = None
+        if settings:
+            value = AwsAgentSettings(
+                id=settings.id,
+                agent_id=settings.agent_id,
+                agent_alias_id=settings.agent_alias_id,
+                version=version
+            )
+        logger.info(f"Loaded AWS agent settings into cache: {value}")
+        self._put("aws", value, version)
+        return value
+
+    def get_gcp(self, db: Optional[Session] = None) -> Optional[GcpAgentSettings]:
+        """
+        Return the active GCP agent settings, or None if none are saved.
+        Without a db session a short-lived one is opened, and only on a cache miss.
+        """
+        found, value = self._get("gcp")
+        if found:
+            return value
+        if db is None:
+            with db_session() as scoped_db:
+                return self.get_gcp(scoped_db)
+
+        version = self.version
+        settings = db.query(models.GcpSettings).filter(models.GcpSettings.is_active == True).first()
+        value = None
+        if settings:
+            app_name, user_id = parse_session_endpoint(settings.session_endpoint)
+            value = GcpAgentSettings(
+                id=settings.id,
+                session_endpoint=settings.session_endpoint,
+                agent_run_endpoint=settings.agent_run_endpoint,
+                app_name=app_name,
+                user_id=user_id,
+                version=version
+            )
+        logger.info(f"Loaded GCP agent settings into cache: {value}")
+        self._put("gcp", value, version)
+        return value
+
+    async def get_aws_async(self, db: Optional[Session] = None) -> Optional[AwsAgentSettings]:
+        """get_aws for async callers: a hit is served in place, a miss is loaded on a worker thread."""
+        found, value = self._get("aws")
+        if found:
+            return value
+        return await asyncio.to_thread(self.get_aws, db)
+
+    async def get_gcp_async(self, db: Optional[Session] = None) -> Optional[GcpAgentSettings]:
+        """get_gcp for async callers: a hit is served in place, a miss is loaded on a worker thread."""
+        found, value = self._get("gcp")
+        if found:
+            return value
+        return await asyncio.to_thread(self.get_gcp, db)
+
+    def invalidate(self):
+        """Drop cached settings. Called after any settings write."""
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+        logger.info(f"Agent settings cache invalidated (version {self.version})")
+
+
+# Shared cache used by the Bedrock and GCP chat paths
+agent_settings_cache = AgentSettingsCache()
@@ -0,0 +1,15 @@
+from backend import async_crud, schemas
+
+
+def turn(*contents):
+    """Messages alternating user/assistant, starting with the user."""
+    return [schemas.ChatMessageBase(role="user" if i % 2 == 0 else "assistant", content=content)
+            for i, content in enumerate(contents)]
+
+
+async def thread_with_messages(session, user_id, count):
+    """A new thread for the user holding messages m0..m{count-1}."""
+    thread = await async_crud.create_chat_thread(session, schemas.ChatThreadCreate(title="t", user_id=user_id))
+    if count:
+        await async_crud.append_chat_messages(session, thread.id, user_id, turn(*(f"m{i}" for i in range(count))))
+    return thread.id
@@ -0,0 +1,64 @@
+import os
+import tempfile
+
+# Tests always run against a throwaway SQLite database, whatever .env says
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='backend-tests-'), 'test.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+import pytest
+
+
+@pytest.fixture(scope="session")
+def engine():
+    from backend import models
+    from backend.database import engine
+
+    models.Base.metadata.create_all(bind=engine)
+    return engine
+
+
+@pytest.fixture
+def db(engine):
+    from backend.database import SessionLocal
+
+    session = SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def run_async(engine):
+    """Run a coroutine function with a fresh async session; the async engine is disposed afterwards."""
+    import asyncio
+
+    from backend.database import dispose_async_engine, get_async_sessionmaker
+
+    def run(scenario):
+        async def main():
+            try:
+                async with get_async_sessionmaker()() as session:
+                    return await scenario(session)
+            finally:
+                await dispose_async_engine()
+
+        return asyncio.run(main())
+
+    return run
+
+
+
+@pytest.fixture
+def make_user(db):
+    """Insert a user row directly; password hashing is not what these tests are about."""
+    import uuid
+
+    from backend import models
+
+    def make(**fields):
+        user = models.User(name="Test", email=f"{uuid.uuid4().hex}@example.com", hashed_password="x", **fields)
+        db.add(user)
+        db.commit()
+        return user.id
+
+    return make
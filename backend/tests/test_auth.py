@@ -0,0 +1,37 @@
+import asyncio
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from backend import async_crud, dependencies, schemas
+from backend.cache import user_cache
+
+
+def _user(**flags):
+    return SimpleNamespace(id=1, email="null@example.com", name="Null", created_at=None, updated_at=None,
+                           **{"is_admin": False, "is_authenticated": True, "is_active": True, **flags})
+
+
+def test_null_flags_validate_as_false():
+    principal = schemas.UserPrincipal.model_validate(_user(is_admin=None, is_authenticated=None, is_active=None))
+    assert (principal.is_admin, principal.is_authenticated, principal.is_active) == (False, False, False)
+
+
+@pytest.mark.parametrize("flags, status_code", [({"is_active": None}, 403), ({"is_authenticated": None}, 400)])
+def test_null_flags_are_rejected_not_500(monkeypatch, flags, status_code):
+    async def get_user_by_email(db, email):
+        return _user(**flags)
+
+    monkeypatch.setattr(async_crud, "get_user_by_email", get_user_by_email)
+    user_cache.clear()
+    token = dependencies.create_access_token({"sub": "null@example.com"}, expires_delta=timedelta(minutes=5))
+
+    async def authenticate():
+        return await dependencies.get_current_active_user(await dependencies.get_current_user(token))
+
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(authenticate())
+    assert raised.value.status_code == status_code
+    user_cache.clear()
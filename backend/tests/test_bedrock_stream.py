@@ -0,0 +1,96 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+from backend.aws_services import bedrock_client, executor
+
+
+class BlockingStream:
+    """EventStream stand-in: one chunk, then a read that blocks until released or shut down."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.reads = 0
+        self.closed_on = []
+        self.shutdowns = 0
+        # Plays the urllib3 response too: shutdown() is what wakes the blocked read
+        self._raw_stream = self
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        self.reads += 1
+        if self.reads == 1:
+            return {"chunk": {"bytes": b"hello"}}
+        self.release.wait(5)
+        raise StopIteration
+
+    def shutdown(self):
+        self.shutdowns += 1
+        self.release.set()
+
+    def close(self):
+        self.closed_on.append(threading.current_thread().name)
+
+
+@pytest.fixture
+def single_worker(monkeypatch):
+    pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bedrock")
+    monkeypatch.setattr(executor, "_executor", pool)
+    yield pool
+    pool.shutdown(wait=True)
+
+
+@pytest.fixture
+def stream(monkeypatch):
+    stream = BlockingStream()
+    client = SimpleNamespace(invoke_agent=lambda **kwargs: {"completion": stream})
+    monkeypatch.setattr(bedrock_client, "get_bedrock_agent_client", lambda **kwargs: client)
+    async def resolve_agent_ids(db, agent_id, agent_alias_id):
+        return "agent", "alias"
+
+    monkeypatch.setattr(bedrock_client, "resolve_agent_ids", resolve_agent_ids)
+    monkeypatch.setattr(bedrock_client, "add_log", lambda db, entry: None)
+    yield stream
+    stream.release.set()
+
+
+def test_cancelled_stream_is_closed_at_once_and_frees_the_slot(single_worker, stream):
+    async def scenario():
+        chunks = bedrock_client.stream_bedrock_agent("hi", "session-1")
+        assert "hello" in await chunks.__anext__()
+
+        # The next read blocks inside the only worker; the client then disconnects
+        pending = asyncio.ensure_future(chunks.__anext__())
+        await asyncio.sleep(0.1)
+        pending.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await pending
+
+        # The socket is shut down and the stream closed without waiting for the read
+        assert stream.shutdowns == 1
+        assert stream.closed_on == [threading.current_thread().name]
+
+        # The interrupted read returns, so the worker takes new work
+        result = await asyncio.wait_for(executor.run_in_bedrock_executor(lambda: "free"), timeout=1)
+        assert result == "free"
+
+    asyncio.run(scenario())
+
+
+def test_finished_stream_is_closed_on_a_worker(single_worker, stream):
+    stream.release.set()
+
+    async def scenario():
+        lines = [line async for line in bedrock_client.stream_bedrock_agent("hi", "session-2")]
+        assert '"done": true' in lines[-1]
+        await executor.run_in_bedrock_executor(lambda: None)
+
+    asyncio.run(scenario())
+    assert stream.shutdowns == 0
+    assert len(stream.closed_on) == 1
+    assert stream.closed_on[0].startswith("bedrock")
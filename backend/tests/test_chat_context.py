@@ -0,0 +1,69 @@
+from types import SimpleNamespace
+
+from backend.chat_history import (
+    CLIPPED_MARKER, FRAME_TOKENS, ThreadHistoryCache, ThreadWindow, _clip_chars, build_context, make_message,
+)
+from backend.tests.chat_helpers import thread_with_messages
+
+
+def test_window_evicts_oldest_messages_over_budget():
+    message = make_message(1, "user", "x" * 40)
+    budget = FRAME_TOKENS + 3 * message.tokens
+    window = ThreadWindow(user_id=1, budget=budget, max_messages=50)
+
+    assert window.extend([make_message(i, "user", "x" * 40) for i in range(1, 4)]) == 0
+    assert not window.truncated
+    assert window.extend([make_message(4, "assistant", "x" * 40)]) == 1
+    assert [entry.id for entry in window.messages] == [2, 3, 4]
+    assert window.truncated
+    assert window.tokens == 3 * message.tokens
+    assert window.context().tokens <= budget
+
+
+def test_window_caps_message_count():
+    window = ThreadWindow(user_id=1, budget=10 ** 6, max_messages=3)
+    window.extend([make_message(i, "user", "hi") for i in range(1, 6)])
+    assert [entry.id for entry in window.messages] == [3, 4, 5]
+
+
+def test_oversized_message_is_clipped_and_kept():
+    dump = "log line\n" * 10000
+    entry = make_message(1, "user", dump)
+    assert entry.clipped
+    assert entry.content.endswith(CLIPPED_MARKER)
+    assert len(entry.content) == _clip_chars() + len(CLIPPED_MARKER)
+
+    window = ThreadWindow(user_id=1, budget=FRAME_TOKENS + 10, max_messages=50)
+    window.extend([make_message(1, "user", "earlier"), entry])
+    # The newest message always stays, even when it alone is over budget
+    assert [message.id for message in window.messages] == [1]
+    assert window.messages[0].clipped
+    assert window.context().clipped == 1
+
+
+def test_build_context_keeps_the_newest_messages_that_fit():
+    history = [{"role": "user", "content": "old " * 2000}, {"role": "assistant", "content": "recent"}]
+    context = build_context(history, budget=FRAME_TOKENS + 20)
+    assert context.messages == 1
+    assert context.truncated
+    assert "Assistant: recent" in context.text
+
+
+def test_cache_follows_writes(make_user, run_async):
+    user_id = make_user()
+    cache = ThreadHistoryCache(ttl=60, max_threads=10, budget=10 ** 6)
+
+    async def scenario(session):
+        thread_id = await thread_with_messages(session, user_id, 2)
+        first = await cache.context(thread_id, user_id, "next", db=session)
+        cache.record(thread_id, [SimpleNamespace(id=10 ** 6, role="user", content="next")])
+        second = await cache.context(thread_id, user_id, "next", db=session)
+        foreign = await cache.get(thread_id, user_id + 1, db=session)
+        return first, second, foreign
+
+    first, second, foreign = run_async(scenario)
+    assert first.messages == 2
+    # The saved current message is left out of its own context
+    assert second.messages == 2 and second.text == first.text
+    assert foreign is None
+    assert cache.stats()["loads"] == 1
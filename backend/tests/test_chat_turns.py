@@ -0,0 +1,18 @@
+from backend import async_crud
+from backend.tests.chat_helpers import thread_with_messages, turn
+
+
+def test_append_checks_thread_ownership(make_user, run_async):
+    owner, other = make_user(), make_user()
+
+    async def scenario(session):
+        thread_id = await thread_with_messages(session, owner, 0)
+        refused = await async_crud.append_chat_messages(session, thread_id, other, turn("q", "a"))
+        created = await async_crud.append_chat_messages(session, thread_id, owner, turn("q", "a"))
+        stored = await async_crud.get_chat_messages_for_thread(session, thread_id)
+        return refused, created, stored
+
+    refused, created, stored = run_async(scenario)
+    assert refused is None
+    assert [(message.role, message.content) for message in created] == [("user", "q"), ("assistant", "a")]
+    assert [message.id for message in stored] == [message.id for message in created]
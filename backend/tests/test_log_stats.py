@@ -0,0 +1,84 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from backend import log_stats
+from backend.log_stats import SKETCH_RELATIVE_ACCURACY, ZERO_KEY, _sketch_key, aggregate_rows, apply_rollups, sketch_quantile
+from backend.models import ApiLogRollup
+
+
+def _sketch(durations):
+    sketch = {}
+    for duration in durations:
+        key = _sketch_key(duration)
+        sketch[key] = sketch.get(key, 0) + 1
+    return sketch
+
+
+def test_one_millisecond_is_not_reported_as_zero():
+    assert _sketch_key(1) != ZERO_KEY
+    assert sketch_quantile(_sketch([1, 1, 1]), 0.5) == pytest.approx(1, rel=SKETCH_RELATIVE_ACCURACY)
+
+
+def test_non_positive_durations_have_their_own_key():
+    assert _sketch_key(0) == ZERO_KEY
+    assert _sketch_key(-5) == ZERO_KEY
+    assert sketch_quantile(_sketch([0, 0]), 0.99) == 0.0
+    assert sketch_quantile(_sketch([0, 1, 100]), 0.5) == pytest.approx(1, rel=SKETCH_RELATIVE_ACCURACY)
+
+
+@pytest.mark.parametrize("duration", [0.5, 1, 2, 7, 42, 999, 12345, 600000])
+def test_quantiles_are_within_relative_accuracy(duration):
+    estimate = sketch_quantile(_sketch([duration]), 0.5)
+    # Estimates are rounded to 0.1ms
+    assert abs(estimate - duration) <= duration * SKETCH_RELATIVE_ACCURACY + 0.05
+
+
+def test_quantiles_over_a_distribution():
+    durations = list(range(1, 1001))
+    sketch = _sketch(durations)
+    for q, expected in ((0.5, 500), (0.95, 950), (0.99, 990)):
+        assert sketch_quantile(sketch, q) == pytest.approx(expected, rel=SKETCH_RELATIVE_ACCURACY + 0.002)
+
+
+def test_empty_sketch_has_no_quantile():
+    assert sketch_quantile({}, 0.5) is None
+
+
+def _rows(now):
+    return [
+        {"timestamp": now, "provider": "gcp", "endpoint": "/run", "log_type": "response", "duration_ms": 5},
+        {"timestamp": now, "provider": "aws", "endpoint": "/invoke", "log_type": "response", "duration_ms": 1},
+        {"timestamp": now - timedelta(hours=2), "provider": "aws", "endpoint": "/invoke", "log_type": "error",
+         "status_code": 500},
+    ]
+
+
+def test_rollups_are_locked_in_key_order(db, monkeypatch):
+    now = datetime(2026, 1, 1, 12, 30, tzinfo=timezone.utc)
+    looked_up = []
+    find_rollup = log_stats._find_rollup
+
+    def recording_find_rollup(session, key):
+        looked_up.append(key)
+        return find_rollup(session, key)
+
+    monkeypatch.setattr(log_stats, "_find_rollup", recording_find_rollup)
+    assert apply_rollups(db, _rows(now))
+    db.commit()
+    assert looked_up == sorted(aggregate_rows(_rows(now)))
+
+
+def test_rollups_accumulate(db):
+    now = datetime(2026, 2, 1, 9, 15, tzinfo=timezone.utc)
+    assert apply_rollups(db, _rows(now))
+    assert apply_rollups(db, _rows(now))
+    db.commit()
+    rollup = db.query(ApiLogRollup).filter_by(granularity="minute", provider="aws", endpoint="/invoke", log_type="response").filter(
+        ApiLogRollup.bucket_start >= now - timedelta(minutes=1)).one()
+    assert rollup.count == 2
+    assert rollup.duration_min == 1
+    assert sketch_quantile(rollup.duration_sketch, 0.5) == pytest.approx(1, rel=SKETCH_RELATIVE_ACCURACY)
+    errors = db.query(ApiLogRollup).filter_by(granularity="hour", log_type="error").filter(
+        ApiLogRollup.bucket_start >= now - timedelta(hours=3)).one()
+    assert errors.errors == 2
@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta, timezone
+
+from backend.database import SessionLocal
+from backend.log_writer import ApiLogWriter, build_log_row
+from backend.models import ApiLog
+
+
+def _row(session_id, **fields):
+    return build_log_row({"log_type": "response", "provider": "aws", "session_id": session_id,
+                          "endpoint": "/invoke", "status_code": 200, "duration_ms": 12, **fields})
+
+
+def test_writer_flushes_queued_rows_in_batches(db):
+    writer = ApiLogWriter(batch_size=10, flush_interval=0.05)
+    writer.start()
+    for _ in range(25):
+        assert writer.enqueue(_row("writer-batches"))
+    writer.stop()
+
+    stats = writer.stats()
+    assert stats["written"] == 25
+    assert stats["failed"] == 0
+    assert 3 <= stats["batches"] <= 25
+    assert db.query(ApiLog).filter_by(session_id="writer-batches").count() == 25
+
+
+def test_full_queue_drops_and_counts():
+    writer = ApiLogWriter(max_queue_size=2)
+    assert writer.enqueue(_row("writer-full"))
+    assert writer.enqueue(_row("writer-full"))
+    assert not writer.enqueue(_row("writer-full"))
+    assert writer.stats()["dropped"] == 1
+
+
+def test_bad_row_does_not_lose_the_batch(db):
+    writer = ApiLogWriter(session_factory=SessionLocal)
+    rows = [_row("writer-bad"), _row("writer-bad", request_data={"unserialisable": object()}), _row("writer-bad")]
+    writer._flush(rows)
+
+    stats = writer.stats()
+    assert (stats["written"], stats["failed"]) == (2, 1)
+    assert db.query(ApiLog).filter_by(session_id="writer-bad").count() == 2
+
+
+def test_build_log_row_fills_required_fields():
+    before = datetime.now(timezone.utc)
+    row = build_log_row({"session_id": "s"})
+    assert row["log_type"] == "error"
+    assert row["provider"] == "unknown"
+    assert before - timedelta(seconds=1) <= row["timestamp"] <= datetime.now(timezone.utc)
+
+
+def test_tail_failure_after_commit_does_not_rewrite_the_batch(db, monkeypatch):
+    from backend import log_writer
+
+    def closed_loop(events):
+        raise RuntimeError("Event loop is closed")
+
+    monkeypatch.setattr(log_writer.log_broadcaster, "publish", closed_loop)
+    writer = ApiLogWriter(session_factory=SessionLocal)
+    writer._flush([_row("writer-publish"), _row("writer-publish")])
+
+    stats = writer.stats()
+    assert (stats["written"], stats["failed"]) == (2, 0)
+    assert db.query(ApiLog).filter_by(session_id="writer-publish").count() == 2
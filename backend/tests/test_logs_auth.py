@@ -0,0 +1,16 @@
+import pytest
+
+from backend.dependencies import get_current_admin_user
+from backend.routers import logs
+
+
+def _dependencies(dependant):
+    for dependency in dependant.dependencies:
+        yield dependency.call
+        yield from _dependencies(dependency)
+
+
+@pytest.mark.parametrize("path", ["/api/logs/export", "/api/logs/tail", "/api/logs/tail/stats"])
+def test_log_route_requires_admin(path):
+    route = next(route for route in logs.router.routes if route.path == path)
+    assert get_current_admin_user in set(_dependencies(route.dependant))
@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from backend import async_crud
+from backend.models import ApiLog
+from backend.routers.logs import _decode_cursor, _encode_cursor
+
+
+def test_cursor_round_trip():
+    log = SimpleNamespace(timestamp=datetime(2026, 3, 4, 5, 6, 7, 890123, tzinfo=timezone.utc), id=42)
+    for direction in ("next", "prev"):
+        position, decoded_direction = _decode_cursor(_encode_cursor(log, direction))
+        assert position == (log.timestamp, 42)
+        assert decoded_direction == direction
+
+
+@pytest.mark.parametrize("cursor", ["", "not-a-cursor", "eyJ0cyI6ICJ4In0"])
+def test_invalid_cursor_is_a_400(cursor):
+    with pytest.raises(HTTPException) as raised:
+        _decode_cursor(cursor)
+    assert raised.value.status_code == 400
+
+
+def test_keyset_pages_cover_every_row_once(db, run_async):
+    start = datetime(2026, 3, 1, tzinfo=timezone.utc)
+    # Pairs of rows share a timestamp, so paging has to break ties on id
+    db.add_all([
+        ApiLog(log_type="response", provider="keyset", session_id="keyset", timestamp=start + timedelta(seconds=i // 2))
+        for i in range(23)
+    ])
+    db.commit()
+    expected = [log.id for log in db.query(ApiLog).filter_by(session_id="keyset")
+                .order_by(ApiLog.timestamp.desc(), ApiLog.id.desc())]
+    filters = [ApiLog.session_id == "keyset"]
+
+    async def scenario(session):
+        seen, position, has_more = [], None, True
+        while has_more:
+            page, has_more = await async_crud.get_api_logs_keyset(session, filters, 5, position)
+            seen.extend(log.id for log in page)
+            position, _ = _decode_cursor(_encode_cursor(page[-1], "next"))
+
+        # Walking back from the oldest row returns the previous page in newest-first order
+        oldest = await session.get(ApiLog, seen[-1])
+        previous, more_before = await async_crud.get_api_logs_keyset(
+            session, filters, 5, (oldest.timestamp, oldest.id), backwards=True)
+        return seen, [log.id for log in previous], more_before
+
+    seen, previous, more_before = run_async(scenario)
+    assert seen == expected
+    assert previous == expected[-6:-1]
+    assert more_before
@@ -0,0 +1,30 @@
+from backend import async_crud
+from backend.tests.chat_helpers import thread_with_messages
+
+
+def _contents(window):
+    return [message.content for message in window["messages"]]
+
+
+def test_message_windows(make_user, run_async):
+    user_id = make_user()
+
+    async def scenario(session):
+        thread_id = await thread_with_messages(session, user_id, 10)
+        ids = {message.content: message.id
+               for message in await async_crud.get_chat_messages_for_thread(session, thread_id)}
+        tail = await async_crud.get_chat_message_window(session, thread_id, limit=3)
+        before = await async_crud.get_chat_message_window(session, thread_id, limit=3, before=ids["m3"])
+        after = await async_crud.get_chat_message_window(session, thread_id, limit=3, after=ids["m8"])
+        around = await async_crud.get_chat_message_window(session, thread_id, limit=5, around=ids["m5"])
+        other_thread = await thread_with_messages(session, user_id, 1)
+        foreign = await async_crud.get_chat_message_window(session, other_thread, before=ids["m3"])
+        return tail, before, after, around, foreign
+
+    tail, before, after, around, foreign = run_async(scenario)
+    assert _contents(tail) == ["m7", "m8", "m9"] and tail["has_more_before"] and not tail["has_more_after"]
+    assert _contents(before) == ["m0", "m1", "m2"] and not before["has_more_before"] and before["has_more_after"]
+    assert _contents(after) == ["m9"] and not after["has_more_after"]
+    assert _contents(around) == ["m3", "m4", "m5", "m6", "m7"]
+    assert around["has_more_before"] and around["has_more_after"]
+    assert foreign is None
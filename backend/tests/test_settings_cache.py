@@ -0,0 +1,28 @@
+import asyncio
+import threading
+
+from backend.settings_cache import AgentSettingsCache
+
+
+def test_async_miss_loads_off_the_event_loop(engine):
+    cache = AgentSettingsCache()
+    loaded_on = []
+    get_aws = cache.get_aws
+
+    def recording_get_aws(db=None):
+        loaded_on.append(threading.current_thread())
+        return get_aws(db)
+
+    cache.get_aws = recording_get_aws
+
+    async def scenario():
+        # No settings saved: the miss is loaded (and cached as None) on a worker thread
+        assert await cache.get_aws_async() is None
+        loads = len(loaded_on)
+        assert await cache.get_aws_async() is None
+        assert len(loaded_on) == loads
+        return threading.current_thread()
+
+    loop_thread = asyncio.run(scenario())
+    assert loaded_on
+    assert all(thread is not loop_thread for thread in loaded_on)
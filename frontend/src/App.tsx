@@ -10,7 +10,7 @@ import {
   Cloud,
   ChevronDown
 } from 'lucide-react';
-import { sendChatMessage } from './lib/api';
+import { sendChatMessage, createChatThread, appendChatTurn } from './lib/api';
 import { v4 as uuidv4 } from 'uuid';
 import toast, { Toaster } from 'react-hot-toast';
 import * as promptService from './services/promptService';
@@ -29,6 +29,8 @@ function ChatApp({ initialThread }: AppProps) {
   const [isLoading, setIsLoading] = useState(false);
   const [currentMessage, setCurrentMessage] = useState('');
   const [sessionId, setSessionId] = useState<string>(initialThread?.session_id || '');
+  // Stored thread the server reads the conversation history from, once created
+  const [threadId, setThreadId] = useState<number | undefined>(initialThread?.thread_id);
   const initialSessionId = initialThread?.session_id || ''; // Capture initial value
   console.log('App - Initializing sessionId state with:', initialSessionId);
   const [activeProvider, setActiveProvider] = useState<CloudProvider>('aws');
@@ -45,6 +47,7 @@ function ChatApp({ initialThread }: AppProps) {
       // If initialThread is provided, update the state with its data
       console.log('App initialThread Effect - Setting sessionId from initialThread:', initialThread.session_id);
       setSessionId(initialThread.session_id);
+      setThreadId(initialThread.thread_id);
       
       // Always set messages if initialThread has them, regardless of whether they're empty
       if (initialThread.messages) {
@@ -70,6 +73,7 @@ function ChatApp({ initialThread }: AppProps) {
       const newSessionId = uuidv4();
       console.log('App initialThread Effect - No initialThread or ID mismatch, generating initial sessionId:', newSessionId);
       setSessionId(newSessionId);
+      setThreadId(undefined);
       // Clear messages for new chat
       setMessages([]);
     }
@@ -299,6 +303,7 @@ function ChatApp({ initialThread }: AppProps) {
       
       // Update state and localStorage
       setSessionId(newSessionId);
+      setThreadId(undefined);
       localStorage.setItem('current_session_id', newSessionId);
     };
     
@@ -316,6 +321,27 @@ function ChatApp({ initialThread }: AppProps) {
     }));
   };
 
+  // Return the stored thread for this chat, creating it on the first message.
+  // Anonymous users (or a failed create) get undefined and keep sending the history.
+  const ensureChatThread = async (title: string): Promise<number | undefined> => {
+    if (threadId !== undefined) return threadId;
+    if (!authService.getToken()) return undefined;
+    
+    try {
+      const newThreadId = await createChatThread(title, activeProvider);
+      // Seed the thread with the conversation so far so the server-side context is complete
+      const earlier = formatMessagesForHistory(messages.filter(m => m.status !== 'error' && m.status !== 'loading'));
+      if (earlier.length > 0) {
+        await appendChatTurn(newThreadId, earlier.slice(-50));
+      }
+      setThreadId(newThreadId);
+      return newThreadId;
+    } catch (error) {
+      console.error('Could not create a chat thread, sending history instead:', error);
+      return undefined;
+    }
+  };
+
   const handleSendMessage = async (content: string) => {
     if (!content.trim()) return;
 
@@ -337,13 +363,18 @@ function ChatApp({ initialThread }: AppProps) {
     setMessages(prev => [...prev, userMessage, loadingMessage]);
     setIsLoading(true);
 
+    const title = userMessage.content.slice(0, 50) + (userMessage.content.length > 50 ? '...' : '');
+    const currentThreadId = await ensureChatThread(title);
+
     try {
-      const chatHistory = formatMessagesForHistory(messages);
       console.log('Sending message with provider:', activeProvider);
       const response = await sendChatMessage({
         session_id: sessionId,
         user_message: content,
-        history: chatHistory,
+        // With a stored thread the server reads the history itself
+        ...(currentThreadId !== undefined
+          ? { thread_id: currentThreadId }
+          : { history: formatMessagesForHistory(messages) }),
         provider: activeProvider // Include the provider in the request
       });
 
@@ -355,13 +386,22 @@ function ChatApp({ initialThread }: AppProps) {
         status: 'success',
       };
 
+      // Store the turn so the next request's server-side context includes it
+      if (currentThreadId !== undefined) {
+        await appendChatTurn(currentThreadId, [
+          { role: 'user', content },
+          { role: 'assistant', content: response.response }
+        ]).catch(error => console.error('Failed to save chat turn:', error));
+      }
+
       // Create or update thread when conversation happens
       const updatedMessages = messages.filter(m => m.id !== loadingMessage.id).concat([userMessage, responseMessage]);
       console.log('Creating/updating thread with messages:', updatedMessages);
       const thread = {
         id: sessionId,
         session_id: sessionId,
-        title: userMessage.content.slice(0, 50) + (userMessage.content.length > 50 ? '...' : ''),
+        thread_id: currentThreadId,
+        title,
         lastMessage: `You: ${userMessage.content.slice(0, 30)}${userMessage.content.length > 30 ? '...' : ''} | AI: ${responseMessage.content.slice(0, 50)}${responseMessage.content.length > 50 ? '...' : ''}`,
         timestamp: new Date().toISOString(),
         messages: updatedMessages
@@ -403,7 +443,8 @@ function ChatApp({ initialThread }: AppProps) {
       const thread = {
         id: sessionId,
         session_id: sessionId,
-        title: userMessage.content.slice(0, 50) + (userMessage.content.length > 50 ? '...' : ''),
+        thread_id: currentThreadId,
+        title,
         lastMessage: `You: ${userMessage.content.slice(0, 30)}${userMessage.content.length > 30 ? '...' : ''} | Error: ${errorMessage.slice(0, 50)}${errorMessage.length > 50 ? '...' : ''}`,
         timestamp: new Date().toISOString(),
         messages: [...messages.filter(m => m.id !== loadingMessage.id), userMessage, errorResponse]
@@ -437,6 +478,7 @@ function ChatApp({ initialThread }: AppProps) {
   const handleNewChat = () => {
     const newSessionId = uuidv4();
     setSessionId(newSessionId);
+    setThreadId(undefined);
     setMessages([]);
     setCurrentMessage('');
     
@@ -1,10 +1,47 @@
-import { ChatRequest, ChatResponse } from '../types';
+import { ChatHistory, ChatRequest, ChatResponse, CloudProvider } from '../types';
 import { API_BASE_URL } from '../config';
 import { authService } from './auth-service';
 
 // Default chat API URL (will be overridden based on provider)
 const DEFAULT_CHAT_API_URL = `${API_BASE_URL}/api/chat`;
 const TIMEOUT_MS = 120000; // 2 minutes timeout
+// Stored chat threads (the chat_threads router is mounted under /api with its own /api/chat prefix)
+const CHAT_THREADS_API_URL = `${API_BASE_URL}/api/api/chat/threads`;
+
+function authJsonHeaders(): Record<string, string> {
+  const token = authService.getToken();
+  return {
+    'Content-Type': 'application/json',
+    'Accept': 'application/json',
+    ...(token ? { 'Authorization': `Bearer ${token}` } : {})
+  };
+}
+
+// Create a stored chat thread and return its id, which chat requests then send as thread_id
+export async function createChatThread(title: string, provider: CloudProvider): Promise<number> {
+  const response = await fetch(CHAT_THREADS_API_URL, {
+    method: 'POST',
+    headers: authJsonHeaders(),
+    body: JSON.stringify({ title, cloud_provider: provider })
+  });
+  if (!response.ok) {
+    throw new Error(`Failed to create chat thread: ${response.statusText}`);
+  }
+  const thread = await response.json();
+  return thread.id;
+}
+
+// Save messages to a stored thread in one request (at most 50, oldest first)
+export async function appendChatTurn(threadId: number, messages: ChatHistory[]): Promise<void> {
+  const response = await fetch(`${CHAT_THREADS_API_URL}/${threadId}/turns`, {
+    method: 'POST',
+    headers: authJsonHeaders(),
+    body: JSON.stringify({ messages })
+  });
+  if (!response.ok) {
+    throw new Error(`Failed to save chat turn: ${response.statusText}`);
+  }
+}
 
 export async function sendChatMessage(request: ChatRequest): Promise<ChatResponse> {
   try {
@@ -30,7 +67,8 @@ export async function sendChatMessage(request: ChatRequest): Promise<ChatRespons
       requestBody = {
         message: request.user_message,
         session_id: request.session_id,
-        history: request.history,
+        // With a stored thread the server assembles the history, so the body stays small
+        ...(request.thread_id !== undefined ? { thread_id: request.thread_id } : { history: request.history }),
         provider: provider
       };
     } else if (provider === 'gcp') {
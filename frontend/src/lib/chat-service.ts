@@ -230,7 +230,8 @@ class ChatService {
         requestBody = {
           message: request.user_message,
           session_id: request.session_id,
-          history: request.history
+          // With a stored thread the server assembles the history, so the body stays small
+          ...(request.thread_id !== undefined ? { thread_id: request.thread_id } : { history: request.history })
         };
       } else if (isGcpProvider) {
         // Format for GCP API
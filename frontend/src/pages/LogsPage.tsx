@@ -1,18 +1,20 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 import { Download, RefreshCw, ChevronLeft, ChevronRight } from 'lucide-react';
 import { LogViewer } from '../components/LogViewer';
 import { LogEntry, LogFilter } from '../types';
 import { AppLayout } from '../components/AppLayout';
 import { Header } from '../components/Header';
 import { API_BASE_URL } from '../config';
+import { authService } from '../lib/auth-service';
 import toast from 'react-hot-toast';
 
 // Define pagination state interface
 interface PaginationState {
-  total: number;
-  page: number;
+  total: number | null;
+  total_is_approximate: boolean;
   page_size: number;
-  total_pages: number;
+  next_cursor: string | null;
+  prev_cursor: string | null;
   has_next: boolean;
   has_prev: boolean;
 }
@@ -23,32 +25,86 @@ export function LogsPage() {
   const [filters, setFilters] = useState<LogFilter>({});
   const [pagination, setPagination] = useState<PaginationState>({
     total: 0,
-    page: 1,
+    total_is_approximate: false,
     page_size: 50,
-    total_pages: 1,
+    next_cursor: null,
+    prev_cursor: null,
     has_next: false,
     has_prev: false
   });
+  // Live logs are only prepended while the newest page is shown
+  const onNewestPageRef = useRef(true);
 
   useEffect(() => {
-    fetchLogs();
-    // Set up auto-refresh every 30 seconds
-    const refreshInterval = setInterval(() => {
-      fetchLogs(filters);
-    }, 30000);
+    fetchLogs(filters);
+    // A fixed end date means nothing new can match, so there is nothing to stream
+    if (filters.endDate) return;
     
-    return () => clearInterval(refreshInterval);
+    // Receive new logs over server-sent events instead of polling
+    const params = new URLSearchParams();
+    if (filters.provider) params.append('provider', filters.provider);
+    if (filters.type) params.append('log_type', filters.type);
+    if (filters.session_id) params.append('session_id', filters.session_id);
+    // EventSource cannot send the Authorization header the admin-only tail needs,
+    // so read the event stream with fetch and reconnect after the server's retry delay
+    const controller = new AbortController();
+    const readTail = async () => {
+      let retryMs = 3000;
+      while (!controller.signal.aborted) {
+        try {
+          const token = authService.getToken();
+          const response = await fetch(`${API_BASE_URL}/api/logs/tail?${params.toString()}`, {
+            headers: token ? { 'Authorization': `Bearer ${token}` } : {},
+            signal: controller.signal
+          });
+          // Without admin access there is nothing to stream
+          if (response.status === 401 || response.status === 403) return;
+          if (!response.ok || !response.body) throw new Error(`Log tail failed: ${response.statusText}`);
+          
+          const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+          let buffer = '';
+          while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += value;
+            const frames = buffer.split('\n\n');
+            buffer = frames.pop() ?? '';
+            for (const frame of frames) {
+              let eventName = 'message';
+              let data = '';
+              for (const line of frame.split('\n')) {
+                if (line.startsWith('event: ')) eventName = line.slice(7);
+                else if (line.startsWith('data: ')) data += line.slice(6);
+                else if (line.startsWith('retry: ')) retryMs = Number(line.slice(7)) || retryMs;
+              }
+              if (eventName !== 'log' || !onNewestPageRef.current) continue;
+              const log: LogEntry = JSON.parse(data);
+              setLogs(current => [log, ...current].slice(0, 50));
+            }
+          }
+        } catch (error) {
+          if (controller.signal.aborted) return;
+          console.error('Log tail disconnected:', error);
+        }
+        await new Promise(resolve => setTimeout(resolve, retryMs));
+      }
+    };
+    readTail();
+    
+    return () => controller.abort();
   }, [filters]);
 
-  const fetchLogs = async (filters?: LogFilter, page: number = 1) => {
+  // cursor is '' for the newest page, or a next_cursor/prev_cursor from the last response
+  const fetchLogs = async (filters?: LogFilter, cursor: string = '') => {
     try {
       setIsLoading(true);
       
       // Build query parameters
       const params = new URLSearchParams();
-      // Add pagination parameters
-      params.append('page', page.toString());
+      // Add pagination parameters (keyset pagination with a capped total)
+      params.append('cursor', cursor);
       params.append('page_size', '50');
+      params.append('count', 'approximate');
       
       if (filters) {
         if (filters.provider) params.append('provider', filters.provider);
@@ -94,9 +150,10 @@ export function LogsPage() {
         // Update pagination state if available
         if (data.pagination) {
           setPagination(data.pagination);
+          onNewestPageRef.current = !data.pagination.has_prev;
         }
         
-        toast.success(`Loaded ${fetchedLogs.length} logs (Page ${data.pagination?.page || 1} of ${data.pagination?.total_pages || 1})`);
+        toast.success(`Loaded ${fetchedLogs.length} logs`);
       } else if (Array.isArray(data)) {
         // Old format (direct array of logs)
         const fetchedLogs: LogEntry[] = data.map((log: any) => ({
@@ -132,19 +189,34 @@ export function LogsPage() {
     fetchLogs(updatedFilters);
   };
 
-  const handleExport = () => {
+  const handleExport = async () => {
     try {
-      const exportData = JSON.stringify(logs, null, 2);
-      const blob = new Blob([exportData], { type: 'application/json' });
-      const url = URL.createObjectURL(blob);
+      const params = new URLSearchParams({ format: 'ndjson', compress: 'true' });
+      if (filters.provider) params.append('provider', filters.provider);
+      if (filters.type) params.append('log_type', filters.type);
+      if (filters.session_id) params.append('session_id', filters.session_id);
+      if (filters.startDate) params.append('start_date', filters.startDate instanceof Date ? filters.startDate.toISOString() : String(filters.startDate));
+      if (filters.endDate) params.append('end_date', filters.endDate instanceof Date ? filters.endDate.toISOString() : String(filters.endDate));
+      
+      // The export is admin-only, so it has to be fetched with the auth header
+      const token = authService.getToken();
+      const response = await fetch(`${API_BASE_URL}/api/logs/export?${params.toString()}`, {
+        headers: token ? { 'Authorization': `Bearer ${token}` } : {}
+      });
+      if (!response.ok) {
+        const errorText = await response.text();
+        throw new Error(`${response.statusText} - ${errorText}`);
+      }
+      
+      const blobUrl = URL.createObjectURL(await response.blob());
       const a = document.createElement('a');
-      a.href = url;
-      a.download = `logs-export-${new Date().toISOString()}.json`;
+      a.href = blobUrl;
+      a.download = `logs-export-${new Date().toISOString()}.ndjson`;
       document.body.appendChild(a);
       a.click();
       document.body.removeChild(a);
-      URL.revokeObjectURL(url);
-      toast.success('Logs exported successfully');
+      URL.revokeObjectURL(blobUrl);
+      toast.success('Log export downloaded');
     } catch (error) {
       console.error('Error exporting logs:', error);
       toast.error(`Failed to export logs: ${error instanceof Error ? error.message : 'Unknown error'}`);
@@ -223,14 +295,14 @@ export function LogsPage() {
             <div className="flex items-center justify-between border-t border-gray-200 bg-white px-4 py-3 sm:px-6">
               <div className="flex flex-1 justify-between sm:hidden">
                 <button
-                  onClick={() => pagination.has_prev && fetchLogs(filters, pagination.page - 1)}
+                  onClick={() => pagination.prev_cursor && fetchLogs(filters, pagination.prev_cursor)}
                   disabled={!pagination.has_prev}
                   className={`relative inline-flex items-center rounded-md border border-gray-300 bg-white px-4 py-2 text-sm font-medium ${pagination.has_prev ? 'text-gray-700 hover:bg-gray-50' : 'text-gray-300 cursor-not-allowed'}`}
                 >
                   Previous
                 </button>
                 <button
-                  onClick={() => pagination.has_next && fetchLogs(filters, pagination.page + 1)}
+                  onClick={() => pagination.next_cursor && fetchLogs(filters, pagination.next_cursor)}
                   disabled={!pagination.has_next}
                   className={`relative ml-3 inline-flex items-center rounded-md border border-gray-300 bg-white px-4 py-2 text-sm font-medium ${pagination.has_next ? 'text-gray-700 hover:bg-gray-50' : 'text-gray-300 cursor-not-allowed'}`}
                 >
@@ -240,14 +312,14 @@ export function LogsPage() {
               <div className="hidden sm:flex sm:flex-1 sm:items-center sm:justify-between">
                 <div>
                   <p className="text-sm text-gray-700">
-                    Showing <span className="font-medium">{logs.length > 0 ? ((pagination.page - 1) * pagination.page_size) + 1 : 0}</span> to <span className="font-medium">{Math.min(pagination.page * pagination.page_size, pagination.total)}</span> of{' '}
-                    <span className="font-medium">{pagination.total}</span> results
+                    Showing <span className="font-medium">{logs.length}</span> of{' '}
+                    <span className="font-medium">{pagination.total ?? 0}{pagination.total_is_approximate ? '+' : ''}</span> results
                   </p>
                 </div>
                 <div>
                   <nav className="isolate inline-flex -space-x-px rounded-md shadow-sm" aria-label="Pagination">
                     <button
-                      onClick={() => pagination.has_prev && fetchLogs(filters, pagination.page - 1)}
+                      onClick={() => pagination.prev_cursor && fetchLogs(filters, pagination.prev_cursor)}
                       disabled={!pagination.has_prev}
                       className={`relative inline-flex items-center rounded-l-md px-2 py-2 ${pagination.has_prev ? 'text-gray-400 ring-1 ring-inset ring-gray-300 hover:bg-gray-50 focus:z-20 focus:outline-offset-0' : 'text-gray-300 cursor-not-allowed'}`}
                     >
@@ -255,44 +327,8 @@ export function LogsPage() {
                       <ChevronLeft className="h-5 w-5" aria-hidden="true" />
                     </button>
                     
-                    {/* Page numbers - show up to 5 pages */}
-                    {Array.from({ length: Math.min(5, pagination.total_pages) }, (_, i) => {
-                      // Calculate page numbers to show around current page
-                      const totalPages = pagination.total_pages;
-                      const currentPage = pagination.page;
-                      let pageNum;
-                      
-                      if (totalPages <= 5) {
-                        // If 5 or fewer pages, show all pages
-                        pageNum = i + 1;
-                      } else if (currentPage <= 3) {
-                        // If near start, show first 5 pages
-                        pageNum = i + 1;
-                      } else if (currentPage >= totalPages - 2) {
-                        // If near end, show last 5 pages
-                        pageNum = totalPages - 4 + i;
-                      } else {
-                        // Show 2 pages before and after current page
-                        pageNum = currentPage - 2 + i;
-                      }
-                      
-                      return (
-                        <button
-                          key={pageNum}
-                          onClick={() => fetchLogs(filters, pageNum)}
-                          className={`relative inline-flex items-center px-4 py-2 text-sm font-semibold ${
-                            pageNum === pagination.page
-                              ? 'z-10 bg-blue-600 text-white focus:z-20 focus-visible:outline focus-visible:outline-2 focus-visible:outline-offset-2 focus-visible:outline-blue-600'
-                              : 'text-gray-900 ring-1 ring-inset ring-gray-300 hover:bg-gray-50 focus:z-20 focus:outline-offset-0'
-                          }`}
-                        >
-                          {pageNum}
-                        </button>
-                      );
-                    })}
-                    
                     <button
-                      onClick={() => pagination.has_next && fetchLogs(filters, pagination.page + 1)}
+                      onClick={() => pagination.next_cursor && fetchLogs(filters, pagination.next_cursor)}
                       disabled={!pagination.has_next}
                       className={`relative inline-flex items-center rounded-r-md px-2 py-2 ${pagination.has_next ? 'text-gray-400 ring-1 ring-inset ring-gray-300 hover:bg-gray-50 focus:z-20 focus:outline-offset-0' : 'text-gray-300 cursor-not-allowed'}`}
                     >
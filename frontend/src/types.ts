@@ -71,7 +71,8 @@ export interface ChatHistory {
 export interface ChatRequest {
   session_id: string;
   user_message: string;
-  history: ChatHistory[];
+  thread_id?: number; // Stored thread; the server reads the history itself
+  history?: ChatHistory[]; // Only sent when there is no stored thread
   provider?: CloudProvider; // Added provider field to specify which cloud provider to use
 }
 
@@ -101,6 +102,7 @@ export interface ChatThread {
   timestamp: string;
   messages: Message[];
   session_id: string;
+  thread_id?: number; // Stored server-side thread, once one has been created
 }
 
 export interface LogEntry {